@@ -9,7 +9,8 @@ from attrs import define, field
 
 from empanadas.backends import BackendInterface, KiwiBackend
 from empanadas.common import Architecture
-from empanadas.common import _rootdir
+from empanadas.common import _rootdir, config
+from empanadas.util.s3 import S3Transfers
 from . import utils
 
 from jinja2 import Environment, FileSystemLoader, Template
@@ -108,11 +109,11 @@ class ImageBuild:  # pylint: disable=too-few-public-methods
     def upload(self, skip=False) -> int:
         if not skip:
             self.log.info("Copying files to output directory")
-            copy_command = ["aws", "s3", "cp", "--recursive", f"{self.outdir}/",
-                            f"s3://resf-empanadas/buildimage-{self.architecture.version}-{self.architecture.name}/{self.outname}/{self.build_time.strftime('%s')}/"
-                            ]
-            ret, out, err, _ = self.prepare_and_run(copy_command, search=False)
-            return ret
+            prefix = f"buildimage-{self.architecture.version}-{self.architecture.name}/{self.outname}/{self.build_time.strftime('%s')}/"
+            uploaded = S3Transfers(config['bucket'], self.log).upload_dir(f"{self.outdir}/", prefix)
+            if not uploaded or any(isinstance(r, Exception) for r in uploaded.values()):
+                return 1
+            return 0
 
         self.ctx.log.info(f"Build complete! Output available in {self.ctx.outdir}/")
         return 0
@@ -13,6 +13,8 @@ parser.add_argument('--rc', action='store_true', help="Release Candidate, Beta,
 parser.add_argument('--local-compose', action='store_true', help="Compose Directory is Here")
 parser.add_argument('--logger', type=str)
 parser.add_argument('--hashed', action='store_true')
+parser.add_argument('--lorax-compression', type=str, choices=['gz', 'zst'], default='gz',
+                    help="Compression of the lorax tarball (zst unpacks much faster)")
 results = parser.parse_args()
 rlvars = rldict[results.release]
 major = rlvars['major']
@@ -25,6 +27,7 @@ a = IsoBuild(
         isolation=results.isolation,
         compose_dir_is_here=results.local_compose,
         hashed=results.hashed,
+        lorax_compression=results.lorax_compression,
         logger=results.logger,
 )
 
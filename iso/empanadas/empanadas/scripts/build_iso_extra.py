@@ -15,6 +15,7 @@ parser.add_argument('--local-compose', action='store_true', help="Compose Direct
 parser.add_argument('--logger', type=str)
 parser.add_argument('--extra-iso', type=str, help="Granular choice in which iso is built")
 parser.add_argument('--extra-iso-mode', type=str, default='local')
+parser.add_argument('--max-parallel', type=int, help="Maximum number of local mock builds to run at once")
 parser.add_argument('--hashed', action='store_true')
 parser.add_argument('--updated-image', action='store_true')
 parser.add_argument('--image-increment',type=str, default='0')
@@ -30,6 +31,7 @@ a = IsoBuild(
         isolation=results.isolation,
         extra_iso=results.extra_iso,
         extra_iso_mode=results.extra_iso_mode,
+        extra_iso_parallel=results.max_parallel,
         compose_dir_is_here=results.local_compose,
         hashed=results.hashed,
         logger=results.logger,
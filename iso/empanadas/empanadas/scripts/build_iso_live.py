@@ -20,6 +20,9 @@ parser.add_argument('--just-copy-it', action='store_true', help="Just copy the i
 parser.add_argument('--force-build', action='store_true', help="Just build and overwrite the images")
 parser.add_argument('--builder', type=str, help="Choose a builder type and override the set value in the configs")
 parser.add_argument('--increment', type=str, help="Changes the default increment of 0 to a number of your choice", default="0")
+parser.add_argument('--max-parallel', type=int, help="Most live images to build at once (default: as many as memory and disk allow)")
+parser.add_argument('--memory', type=str, help="Memory limit per live image build (eg 8G)")
+parser.add_argument('--cpus', type=float, help="CPU limit per live image build, in CPUs")
 results = parser.parse_args()
 rlvars = rldict[results.release]
 major = rlvars['major']
@@ -38,6 +41,9 @@ a = LiveBuild(
         force_build=results.force_build,
         builder=results.builder,
         image_increment=results.increment,
+        live_parallel=results.max_parallel,
+        live_memory=results.memory,
+        live_cpus=results.cpus,
         logger=results.logger
 )
 
@@ -0,0 +1,79 @@
+# Prints where the time went in a compose, using the timing database in work/
+
+import argparse
+import glob
+import os
+import time
+
+from empanadas.common import *
+from empanadas.util import TimingDB, TimingReport
+
+parser = argparse.ArgumentParser(description="Compose Timing Report")
+
+parser.add_argument('--release', type=str, help="Major Release Version or major-type (eg 9-beta)", required=True)
+parser.add_argument('--compose', type=str, help="Compose directory (defaults to the latest compose)")
+parser.add_argument('--previous', type=str, help="Compose directory to compare against (defaults to the one before)")
+parser.add_argument('--threshold', type=float, default=10.0, help="Percent slower before a unit is reported")
+parser.add_argument('--limit', type=int, default=20, help="How many slower units to list")
+parser.add_argument('--run', type=str, action='append',
+                    help="Only report on this run id (can be given more than once). By default every run is merged, latest result of each unit wins")
+parser.add_argument('--list-runs', action='store_true', help="List the recorded runs and exit")
+results = parser.parse_args()
+rlvars = rldict[results.release]
+major = rlvars['major']
+
+compose_base = os.path.join(config['compose_root'], major)
+compose_dir = results.compose
+if not compose_dir:
+    compose_dir = os.path.join(
+            compose_base,
+            f"latest-{config['shortname']}-{rlvars['profile']}"
+    )
+
+def previous_compose(current):
+    """
+    Finds the compose that came before the current one and has timing data
+    """
+    current = os.path.realpath(current)
+    candidates = []
+    for path in glob.glob(os.path.join(compose_base, f"{config['shortname']}-*")):
+        if os.path.islink(path) or os.path.realpath(path) == current:
+            continue
+        if not os.path.exists(os.path.join(path, 'work', TimingDB.FILENAME)):
+            continue
+        if os.path.basename(path) < os.path.basename(current):
+            candidates.append(path)
+
+    return max(candidates, key=os.path.basename) if candidates else None
+
+def run():
+    if not os.path.exists(compose_dir):
+        raise SystemExit(Color.FAIL + 'Compose directory does not exist: ' + compose_dir)
+
+    records = TimingDB.read(os.path.join(compose_dir, 'work', TimingDB.FILENAME))
+    if results.list_runs:
+        for run_id, phase, units, start, end in TimingDB.runs(records):
+            print('{}  {:<20} {:>5} units  {}'.format(
+                run_id,
+                phase,
+                units,
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))
+            ))
+        return
+
+    previous_dir = results.previous or previous_compose(compose_dir)
+    previous = []
+    if previous_dir:
+        previous = TimingDB.read(os.path.join(previous_dir, 'work', TimingDB.FILENAME))
+
+    print('Compose: ' + os.path.realpath(compose_dir))
+    print('Previous: ' + (os.path.realpath(previous_dir) if previous_dir else 'none'))
+    print()
+    report = TimingReport(
+            records,
+            previous,
+            threshold=results.threshold,
+            limit=results.limit,
+            runs=results.run
+    )
+    print(report.render())
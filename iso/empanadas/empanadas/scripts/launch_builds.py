@@ -13,6 +13,8 @@ parser = argparse.ArgumentParser(description="Generate Kubernetes Jobs to run lo
 parser.add_argument('--release', type=str, help="Major Release Version: (8|9)", required=True)
 parser.add_argument('--env', type=str, help="environment: one of (eks|ext|all). presently jobs are scheduled on different kubernetes clusters", required=True)
 parser.add_argument('--rc', action='store_true', help="Release Candidate, Beta, RLN")
+parser.add_argument('--lorax-compression', type=str, choices=['gz', 'zst'], default='gz',
+                    help="Compression of the uploaded lorax tarball")
 results = parser.parse_args()
 rlvars = rldict[results.release]
 major = rlvars['major']
@@ -37,12 +39,13 @@ def run():
         command += ["--rc"]
     else:
         command += ["--hashed"]
+    command += ["--lorax-compression", results.lorax_compression]
 
     buildstamp = datetime.datetime.utcnow()
 
     out = ""
     for architecture in arches:
-        copy_command = (f"aws s3 cp --recursive --exclude=* --include=lorax* "
+        copy_command = (f"s3-upload --include='lorax*' "
                             f"/var/lib/mock/rocky-{ major }.{ minor }-$(uname -m)/root/builddir/ "
                             f"s3://resf-empanadas/buildiso-{ major }-{ architecture }/{ buildstamp.strftime('%s') }/"
         )
@@ -15,6 +15,7 @@ parser.add_argument('--arch', type=str, help="Architecture")
 parser.add_argument('--local-compose', action='store_true', help="Compose Directory is Here")
 parser.add_argument('--force-unpack', action='store_true', help="Force an unpack")
 parser.add_argument('--force-download', action='store_true', help="Force a download")
+parser.add_argument('--workers', type=int, default=4, help="Arches pulled at once")
 parser.add_argument('--s3-region', type=str, help="S3 region (overrides defaults)")
 parser.add_argument('--s3-bucket', type=str, help="S3 bucket name (overrides defaults)")
 parser.add_argument('--s3-bucket-url', type=str, help="S3 bucket url (overrides defaults)")
@@ -32,6 +33,7 @@ a = IsoBuild(
         arch=results.arch,
         force_unpack=results.force_unpack,
         force_download=results.force_download,
+        pull_workers=results.workers,
         compose_dir_is_here=results.local_compose,
         s3_region=results.s3_region,
         s3_bucket=results.s3_bucket,
@@ -0,0 +1,45 @@
+# Uploads build artifacts to s3 with parallel multipart transfers
+
+import argparse
+import logging
+import sys
+
+from empanadas.util.s3 import S3Transfers
+
+parser = argparse.ArgumentParser(description="Upload artifacts to s3")
+
+parser.add_argument('source', type=str, help="Directory to upload")
+parser.add_argument('destination', type=str, help="s3://bucket/prefix/")
+parser.add_argument('--include', type=str, action='append',
+                    help="Only upload relative paths matching this glob (repeatable)")
+parser.add_argument('--region', type=str, help="S3 region")
+parser.add_argument('--concurrency', type=int, default=10, help="Parts in flight per object")
+parser.add_argument('--workers', type=int, default=4, help="Objects in flight at once")
+results = parser.parse_args()
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+handler = logging.StreamHandler(sys.stdout)
+handler.setLevel(logging.INFO)
+formatter = logging.Formatter(
+        '%(asctime)s :: %(name)s :: %(message)s',
+        '%Y-%m-%d %H:%M:%S'
+)
+handler.setFormatter(formatter)
+log.addHandler(handler)
+
+def run():
+    bucket, prefix = S3Transfers.split_url(results.destination)
+    transfers = S3Transfers(
+            bucket,
+            log,
+            region=results.region,
+            concurrency=results.concurrency,
+            workers=results.workers
+    )
+    uploaded = transfers.upload_dir(results.source, prefix, include=results.include)
+    if not uploaded:
+        log.error('Nothing to upload from %s', results.source)
+        sys.exit(1)
+    if any(isinstance(r, Exception) for r in uploaded.values()):
+        sys.exit(1)
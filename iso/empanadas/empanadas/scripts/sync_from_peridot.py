@@ -34,6 +34,19 @@ parser.add_argument('--disable-gpg-check', action='store_false')
 parser.add_argument('--disable-repo-gpg-check', action='store_false')
 parser.add_argument('--clean-old-packages', action='store_true')
 parser.add_argument('--use-staging', action='store_true')
+parser.add_argument('--disable-incremental', action='store_false')
+parser.add_argument('--engine', type=str, choices=['podman', 'native'], default='podman',
+                    help="Sync with dnf reposync in podman or natively in-process")
+parser.add_argument('--native-workers', type=int, default=8, help="Concurrent downloads for the native engine")
+parser.add_argument('--dedup', type=str, choices=['hardlink', 'reflink', 'none'],
+                    help="How identical packages are linked together after syncing (defaults to the release config, otherwise none)")
+parser.add_argument('--package-pool', action='store_true',
+                    help="Link packages from, and add packages to, the shared package pool")
+parser.add_argument('--prune-pool', action='store_true',
+                    help="After syncing, remove packages from the pool that no compose links to")
+parser.add_argument('--measure-transfers', action='store_true',
+                    help="Record how much each unit transferred, for the compose report")
+parser.add_argument('--max-parallel', type=int, help="Maximum number of sync containers to run at once")
 
 # Parse them
 results = parser.parse_args()
@@ -66,6 +79,14 @@ a = RepoSync(
         repo_gpg_check=results.disable_repo_gpg_check,
         reposync_clean_old=results.clean_old_packages,
         use_staging=results.use_staging,
+        max_parallel=results.max_parallel,
+        incremental=results.disable_incremental,
+        engine=results.engine,
+        native_workers=results.native_workers,
+        dedup=results.dedup or rlvars.get('dedup', 'none'),
+        package_pool=results.package_pool,
+        prune_pool=results.prune_pool,
+        measure_transfers=results.measure_transfers,
 )
 
 def run():
@@ -33,6 +33,7 @@ parser.add_argument('--log-level', type=str, default='INFO')
 parser.add_argument('--disable-gpg-check', action='store_false')
 parser.add_argument('--disable-repo-gpg-check', action='store_false')
 parser.add_argument('--clean-old-packages', action='store_true')
+parser.add_argument('--max-parallel', type=int, help="Maximum number of sync containers to run at once")
 
 # Parse them
 results = parser.parse_args()
@@ -65,6 +66,7 @@ a = SigRepoSync(
         gpg_check=results.disable_gpg_check,
         repo_gpg_check=results.disable_repo_gpg_check,
         reposync_clean_old=results.clean_old_packages,
+        max_parallel=results.max_parallel,
 )
 
 
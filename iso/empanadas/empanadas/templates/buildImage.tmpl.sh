@@ -7,7 +7,7 @@ VERSION="{{ revision }}"
 PRODUCT="{{ distname }}"
 MOCKBLD="{{ builddir }}"
 LORAXRES="{{ lorax_work_root }}"
-LORAX_TAR="lorax-{{ revision }}-{{ arch }}.tar.gz"
+LORAX_TAR="lorax-{{ revision }}-{{ arch }}.tar.{{ compression|default('gz') }}"
 LOGFILE="lorax-{{ arch }}.log"
 BUGURL="{{ bugurl }}"
 
@@ -58,7 +58,7 @@ fi
 
 find lorax -perm 700 -exec chmod 755 {} \;
 
-tar czf "${LORAX_TAR}" lorax "${LOGFILE}"
+tar {% if compression == 'zst' %}-I 'zstd -T0 -10' -cf{% else %}czf{% endif %} "${LORAX_TAR}" lorax "${LOGFILE}"
 
 tar_ret_val=$?
 if [ $ret_val -ne 0 ]; then
@@ -6,8 +6,8 @@
 set -o pipefail
 
 # Vars
-MOCK_CFG="/var/tmp/lorax-{{ releasever }}.cfg"
-MOCK_ROOT="/var/lib/mock/{{ shortname|lower }}-{{ releasever }}-{{ arch }}"
+MOCK_CFG="{{ mock_cfg|default("/var/tmp/lorax-" ~ releasever ~ ".cfg") }}"
+MOCK_ROOT="/var/lib/mock/{{ mock_root|default(shortname|lower ~ "-" ~ releasever ~ "-" ~ arch) }}"
 MOCK_RESL="${MOCK_ROOT}/result"
 MOCK_CHRO="${MOCK_ROOT}/root"
 MOCK_LOG="${MOCK_RESL}/mock-output.log"
@@ -40,7 +40,7 @@ mock \
 
 mock_ret_val=$?
 if [ $mock_ret_val -eq 0 ]; then
-  # Copy resulting data to /var/lib/mock/{{ shortname|lower }}-{{ releasever }}-{{ arch }}/result
+  # Copy resulting data to ${MOCK_RESL}
   mkdir -p "${MOCK_RESL}"
   cp "${MOCK_CHRO}${BUILDDIR}/${IMAGE_ISO}" "${MOCK_RESL}"
   cp "${MOCK_CHRO}${BUILDDIR}/${IMAGE_ISO}.manifest" "${MOCK_RESL}"
@@ -6,12 +6,81 @@ from empanadas.util.check import (
         Checks,
 )
 
+from empanadas.util.checksum import (
+        ChecksumEngine,
+        ChecksumCache,
+)
+
+from empanadas.util.publish import (
+        ArtifactPublisher,
+)
+
+from empanadas.util.download import (
+        DownloadManager,
+)
+
+from empanadas.util.s3 import (
+        S3Transfers,
+)
+
+from empanadas.util.bucket_index import (
+        BucketIndex,
+)
+
+from empanadas.util.iso9660 import (
+        IsoReader,
+)
+
+from empanadas.util.unpack import (
+        Unpacker,
+)
+
 from empanadas.util.shared import (
         Shared,
         ArchCheck,
         Idents,
 )
 
+from empanadas.util.podman_utils import (
+        ContainerUnit,
+        ContainerResult,
+        PodmanSupervisor,
+)
+
+from empanadas.util.mock_utils import (
+        MockUnit,
+        MockScheduler,
+)
+
+from empanadas.util.timing import (
+        TimingDB,
+        TimingReport,
+)
+
+from empanadas.util.repodata import (
+        RepoMD,
+)
+
+from empanadas.util.native_sync import (
+        NativeSync,
+)
+
+from empanadas.util.dedup import (
+        Dedup,
+)
+
+from empanadas.util.pool import (
+        PackagePool,
+)
+
+from empanadas.util.clone import (
+        TreeCloner,
+)
+
+from empanadas.util.graft_manifest import (
+        GraftManifest,
+)
+
 from empanadas.util.dnf_utils import (
         RepoSync,
         SigRepoSync
@@ -0,0 +1,197 @@
+"""
+Answers "what is the latest artifact" from one listing of the bucket.
+"""
+
+import bisect
+import hashlib
+import json
+import os
+import time
+from xml.etree import ElementTree
+
+import requests
+
+from empanadas.common import Color
+
+class BucketIndex:
+    """
+    Holds the sorted keys under a handful of prefixes of the artifact
+    bucket, such as buildimage-9.5-x86_64/ or buildiso-9-amd64/. Each prefix
+    is listed once and the key list is kept on disk for ttl seconds, so
+    every image, variant and arch of a pull is answered from memory with a
+    bisect instead of a fresh scan of the whole bucket.
+    """
+    def __init__(self, keys):
+        self.keys = sorted(set(keys))
+
+    @staticmethod
+    def prefix_for(root_prefix, release, arch, translators=None) -> str:
+        """
+        The prefix builds of an arch are uploaded under. ISO builds are
+        stored by major version and the kube arch name.
+        """
+        if root_prefix == 'buildiso':
+            arch = translators[arch] if translators else arch
+            release = release.split('.')[0]
+        return f'{root_prefix}-{release}-{arch}/'
+
+    def under(self, prefix) -> list:
+        """
+        Every key starting with prefix, in order
+        """
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', lo=start)
+        return self.keys[start:end]
+
+    @staticmethod
+    def matches(key, release, name, filetype, arch) -> bool:
+        return key.endswith(filetype) and release in key and name in key and arch in key
+
+    def latest(self, prefix, release, name, filetype, arch) -> str:
+        """
+        The newest key under prefix for this artifact, or None. Keys sort by
+        their build timestamp, so that is the last one that matches.
+        """
+        for key in reversed(self.under(prefix)):
+            if BucketIndex.matches(key, release, name, filetype, arch):
+                return key
+        return None
+
+    def latest_by_arch(self, root_prefix, release, arches, filetype, name, translators=None) -> dict:
+        """
+        {arch: latest key} for every arch that has one
+        """
+        data = {}
+        for arch in arches:
+            prefix = BucketIndex.prefix_for(root_prefix, release, arch, translators)
+            key = self.latest(prefix, release, name, filetype, arch)
+            if key:
+                data[arch] = key
+        return data
+
+    @staticmethod
+    def s3_lister(client, bucket):
+        """
+        Lists a prefix with list_objects_v2
+        """
+        def lister(prefix):
+            keys = []
+            paginator = client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+                keys.extend(obj['Key'] for obj in page.get('Contents', []))
+            return keys
+        return lister
+
+    @staticmethod
+    def parse_listing(stream, on_key):
+        """
+        Streams one ListBucketResult page, calling on_key for every key as
+        it is parsed. Elements are dropped once read, so memory does not
+        grow with the page. Returns whether the listing is truncated and
+        the last key seen.
+        """
+        truncated = False
+        last = None
+        parser = ElementTree.iterparse(stream, events=('start', 'end'))
+        _, root = next(parser)
+        for event, elem in parser:
+            if event != 'end':
+                continue
+            # Drop the namespace, S3 and its clones differ on it
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if tag == 'Key':
+                last = elem.text
+                on_key(last)
+            elif tag == 'IsTruncated':
+                truncated = (elem.text or '').strip() == 'true'
+            elif tag == 'Contents':
+                root.clear()
+        return truncated, last
+
+    @staticmethod
+    def list_http(session, bucket_url, prefix, on_key, logger, page_size=1000):
+        """
+        Pages through a prefix of the public ListObjects endpoint, handing
+        every key to on_key
+        """
+        marker = None
+        while True:
+            params = {'prefix': prefix, 'max-keys': str(page_size)}
+            if marker:
+                params['marker'] = marker
+            with session.get(bucket_url, params=params, stream=True, timeout=100) as resp:
+                resp.raise_for_status()
+                resp.raw.decode_content = True
+                truncated, last = BucketIndex.parse_listing(resp.raw, on_key)
+
+            if not truncated or last is None:
+                return
+            # ListObjects does not return NextMarker without a delimiter,
+            # the last key is the marker
+            marker = last
+            logger.info(Color.INFO + 'requesting another page starting with key: %s', marker)
+
+    @staticmethod
+    def http_lister(bucket_url, logger, page_size=1000):
+        """
+        Lists a prefix through the public ListObjects endpoint
+        """
+        def lister(prefix):
+            keys = []
+            with requests.Session() as session:
+                BucketIndex.list_http(session, bucket_url, prefix, keys.append, logger, page_size)
+            return keys
+        return lister
+
+    @staticmethod
+    def http_latest(bucket_url, root_prefix, release, arches, filetype, name,
+                    logger, translators=None, page_size=1000) -> dict:
+        """
+        {arch: latest key} straight from the listing, without an index.
+        Each arch only keeps the largest matching key seen so far.
+        """
+        data = {}
+        with requests.Session() as session:
+            for arch in arches:
+                def offer(key, arch=arch):
+                    if BucketIndex.matches(key, release, name, filetype, arch) and key > data.get(arch, ''):
+                        data[arch] = key
+
+                prefix = BucketIndex.prefix_for(root_prefix, release, arch, translators)
+                BucketIndex.list_http(session, bucket_url, prefix, offer, logger, page_size)
+        return data
+
+    @staticmethod
+    def load(source, prefixes, lister, logger, cache_dir=None, ttl=600):
+        """
+        Builds an index of prefixes. A prefix listed less than ttl seconds
+        ago is read back from cache_dir. source names the bucket in the
+        cache, so two buckets never share entries.
+        """
+        keys = []
+        for prefix in dict.fromkeys(prefixes):
+            cache = None
+            if cache_dir:
+                digest = hashlib.sha256(f'{source}\0{prefix}'.encode()).hexdigest()[:16]
+                cache = os.path.join(cache_dir, digest + '.json')
+                try:
+                    with open(cache) as f:
+                        cached = json.load(f)
+                    if time.time() - cached['time'] < ttl:
+                        keys.extend(cached['keys'])
+                        continue
+                except (OSError, ValueError, KeyError, TypeError):
+                    pass
+
+            logger.info(Color.INFO + 'Listing ' + source + '/' + prefix)
+            listed = lister(prefix)
+            keys.extend(listed)
+
+            if cache:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = f'{cache}.{os.getpid()}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump({'time': time.time(), 'keys': listed}, f)
+                os.replace(tmp, cache)
+
+        return BucketIndex(keys)
@@ -0,0 +1,198 @@
+"""
+Hashes large files (ISOs, images) quickly and in batches.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class ChecksumEngine:
+    """
+    Reads each file once with readinto() into a large buffer that is reused
+    per thread, feeding every requested algorithm from the same read.
+    Batches are hashed in a thread pool; hashlib drops the GIL while it
+    works on big buffers, so this scales with cores and disks. Symlinks are
+    resolved first, so any number of aliases of one file cost one read.
+    """
+    def __init__(self, algorithms=('sha256',), workers=4, buffer_size=4194304, cache=None):
+        for alg in algorithms:
+            # Fail early on a bad algorithm name
+            hashlib.new(alg)
+        self.algorithms = tuple(algorithms)
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.cache = cache
+        self._local = threading.local()
+
+    def _buffer(self):
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None:
+            buf = bytearray(self.buffer_size)
+            self._local.buffer = buf
+        return buf
+
+    def digest_file(self, path) -> dict:
+        """
+        Returns {algorithm: hexdigest} for a single file
+        """
+        hashers = [hashlib.new(alg) for alg in self.algorithms]
+        buf = self._buffer()
+        view = memoryview(buf)
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                read = f.readinto(buf)
+                if not read:
+                    break
+                chunk = view[:read]
+                for hasher in hashers:
+                    hasher.update(chunk)
+        return {alg: h.hexdigest() for alg, h in zip(self.algorithms, hashers)}
+
+    def digest_many(self, paths) -> dict:
+        """
+        Returns {path: {algorithm: hexdigest}} for every path. A path that
+        cannot be read maps to None. Paths that resolve to the same file are
+        only read once. With a cache, files that have not changed since they
+        were last hashed are not read at all.
+        """
+        paths = list(paths)
+        real = {path: os.path.realpath(path) for path in paths}
+        unique = list(dict.fromkeys(real.values()))
+
+        digests = {}
+        if self.cache is not None:
+            for path in unique:
+                cached = self.cache.lookup(path, self.algorithms)
+                if cached is not None:
+                    digests[path] = cached
+        unique = [path for path in unique if path not in digests]
+
+        def work(path):
+            try:
+                # Stat before reading, so a file changed mid-read is not
+                # cached under the new key.
+                st = os.stat(path)
+                digest = self.digest_file(path)
+            except OSError:
+                return path, None
+            if self.cache is not None:
+                self.cache.store(st, digest)
+            return path, digest
+
+        if unique:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(unique)))) as executor:
+                digests.update(executor.map(work, unique))
+            if self.cache is not None:
+                self.cache.save()
+
+        return {path: digests[real[path]] for path in paths}
+
+    @staticmethod
+    def checksum_line(path, hashtype, digest) -> str:
+        """
+        The CHECKSUM file format our sync scripts have always used. The name
+        is the one given, so an alias gets its own name with the target's
+        digest and size.
+        """
+        base = os.path.basename(path)
+        size = os.stat(path).st_size
+        # pylint: disable=consider-using-f-string
+        return "# %s: %s bytes\n%s (%s) = %s\n" % (
+                base,
+                size,
+                hashtype.upper(),
+                base,
+                digest
+        )
+
+class ChecksumCache:
+    """
+    Remembers digests in the compose work directory, keyed by device, inode,
+    size, mtime_ns and algorithm. A file that still matches its key is not
+    hashed again; anything that rewrites it changes the key. The file is
+    merged with what is on disk under a lock and swapped into place, so
+    several processes can share it.
+
+    Package digests from the sync go in a file of their own, PACKAGES, so
+    the ISO and image phases do not rewrite them with every batch.
+    """
+    FILENAME = 'checksums.json'
+    PACKAGES = 'package-checksums.json'
+
+    def __init__(self, work_root, filename=FILENAME):
+        self.path = os.path.join(work_root, filename)
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self.entries = self._load(self.path)
+
+    @staticmethod
+    def _load(path) -> dict:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @staticmethod
+    def key(st, algorithm) -> str:
+        return f'{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}:{algorithm}'
+
+    def lookup(self, path, algorithms):
+        """
+        Returns {algorithm: hexdigest} if every algorithm is cached for the
+        file as it is now, otherwise None
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        found = {}
+        with self._lock:
+            for alg in algorithms:
+                digest = self.entries.get(self.key(st, alg))
+                if digest is None:
+                    return None
+                found[alg] = digest
+        return found
+
+    def store(self, st, digests):
+        """
+        Records {algorithm: hexdigest} for the file st was taken from
+        """
+        with self._lock:
+            for alg, digest in digests.items():
+                key = self.key(st, alg)
+                self.entries[key] = digest
+                self._dirty[key] = digest
+
+    def save(self):
+        """
+        Writes new entries out. Stale entries are never looked up again and
+        go away with the compose's work directory.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, {}
+
+        work_root = os.path.dirname(self.path)
+        try:
+            os.makedirs(work_root, exist_ok=True)
+            with open(self.path + '.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                entries = self._load(self.path)
+                entries.update(dirty)
+                tmp = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp, 'w') as f:
+                    json.dump(entries, f, separators=(',', ':'))
+                os.replace(tmp, self.path)
+        except OSError:
+            # A cache that cannot be written only costs a rehash next time
+            return
+        with self._lock:
+            entries.update(self.entries)
+            self.entries = entries
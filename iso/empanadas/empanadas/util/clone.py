@@ -0,0 +1,142 @@
+"""
+Copies directory trees without rewriting data that can be shared.
+"""
+
+import errno
+import fcntl
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from empanadas.common import Color
+from empanadas.util.dedup import FICLONE
+
+class TreeCloner:
+    """
+    A copytree that tries the cheapest way to get each file across. It
+    reflinks first, which is copy on write, so either side can be changed
+    later without touching the other. Anything else is copied with
+    copy_file_range, which the kernel can do without passing the data
+    through userspace, and falls back to a plain copy. Files are never
+    hardlinked: the lorax tree is unpacked over again with --force-unpack,
+    and that would rewrite published images through the shared inode.
+    Files are handled by a pool of threads, and relative paths listed in
+    skip are never copied at all.
+    """
+    def __init__(self, logger, workers=8):
+        self.log = logger
+        self.workers = workers
+
+    @staticmethod
+    def _reflink(src, dest) -> bool:
+        """
+        Clones src into dest. Returns False if the filesystem cannot do it.
+        """
+        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError as exc:
+                if exc.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL):
+                    return False
+                raise
+        return True
+
+    @staticmethod
+    def _copy(src, dest, size):
+        """
+        Copies src to dest in the kernel where possible
+        """
+        if not hasattr(os, 'copy_file_range'):
+            shutil.copyfile(src, dest)
+            return
+
+        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+            offset = 0
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+            except OSError as exc:
+                if exc.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+            # Whatever copy_file_range did not manage, including a file that
+            # grew since it was stat'd
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst, 1048576)
+
+    def _clone_file(self, src, dest, st) -> str:
+        """
+        Puts a copy of src at dest. Returns how it got there.
+        """
+        # Never write through an existing file, it may be a link to src from
+        # an older tree
+        if os.path.lexists(dest):
+            os.remove(dest)
+
+        if self._reflink(src, dest):
+            shutil.copystat(src, dest)
+            return 'reflinked'
+
+        self._copy(src, dest, st.st_size)
+        shutil.copystat(src, dest)
+        return 'copied'
+
+    def clone(self, source, dest, skip=()) -> dict:
+        """
+        Copies source into dest, merging with whatever is already there like
+        copytree with dirs_exist_ok. Returns counts of each method and the
+        bytes that were actually written.
+        """
+        started = time.monotonic()
+        skip = set(skip)
+        os.makedirs(dest, exist_ok=True)
+
+        jobs = []
+        copied_dirs = []
+        dirs = [(source, dest)]
+        while dirs:
+            src_dir, dest_dir = dirs.pop()
+            os.makedirs(dest_dir, exist_ok=True)
+            with os.scandir(src_dir) as it:
+                for entry in it:
+                    rel = os.path.relpath(entry.path, source)
+                    if rel in skip:
+                        continue
+                    target = os.path.join(dest_dir, entry.name)
+                    if entry.is_dir():
+                        dirs.append((entry.path, target))
+                    elif entry.is_file():
+                        jobs.append((entry.path, target, entry.stat()))
+            copied_dirs.append((src_dir, dest_dir))
+
+        stats = {'reflinked': 0, 'copied': 0, 'written': 0}
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = [
+                    (st, executor.submit(self._clone_file, src, target, st))
+                    for src, target, st in jobs
+            ]
+            for st, future in futures:
+                method = future.result()
+                stats[method] += 1
+                if method == 'copied':
+                    stats['written'] += st.st_size
+
+        # Last, so adding files does not bump the times again
+        for src_dir, dest_dir in copied_dirs:
+            shutil.copystat(src_dir, dest_dir)
+
+        self.log.info(
+                Color.INFO + 'Cloned %s to %s in %.1fs: %s reflinked, %s copied (%.1f MiB written)' % (
+                    source,
+                    dest,
+                    time.monotonic() - started,
+                    stats['reflinked'],
+                    stats['copied'],
+                    stats['written'] / 1048576
+                )
+        )
+        return stats
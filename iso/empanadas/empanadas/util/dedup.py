@@ -0,0 +1,143 @@
+"""
+Finds byte-identical files in a compose and links them together.
+"""
+
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from empanadas.common import Color
+
+# From linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+class Dedup:
+    """
+    Indexes files by size and then sha256, and replaces every duplicate
+    with a hardlink (or a reflink, when asked for and the filesystem
+    supports it) to a single copy. Files are only hashed when another file
+    of the same size exists on the same filesystem, and files that are
+    already linked are not hashed again. Each replacement is done through a
+    temporary file and os.replace, so the path is never missing.
+    """
+    def __init__(self, logger, mode='hardlink', suffixes=('.rpm',), workers=8):
+        if mode not in ('hardlink', 'reflink'):
+            raise SystemExit(Color.FAIL + 'Unknown dedup mode: ' + mode)
+        self.log = logger
+        self.mode = mode
+        self.suffixes = tuple(suffixes)
+        self.workers = workers
+
+    def scan(self, roots) -> dict:
+        """
+        Groups (device, size) -> {inode: [paths]} for every matching file
+        """
+        index = {}
+        for root in roots:
+            stack = [root]
+            while stack:
+                current = stack.pop()
+                try:
+                    with os.scandir(current) as it:
+                        for entry in it:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False) and entry.name.endswith(self.suffixes):
+                                st = entry.stat(follow_symlinks=False)
+                                inodes = index.setdefault((st.st_dev, st.st_size), {})
+                                inodes.setdefault(st.st_ino, []).append(entry.path)
+                except (FileNotFoundError, NotADirectoryError, PermissionError):
+                    continue
+        return index
+
+    @staticmethod
+    def _sha256(path) -> str:
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1048576), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def _reflink(self, src, tmp):
+        """
+        Clones src into tmp. Returns False if the filesystem cannot do it.
+        """
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError as exc:
+                if exc.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL):
+                    return False
+                raise
+        shutil.copystat(src, tmp)
+        return True
+
+    def _replace(self, src, dest) -> bool:
+        """
+        Points dest at the same data as src
+        """
+        tmp = os.path.join(os.path.dirname(dest), '.' + os.path.basename(dest) + '.dedup')
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+        try:
+            if self.mode == 'reflink' and self._reflink(src, tmp):
+                os.replace(tmp, dest)
+                return True
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            os.link(src, tmp)
+            os.replace(tmp, dest)
+            return True
+        except OSError as exc:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            self.log.warning(Color.WARN + 'Could not dedup ' + dest + ': ' + str(exc))
+            return False
+
+    def run(self, roots) -> dict:
+        """
+        Dedups every matching file under roots. Returns counts and the bytes
+        saved.
+        """
+        index = self.scan(roots)
+        stats = {'files': 0, 'linked': 0, 'saved': 0}
+        candidates = []
+        for (_, size), inodes in index.items():
+            stats['files'] += sum(len(paths) for paths in inodes.values())
+            if len(inodes) > 1:
+                candidates.append((size, inodes))
+
+        # Hash one path per inode, everything else is already linked
+        to_hash = [paths[0] for _, inodes in candidates for paths in inodes.values()]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            digests = dict(zip(to_hash, executor.map(self._sha256, to_hash)))
+
+        for size, inodes in candidates:
+            by_digest = {}
+            for paths in inodes.values():
+                by_digest.setdefault(digests[paths[0]], []).append(paths)
+
+            for groups in by_digest.values():
+                if len(groups) < 2:
+                    continue
+                # Keep the inode with the most links already pointing at it
+                groups.sort(key=len, reverse=True)
+                keep = groups[0][0]
+                for paths in groups[1:]:
+                    for path in paths:
+                        if self._replace(keep, path):
+                            stats['linked'] += 1
+                    stats['saved'] += size
+
+        self.log.info(
+                Color.INFO + 'Dedup: %s files scanned, %s replaced, %.1f MiB saved' % (
+                    stats['files'],
+                    stats['linked'],
+                    stats['saved'] / 1048576
+                )
+        )
+        return stats
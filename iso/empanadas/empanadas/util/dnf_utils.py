@@ -3,22 +3,23 @@ Syncs yum repos for mirroring and composing.
 
 Louis Abel <label AT rockylinux.org>
 """
-#import shutil
+import shutil
 import logging
 import sys
 import os
 import os.path
-import subprocess
-import shlex
 import time
 import glob
 #import pipes
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from xml.etree import ElementTree
 
+import requests
 from jinja2 import Environment, FileSystemLoader
 
 import empanadas
 from empanadas.common import Color, _rootdir
-from empanadas.util import Shared
+from empanadas.util import Shared, ContainerUnit, ContainerResult, PodmanSupervisor, TimingDB, RepoMD, NativeSync, Dedup, PackagePool, ChecksumCache
 
 # initial treeinfo data is made here
 import productmd.treeinfo
@@ -63,6 +64,14 @@ class RepoSync:
             logger=None,
             log_level='INFO',
             use_staging: bool = False,
+            max_parallel=None,
+            incremental: bool = True,
+            engine: str = 'podman',
+            native_workers: int = 8,
+            dedup: str = 'none',
+            package_pool: bool = False,
+            prune_pool: bool = False,
+            measure_transfers: bool = False,
             ):
 
         self.nofail = nofail
@@ -79,6 +88,21 @@ class RepoSync:
         self.fpsync = fpsync
         # Enables podman syncing, which should effectively speed up operations
         self.parallel = parallel
+        # Caps how many containers run at once across every repo
+        self.max_parallel = max_parallel
+        # Skips syncing repos whose repomd.xml has not changed
+        self.incremental = incremental
+        # podman runs dnf reposync in containers, native syncs in-process
+        self.engine = engine
+        # Concurrent downloads the native engine keeps going
+        self.native_workers = native_workers
+        # Links identical RPMs together after a sync (hardlink, reflink,
+        # none). This rewrites the sync root, so it is off unless asked for.
+        self.dedup = dedup
+        # Seeds new trees from, and feeds, the compose_root/pool package pool
+        self.package_pool = package_pool
+        self.prune_pool = prune_pool
+        self.measure_transfers = measure_transfers
         # This makes it so every repo is synced at the same time.
         # This is EXTREMELY dangerous.
         self.just_pull_everything = just_pull_everything
@@ -293,6 +317,9 @@ class RepoSync:
 
         if not self.skip_all:
             self.sync(self.repo, sync_root, work_root, log_root, global_work_root, self.arch)
+            if self.dedup != 'none':
+                self.log.info(Color.INFO + 'Deduplicating packages in %s' % sync_root)
+                Dedup(self.log, mode=self.dedup).run([sync_root])
 
         if self.fullrun:
             Shared.deploy_extra_files(self.extra_files, sync_root, global_work_root, self.log)
@@ -329,9 +356,12 @@ class RepoSync:
             * each architecture debug
             * each source
 
-        If parallel is true, we will run in podman.
+        If parallel is true, we will run in podman. The native engine does
+        not need containers at all.
         """
-        if self.parallel:
+        if self.engine == 'native':
+            self.native_sync(repo, sync_root, work_root, arch)
+        elif self.parallel:
             self.podman_sync(repo, sync_root, work_root, log_root, global_work_root, arch)
         else:
             Shared.norm_dnf_sync(self, repo, sync_root, work_root, arch, self.log)
@@ -354,8 +384,17 @@ class RepoSync:
         wait till all is finished
         """
         cmd = Shared.podman_cmd(self.log)
-        contrunlist = []
-        bad_exit_list = []
+        image, prebaked = Shared.sync_image(
+                cmd,
+                self.container,
+                self.gpgkey,
+                self.tmplenv,
+                self.log
+        )
+        units = []
+        targets = {}
+        repoids = {}
+        cache_arches = {}
         extra_dnf_args = ' '.join(self.extra_dnf_args.copy())
         reposync_delete = '--delete' if self.reposync_clean_old else ''
         self.log.info('Generating container entries')
@@ -423,6 +462,14 @@ class RepoSync:
                         'debug/tree'
                 )
 
+                targets[entry_name] = os_sync_path
+                repoids[entry_name] = (r, a)
+                cache_arches[entry_name] = a
+                if not self.ignore_debug and not a == 'source':
+                    targets[debug_entry_name] = debug_sync_path
+                    cache_arches[debug_entry_name] = a
+                    repoids[debug_entry_name] = (f'{r}-debug', a)
+
                 gpg_key_list = self.gpgkey
                 import_gpg_cmd = f"/usr/bin/rpm --import"
                 arch_force_cp = f"/usr/bin/sed 's|$basearch|{a}|g' "\
@@ -430,17 +477,21 @@ class RepoSync:
 
                 sync_log = f"{log_root}/{repo_name}-{a}.log"
                 debug_sync_log = f"{log_root}/{repo_name}-{a}-debug.log"
-                metadata_cmd = f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} --repoid={r} "\
-                        f"--forcearch {a} --assumeyes 2>&1"
+                metadata_cmd = f"/usr/bin/flock -x /var/cache/dnf/.{r}.lock "\
+                        f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} --repoid={r} "\
+                        f"--forcearch {a} --setopt=metadata_expire=0 --assumeyes 2>&1"
 
-                sync_cmd = f"/usr/bin/dnf reposync -c {self.dnf_config}.{a} --download-metadata "\
+                sync_cmd = f"/usr/bin/flock -s /var/cache/dnf/.{r}.lock "\
+                        f"/usr/bin/dnf reposync --setopt=metadata_expire=-1 -c {self.dnf_config}.{a} --download-metadata "\
                         f"--repoid={r} -p {os_sync_path} --forcearch {a} --norepopath "\
                         f"--remote-time --gpgcheck --assumeyes {reposync_delete} 2>&1"
 
-                debug_metadata_cmd = f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
-                        f"--repoid={r}-debug --forcearch {a} --assumeyes 2>&1"
+                debug_metadata_cmd = f"/usr/bin/flock -x /var/cache/dnf/.{r}-debug.lock "\
+                        f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
+                        f"--repoid={r}-debug --forcearch {a} --setopt=metadata_expire=0 --assumeyes 2>&1"
 
-                debug_sync_cmd = f"/usr/bin/dnf reposync -c {self.dnf_config}.{a} "\
+                debug_sync_cmd = f"/usr/bin/flock -s /var/cache/dnf/.{r}-debug.lock "\
+                        f"/usr/bin/dnf reposync --setopt=metadata_expire=-1 -c {self.dnf_config}.{a} "\
                         f"--download-metadata --repoid={r}-debug -p {debug_sync_path} "\
                         f"--forcearch {a} --gpgcheck --norepopath --remote-time "\
                         f"--assumeyes {reposync_delete} 2>&1"
@@ -453,6 +504,7 @@ class RepoSync:
                         import_gpg_cmd=import_gpg_cmd,
                         arch_force_cp=arch_force_cp,
                         dnf_plugin_cmd=dnf_plugin_cmd,
+                        prebaked=prebaked,
                         sync_cmd=sync_cmd,
                         metadata_cmd=metadata_cmd,
                         sync_log=sync_log,
@@ -465,6 +517,7 @@ class RepoSync:
                         import_gpg_cmd=import_gpg_cmd,
                         arch_force_cp=arch_force_cp,
                         dnf_plugin_cmd=dnf_plugin_cmd,
+                        prebaked=prebaked,
                         sync_cmd=debug_sync_cmd,
                         metadata_cmd=debug_metadata_cmd,
                         sync_log=debug_sync_log,
@@ -501,13 +554,18 @@ class RepoSync:
                             'kickstart'
                     )
 
-                    ks_metadata_cmd = f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
-                            f"--repoid={r} --forcearch {a} --assumeyes 2>&1"
+                    ks_metadata_cmd = f"/usr/bin/flock -x /var/cache/dnf/.{r}.lock "\
+                            f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
+                            f"--repoid={r} --forcearch {a} --setopt=metadata_expire=0 --assumeyes 2>&1"
 
-                    ks_sync_cmd = f"/usr/bin/dnf reposync -c {self.dnf_config}.{a} --download-metadata "\
+                    ks_sync_cmd = f"/usr/bin/flock -s /var/cache/dnf/.{r}.lock "\
+                            f"/usr/bin/dnf reposync --setopt=metadata_expire=-1 -c {self.dnf_config}.{a} --download-metadata "\
                             f"--repoid={r} -p {ks_sync_path} --forcearch {a} --norepopath "\
                             "--gpgcheck --assumeyes --remote-time 2>&1"
 
+                    targets[ks_entry_name] = ks_sync_path
+                    repoids[ks_entry_name] = (r, a)
+                    cache_arches[ks_entry_name] = a
                     ks_sync_log = f"{log_root}/{repo_name}-{a}-ks.log"
 
                     ks_sync_template = self.tmplenv.get_template('reposync.tmpl')
@@ -516,6 +574,7 @@ class RepoSync:
                             import_gpg_cmd=import_gpg_cmd,
                             arch_force_cp=arch_force_cp,
                             dnf_plugin_cmd=dnf_plugin_cmd,
+                            prebaked=prebaked,
                             sync_cmd=ks_sync_cmd,
                             metadata_cmd=ks_metadata_cmd,
                             sync_log=ks_sync_log
@@ -542,12 +601,17 @@ class RepoSync:
                         'source/tree'
                 )
 
+                targets[source_entry_name] = source_sync_path
+                cache_arches[source_entry_name] = 'source'
+                repoids[source_entry_name] = (f'{r}-source', None)
                 source_sync_log = f"{log_root}/{repo_name}-source.log"
 
-                source_metadata_cmd = f"/usr/bin/dnf makecache -c {self.dnf_config} "\
-                        f"--repoid={r}-source --assumeyes 2>&1"
+                source_metadata_cmd = f"/usr/bin/flock -x /var/cache/dnf/.{r}-source.lock "\
+                        f"/usr/bin/dnf makecache -c {self.dnf_config} "\
+                        f"--repoid={r}-source --setopt=metadata_expire=0 --assumeyes 2>&1"
 
-                source_sync_cmd = f"/usr/bin/dnf reposync -c {self.dnf_config} "\
+                source_sync_cmd = f"/usr/bin/flock -s /var/cache/dnf/.{r}-source.lock "\
+                        f"/usr/bin/dnf reposync --setopt=metadata_expire=-1 -c {self.dnf_config} "\
                         f"--download-metadata --repoid={r}-source -p {source_sync_path} "\
                         f"--gpgcheck --norepopath --remote-time --assumeyes {reposync_delete} 2>&1"
 
@@ -556,6 +620,7 @@ class RepoSync:
                         gpg_key_list=gpg_key_list,
                         import_gpg_cmd=import_gpg_cmd,
                         dnf_plugin_cmd=dnf_plugin_cmd,
+                        prebaked=prebaked,
                         sync_cmd=source_sync_cmd,
                         metadata_cmd=source_metadata_cmd,
                         sync_log=source_sync_log
@@ -566,72 +631,215 @@ class RepoSync:
                 source_entry_point_open.close()
                 os.chmod(source_entry_point_sh, 0o755)
 
-            # Spawn up all podman processes for repo
-            self.log.info(Color.INFO + 'Starting podman processes for %s ...' % r)
+            # Queue up all podman processes for repo
+            self.log.info(Color.INFO + 'Queuing podman processes for %s ...' % r)
+            self.log.info(Color.INFO + 'Arches: ' + ' '.join(arch_sync))
 
-            #print(entry_name_list)
             for pod in entry_name_list:
-                podman_cmd_entry = '{} run -d -it --security-opt label=disable -v "{}:{}" -v "{}:{}" -v "{}:{}" --name {} --entrypoint {}/{} {}'.format(
-                        cmd,
-                        self.compose_root,
-                        self.compose_root,
-                        self.dnf_config,
-                        self.dnf_config,
-                        entries_dir,
-                        entries_dir,
-                        pod,
-                        entries_dir,
-                        pod,
-                        self.container
-                )
-                #print(podman_cmd_entry)
-                process = subprocess.call(
-                        shlex.split(podman_cmd_entry),
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
+                units.append(ContainerUnit(
+                        name=pod,
+                        entries_dir=entries_dir,
+                        image=image,
+                        volumes=[
+                            (self.compose_root, self.compose_root),
+                            (self.dnf_config, self.dnf_config),
+                            (entries_dir, entries_dir),
+                            (Shared.dnf_cache_dir(work_root, cache_arches[pod]), '/var/cache/dnf'),
+                        ],
+                        group=r
+                ))
+
+            entry_name_list.clear()
+
+        timing = TimingDB(work_root, self.log, measure=self.measure_transfers)
+        skipped = []
+        if self.incremental:
+            unchanged = self.unchanged_units([u.name for u in units], targets, repoids)
+            skipped = [u for u in units if u.name in unchanged]
+            units = [u for u in units if u.name not in unchanged]
+            targets = {u.name: targets[u.name] for u in units if u.name in targets}
+            timing.record_skipped('sync', skipped)
+            for unit in skipped:
+                self.log.info(Color.INFO + 'Unchanged, skipping ' + unit.name)
+
+        pool = None
+        if self.package_pool:
+            pool = self.pool_seed([u.name for u in units], targets, repoids, work_root)
+
+        # Units from every repo share the same pool of slots and the biggest
+        # units (going by the last run) are started first. Without a cap, the
+        # concurrency is the same as the largest repo used to get on its own.
+        PodmanSupervisor.apply_durations(
+                units,
+                TimingDB.durations(
+                    os.path.join(self.compose_latest_dir, 'work', TimingDB.FILENAME),
+                    'sync'
                 )
+        )
+        max_parallel = self.max_parallel or PodmanSupervisor.widest_group(units)
 
-            join_all_pods = ' '.join(entry_name_list)
-            time.sleep(3)
-            self.log.info(Color.INFO + 'Syncing ' + r + ' ...')
-            self.log.info(Color.INFO + 'Arches: ' + ' '.join(arch_sync))
-            pod_watcher = f'{cmd} wait {join_all_pods}'
+        self.log.info(Color.INFO + 'Syncing ' + ', '.join(repos_to_sync) + ' ...')
+        self.log.info(Color.INFO + 'Running up to %s containers at once' % max_parallel)
+        supervisor = PodmanSupervisor(
+                cmd,
+                self.log,
+                max_parallel=max_parallel
+        )
+        on_complete, bad_exit_list = PodmanSupervisor.group_tracker(units, self.log)
+        results = supervisor.run(units, timing.recorder('sync', targets, on_complete))
+        timing.close()
+        if pool:
+            self.pool_ingest(pool, [r.name for r in results if r.ok], targets)
+
+        if len(bad_exit_list) > 0:
+            self.log.error(
+                    Color.BOLD + Color.RED + 'There were issues syncing these '
+                    'repositories:' + Color.END
+            )
+            for issue in bad_exit_list:
+                self.log.error(issue)
+        else:
+            self.log.info(
+                    '[' + Color.BOLD + Color.GREEN + ' OK ' + Color.END + '] '
+                    'No issues detected.'
+            )
 
-            #print(pod_watcher)
-            watch_man = subprocess.call(
-                    shlex.split(pod_watcher),
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
+        if len(skipped) > 0:
+            self.log.info(
+                    Color.INFO + '%s units were unchanged and not synced: ' % len(skipped) +
+                    ', '.join(u.name for u in skipped)
             )
 
-            # After the above is done, we'll check each pod process for an exit
-            # code.
-            pattern = "Exited (0)"
-            for pod in entry_name_list:
-                checkcmd = f'{cmd} ps -f status=exited -f name={pod}'
-                podcheck = subprocess.Popen(
-                        checkcmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        shell=True
-                )
+    def native_sync(self, repo, sync_root, work_root, arch):
+        """
+        Syncs every unit in-process with NativeSync instead of running dnf
+        reposync in containers. The units, paths and skipping of unchanged
+        units are the same as podman_sync.
+        """
+        if self.gpg_check:
+            self.log.warning(
+                    Color.WARN + 'The native engine verifies package checksums '
+                    'from the repository metadata but not GPG signatures.'
+            )
+
+        arches_to_sync = self.arches
+        if arch:
+            arches_to_sync = arch.split(',')
+
+        repos_to_sync = self.repos
+        if repo and not self.fullrun:
+            repos_to_sync = repo.split(',')
 
-                output, errors = podcheck.communicate()
-                if 'Exited (0)' not in output.decode():
-                    self.log.error(Color.FAIL + pod)
-                    bad_exit_list.append(pod)
+        # name -> (group, repoid, arch, path)
+        units = {}
+        for r in repos_to_sync:
+            repo_name = self.repo_renames.get(r, r)
+            arch_sync = arches_to_sync.copy()
+            if 'all' in r and 'x86_64' in arches_to_sync and self.multilib:
+                arch_sync.append('i686')
 
-            rmcmd = f'{cmd} rm {join_all_pods}'
+            for a in arch_sync:
+                units[f'{r}-{a}'] = (r, r, a, os.path.join(sync_root, repo_name, a, 'os'))
+                if not self.ignore_debug and not a == 'source':
+                    units[f'{r}-debug-{a}'] = (
+                            r,
+                            f'{r}-debug',
+                            a,
+                            os.path.join(sync_root, repo_name, a, 'debug/tree')
+                    )
+                if self.fullrun:
+                    units[f'{r}-ks-{a}'] = (r, r, a, os.path.join(sync_root, repo_name, a, 'kickstart'))
 
-            rmpod = subprocess.Popen(
-                    rmcmd,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    shell=True
+            if (not self.ignore_source and not arch) or (
+                    not self.ignore_source and arch == 'source'):
+                units[f'{r}-source'] = (
+                        r,
+                        f'{r}-source',
+                        None,
+                        os.path.join(sync_root, repo_name, 'source/tree')
+                )
+
+        timing = TimingDB(work_root, self.log, measure=self.measure_transfers)
+        targets = {name: u[3] for name, u in units.items()}
+        repoids = {name: (u[1], u[2]) for name, u in units.items()}
+        if self.incremental:
+            unchanged = self.unchanged_units(list(units), targets, repoids)
+            timing.record_skipped('sync', [
+                ContainerUnit(name=n, entries_dir='', image='', group=units[n][0]) for n in unchanged
+            ])
+            for name in sorted(unchanged):
+                self.log.info(Color.INFO + 'Unchanged, skipping ' + name)
+                del units[name]
+
+        pool = None
+        if self.package_pool:
+            pool = self.pool_seed(list(units), targets, repoids, work_root)
+
+        baseurls = {}
+        bad_exit_list = []
+        max_parallel = self.max_parallel or 4
+
+        def sync_unit(name):
+            group, repoid, a, path = units[name]
+            if a not in baseurls:
+                baseurls[a] = RepoMD.baseurls(self.dnf_config, a)
+            start = time.time()
+            exit_code = 0
+            try:
+                stats = engine.sync_repo(
+                        baseurls[a][repoid],
+                        path,
+                        delete=self.reposync_clean_old and '-ks-' not in name
+                )
+                self.log.info(
+                        Color.INFO + '%s: %s packages, %s downloaded (%.1f MiB), %s deleted' % (
+                            name,
+                            stats['packages'],
+                            stats['downloaded'],
+                            stats['bytes'] / 1048576,
+                            stats['deleted']
+                        )
+                )
+            except (
+                    requests.exceptions.RequestException,
+                    ElementTree.ParseError,
+                    OSError,
+                    ValueError,
+                    KeyError,
+                    SystemExit
+            ) as exc:
+                # One broken repo must not take every other unit down
+                self.log.error(Color.FAIL + name + ': ' + str(exc))
+                exit_code = 1
+            return ContainerResult(
+                    name=name,
+                    group=group,
+                    exit_code=exit_code,
+                    start=start,
+                    end=time.time()
             )
 
-            entry_name_list.clear()
-            self.log.info(Color.INFO + 'Syncing ' + r + ' completed')
+        self.log.info(Color.INFO + 'Syncing ' + ', '.join(repos_to_sync) + ' natively ...')
+        on_complete = timing.recorder('sync', {name: u[3] for name, u in units.items()})
+        cache = ChecksumCache(work_root, ChecksumCache.PACKAGES)
+        results = []
+        try:
+            with NativeSync(self.log, workers=self.native_workers, cache=cache) as engine:
+                with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+                    # Recorded as each unit finishes, so a crash keeps what
+                    # was already done
+                    for future in as_completed([executor.submit(sync_unit, name) for name in units]):
+                        result = future.result()
+                        results.append(result)
+                        on_complete(result)
+                        if not result.ok:
+                            bad_exit_list.append(result.name)
+        finally:
+            timing.close()
+            cache.save()
+
+        if pool:
+            self.pool_ingest(pool, [r.name for r in results if r.ok], targets)
 
         if len(bad_exit_list) > 0:
             self.log.error(
@@ -646,6 +854,91 @@ class RepoSync:
                     'No issues detected.'
             )
 
+    def unchanged_units(self, names, targets, repoids) -> set:
+        """
+        Compares the remote repomd.xml of each unit against the one already
+        synced. A unit is unchanged when both match and its last sync (going
+        by the timing database) succeeded. Kickstart units are never skipped.
+        """
+        last_exit = TimingDB.last_exit(
+                os.path.join(self.compose_latest_dir, 'work', TimingDB.FILENAME),
+                'sync'
+        )
+        baseurls = {}
+        checks = {}
+        for name in names:
+            if name not in repoids or '-ks-' in name or last_exit.get(name) != 0:
+                continue
+            repoid, a = repoids[name]
+            if a not in baseurls:
+                baseurls[a] = RepoMD.baseurls(self.dnf_config, a)
+            if repoid not in baseurls[a]:
+                continue
+            checks[name] = (baseurls[a][repoid], targets[name])
+
+        self.log.info(Color.INFO + 'Checking repomd.xml of %s units for changes' % len(checks))
+        return RepoMD.unchanged(checks, self.log)
+
+    def pool_seed(self, names, targets, repoids, work_root):
+        """
+        Links every package the pool already has into the trees about to be
+        synced, so reposync only has to fetch new ones. Returns the pool, or
+        None if it cannot be used.
+        """
+        pool = PackagePool(
+                os.path.join(self.compose_root, 'pool'),
+                self.log,
+                cache=ChecksumCache(work_root, ChecksumCache.PACKAGES)
+        )
+        baseurls = {}
+        seeds = []
+        for name in names:
+            if name not in repoids:
+                continue
+            repoid, a = repoids[name]
+            if a not in baseurls:
+                baseurls[a] = RepoMD.baseurls(self.dnf_config, a)
+            if repoid in baseurls[a]:
+                seeds.append((name, baseurls[a][repoid], targets[name]))
+
+        def seed(item):
+            name, baseurl, dest = item
+            try:
+                return name, pool.seed(engine.remote_packages(baseurl), dest)
+            except (requests.exceptions.RequestException, OSError, ValueError) as exc:
+                self.log.warning(Color.WARN + 'Could not seed ' + name + ' from the pool: ' + str(exc))
+                return name, {'linked': 0, 'bytes': 0}
+
+        self.log.info(Color.INFO + 'Linking known packages from the pool into %s trees' % len(seeds))
+        with NativeSync(self.log) as engine:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                for name, stats in executor.map(seed, seeds):
+                    if stats['linked'] > 0:
+                        self.log.info(
+                                Color.INFO + '%s: %s packages (%.1f MiB) linked from the pool' % (
+                                    name,
+                                    stats['linked'],
+                                    stats['bytes'] / 1048576
+                                )
+                        )
+
+        return pool if pool.usable else None
+
+    def pool_ingest(self, pool, names, targets):
+        """
+        Adds the packages of freshly synced trees to the pool, then drops
+        what no compose links to anymore when pruning is on
+        """
+        added = 0
+        for name in names:
+            if name in targets:
+                added += pool.ingest(targets[name])
+        self.log.info(Color.INFO + '%s new packages added to the pool' % added)
+
+        if self.prune_pool:
+            removed = pool.prune()
+            self.log.info(Color.INFO + '%s packages no compose uses were pruned from the pool' % removed)
+
     def repoclosure_work(self, sync_root, work_root, log_root):
         """
         This is where we run repoclosures, based on the configuration of each
@@ -657,8 +950,16 @@ class RepoSync:
         itself.)
         """
         cmd = Shared.podman_cmd(self.log)
+        image, prebaked = Shared.sync_image(
+                cmd,
+                self.container,
+                self.gpgkey,
+                self.tmplenv,
+                self.log
+        )
         entries_dir = os.path.join(work_root, "entries")
-        bad_exit_list = []
+        units = []
+        cache_arches = {}
 
         if not self.parallel:
             self.log.error('repoclosure is too slow to run one by one. enable parallel mode.')
@@ -678,6 +979,7 @@ class RepoSync:
             for arch in arches_for_repoclosure:
                 repo_combination = []
                 repoclosure_entry_name = f'repoclosure-{repo}-{arch}'
+                cache_arches[repoclosure_entry_name] = arch
                 repoclosure_entry_name_list.append(repoclosure_entry_name)
                 repoclosure_arch_list = self.repoclosure_map['arches'][arch]
 
@@ -699,91 +1001,71 @@ class RepoSync:
                         entries_dir,
                         repoclosure_entry_name
                 )
-                repoclosure_cmd = ('/usr/bin/dnf repoclosure {} '
-                        '--repofrompath={},file://{}/{}/{}/os --repo={} --check={} {} '
-                        '| tee -a {}/{}-repoclosure-{}.log').format(
-                        repoclosure_arch_list,
+                repoclosure_ids = [repo] + self.repoclosure_map['repos'][repo]
+                repoclosure_repos = '--repofrompath={},file://{}/{}/{}/os --repo={} {}'.format(
                         repo,
                         sync_root,
                         repo,
                         arch,
                         repo,
-                        repo,
-                        join_repo_comb,
-                        log_root,
-                        repo,
-                        arch
+                        join_repo_comb
+                )
+                repoclosure_log = f'{log_root}/{repo}-repoclosure-{arch}.log'
+                # The local trees may have changed since the cache was made
+                makecache_cmd = Shared.dnf_cache_lock(
+                        repoclosure_ids,
+                        f'/usr/bin/dnf makecache {repoclosure_repos} --forcearch {arch} '
+                        f'--setopt=metadata_expire=0 --assumeyes 2>&1 | tee -a {repoclosure_log}',
+                        mode='-x'
+                )
+                repoclosure_cmd = Shared.dnf_cache_lock(
+                        repoclosure_ids,
+                        f'/usr/bin/dnf repoclosure {repoclosure_arch_list} {repoclosure_repos} '
+                        f'--check={repo} --setopt=metadata_expire=-1 | tee -a {repoclosure_log}'
                 )
 
                 with open(repoclosure_entry_point_sh, "w+") as rcep:
                     rcep.write('#!/bin/bash\n')
                     rcep.write('set -o pipefail\n')
-                    rcep.write('/usr/bin/dnf install dnf-plugins-core -y\n')
-                    rcep.write('/usr/bin/dnf clean all\n')
+                    if not prebaked:
+                        rcep.write('/usr/bin/dnf install dnf-plugins-core -y\n')
+                    rcep.write(makecache_cmd + ' || exit 1\n')
                     rcep.write(repoclosure_cmd + '\n')
                     rcep.close()
 
                 os.chmod(repoclosure_entry_point_sh, 0o755)
                 repo_combination.clear()
 
-            self.log.info('Spawning pods for %s' % repo)
+            self.log.info('Queuing pods for %s' % repo)
             for pod in repoclosure_entry_name_list:
-                podman_cmd_entry = '{} run -d -it --security-opt label=disable -v "{}:{}" -v "{}:{}" -v "{}:{}" --name {} --entrypoint {}/{} {}'.format(
-                        cmd,
-                        self.compose_root,
-                        self.compose_root,
-                        self.dnf_config,
-                        self.dnf_config,
-                        entries_dir,
-                        entries_dir,
-                        pod,
-                        entries_dir,
-                        pod,
-                        self.container
-                )
-                #print(podman_cmd_entry)
-                process = subprocess.call(
-                        shlex.split(podman_cmd_entry),
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
-                )
-
-            join_all_pods = ' '.join(repoclosure_entry_name_list)
-            time.sleep(3)
-            self.log.info('Performing repoclosure on %s ... ' % repo)
-            pod_watcher = f'{cmd} wait {join_all_pods}'
-
-            watch_man = subprocess.call(
-                    shlex.split(pod_watcher),
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-            )
-
-            for pod in repoclosure_entry_name_list:
-                checkcmd = f'{cmd} ps -f status=exited -f name={pod}'
-                podcheck = subprocess.Popen(
-                        checkcmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        shell=True
-                )
-
-                output, errors = podcheck.communicate()
-                if 'Exited (0)' not in output.decode():
-                    self.log.error(Color.FAIL + pod)
-                    bad_exit_list.append(pod)
-
-            rmcmd = f'{cmd} rm {join_all_pods}'
-
-            rmpod = subprocess.Popen(
-                    rmcmd,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    shell=True
-            )
+                units.append(ContainerUnit(
+                        name=pod,
+                        entries_dir=entries_dir,
+                        image=image,
+                        volumes=[
+                            (self.compose_root, self.compose_root),
+                            (self.dnf_config, self.dnf_config),
+                            (entries_dir, entries_dir),
+                            (Shared.dnf_cache_dir(work_root, cache_arches[pod]), '/var/cache/dnf'),
+                        ],
+                        group=repo
+                ))
 
             repoclosure_entry_name_list.clear()
-            self.log.info('Syncing %s completed' % repo)
+
+        self.log.info('Performing repoclosure ...')
+        supervisor = PodmanSupervisor(
+                cmd,
+                self.log,
+                max_parallel=self.max_parallel or PodmanSupervisor.widest_group(units)
+        )
+        on_complete, bad_exit_list = PodmanSupervisor.group_tracker(
+                units,
+                self.log,
+                verb='Repoclosure for'
+        )
+        timing = TimingDB(work_root, self.log)
+        supervisor.run(units, timing.recorder('repoclosure', on_complete=on_complete))
 
         if len(bad_exit_list) > 0:
             self.log.error(
@@ -1209,6 +1491,10 @@ class RepoSync:
             self.log.info(Color.INFO + 'No treeinfo to tweak.')
             return
 
+        # sync_root is <compose>/compose, images that did not change since
+        # the last tweak are not hashed again.
+        cache = ChecksumCache(os.path.join(os.path.dirname(sync_root), 'work'))
+
         for a in arches_to_tree:
             for v in variants_to_tweak:
                 self.log.info(Color.INFO + 'Tweaking treeinfo for ' + a + ' ' + v)
@@ -1227,7 +1513,7 @@ class RepoSync:
                 }
 
                 try:
-                    Shared.treeinfo_modify_write(data, imagemap, self.log)
+                    Shared.treeinfo_modify_write(data, imagemap, self.log, cache=cache)
                 except Exception as e:
                     self.log.error(Color.FAIL + 'There was an error writing os treeinfo.')
                     self.log.error(e)
@@ -1247,7 +1533,7 @@ class RepoSync:
                 }
 
                 try:
-                    Shared.treeinfo_modify_write(ksdata, imagemap, self.log)
+                    Shared.treeinfo_modify_write(ksdata, imagemap, self.log, cache=cache)
                 except Exception as e:
                     self.log.error(Color.FAIL + 'There was an error writing kickstart treeinfo.')
                     self.log.error(e)
@@ -1380,6 +1666,36 @@ class RepoSync:
             else:
                 self.log.info(Color.INFO + message)
 
+        # Anything that made it to the compose without a CHECKSUM gets one
+        # now, all hashed together.
+        missing = []
+        for arch in self.arches:
+            for root in (sync_iso_root, sync_live_root, sync_images_root):
+                arch_root = os.path.join(root, arch)
+                if not os.path.exists(arch_root):
+                    continue
+                for entry in os.scandir(arch_root):
+                    if not entry.is_file() or entry.name == 'CHECKSUM':
+                        continue
+                    if entry.name.endswith(('.CHECKSUM', '.manifest')):
+                        continue
+                    if not os.path.exists(entry.path + '.CHECKSUM'):
+                        missing.append(entry.path)
+
+        if len(missing) > 0:
+            self.log.info(Color.INFO + 'Creating %s missing checksums' % len(missing))
+            checksums = Shared.get_checksums(
+                    missing,
+                    self.checksum,
+                    self.log,
+                    cache=ChecksumCache(work_root)
+            )
+            for path, checksum in checksums.items():
+                if not checksum:
+                    continue
+                with open(path + '.CHECKSUM', 'w+', encoding='utf-8') as c:
+                    c.write(checksum)
+
         # Combine all checksums here
         for arch in self.arches:
             iso_arch_root = os.path.join(sync_iso_root, arch)
@@ -1418,6 +1734,12 @@ class RepoSync:
         # Deploy final metadata for a close out
         self.deploy_metadata(sync_root)
 
+        # The shared dnf cache is only useful while the compose is being made
+        dnf_cache_root = os.path.join(work_root, 'dnf-cache')
+        if os.path.exists(dnf_cache_root):
+            self.log.info(Color.INFO + 'Removing shared dnf cache')
+            shutil.rmtree(dnf_cache_root, ignore_errors=True)
+
     def run_upstream_repoclosure(self):
         """
         This does a repoclosure check in peridot
@@ -1446,8 +1768,16 @@ class RepoSync:
             os.makedirs(log_root, exist_ok=True)
 
         cmd = Shared.podman_cmd(self.log)
+        image, prebaked = Shared.sync_image(
+                cmd,
+                self.container,
+                self.gpgkey,
+                self.tmplenv,
+                self.log
+        )
         entries_dir = os.path.join(work_root, "entries")
-        bad_exit_list = []
+        units = []
+        cache_arches = {}
         dnf_config = Shared.generate_conf(
                 self.shortname,
                 self.major_version,
@@ -1480,6 +1810,7 @@ class RepoSync:
             for arch in self.repoclosure_map['arches']:
                 repo_combination = []
                 repoclosure_entry_name = f'peridot-repoclosure-{repo}-{arch}'
+                cache_arches[repoclosure_entry_name] = arch
                 repoclosure_entry_name_list.append(repoclosure_entry_name)
                 repoclosure_arch_list = self.repoclosure_map['arches'][arch]
 
@@ -1500,86 +1831,62 @@ class RepoSync:
                         entries_dir,
                         repoclosure_entry_name
                 )
-                repoclosure_cmd = ('/usr/bin/dnf repoclosure {} '
-                        '--repo={} --check={} {} -c {} -y '
-                        '| tee -a {}/peridot-{}-repoclosure-{}.log').format(
-                        repoclosure_arch_list,
-                        repo,
-                        repo,
-                        join_repo_comb,
-                        dnf_config,
-                        log_root,
-                        repo,
-                        arch
+                repoclosure_ids = [repo] + self.repoclosure_map['repos'][repo]
+                repoclosure_log = f'{log_root}/peridot-{repo}-repoclosure-{arch}.log'
+                makecache_cmd = Shared.dnf_cache_lock(
+                        repoclosure_ids,
+                        f'/usr/bin/dnf makecache --repo={repo} {join_repo_comb} -c {dnf_config} '
+                        f'--forcearch {arch} --setopt=metadata_expire=0 --assumeyes 2>&1 '
+                        f'| tee -a {repoclosure_log}',
+                        mode='-x'
+                )
+                repoclosure_cmd = Shared.dnf_cache_lock(
+                        repoclosure_ids,
+                        f'/usr/bin/dnf repoclosure {repoclosure_arch_list} --repo={repo} '
+                        f'--check={repo} {join_repo_comb} -c {dnf_config} -y '
+                        f'--setopt=metadata_expire=-1 | tee -a {repoclosure_log}'
                 )
                 with open(repoclosure_entry_point_sh, "w+") as rcep:
                     rcep.write('#!/bin/bash\n')
                     rcep.write('set -o pipefail\n')
-                    rcep.write('/usr/bin/dnf install dnf-plugins-core -y\n')
-                    rcep.write('/usr/bin/dnf clean all\n')
+                    if not prebaked:
+                        rcep.write('/usr/bin/dnf install dnf-plugins-core -y\n')
+                    rcep.write(makecache_cmd + ' || exit 1\n')
                     rcep.write(repoclosure_cmd + '\n')
                     rcep.close()
                 os.chmod(repoclosure_entry_point_sh, 0o755)
                 repo_combination.clear()
 
-            self.log.info('Spawning pods for %s' % repo)
-            for pod in repoclosure_entry_name_list:
-                podman_cmd_entry = '{} run -d -it --security-opt label=disable -v "{}:{}" -v "{}:{}" -v "{}:{}" --name {} --entrypoint {}/{} {}'.format(
-                        cmd,
-                        self.compose_root,
-                        self.compose_root,
-                        dnf_config,
-                        dnf_config,
-                        entries_dir,
-                        entries_dir,
-                        pod,
-                        entries_dir,
-                        pod,
-                        self.container
-                )
-                #print(podman_cmd_entry)
-                process = subprocess.call(
-                        shlex.split(podman_cmd_entry),
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
-                )
-
-            join_all_pods = ' '.join(repoclosure_entry_name_list)
-            time.sleep(3)
-            self.log.info('Performing repoclosure on %s ... ' % repo)
-            pod_watcher = f'{cmd} wait {join_all_pods}'
-
-            watch_man = subprocess.call(
-                    shlex.split(pod_watcher),
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-            )
-
+            self.log.info('Queuing pods for %s' % repo)
             for pod in repoclosure_entry_name_list:
-                checkcmd = f'{cmd} ps -f status=exited -f name={pod}'
-                podcheck = subprocess.Popen(
-                        checkcmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        shell=True
-                )
-
-                output, errors = podcheck.communicate()
-                if 'Exited (0)' not in output.decode():
-                    self.log.error(Color.FAIL + pod)
-                    bad_exit_list.append(pod)
-
-            rmcmd = f'{cmd} rm {join_all_pods}'
-
-            rmpod = subprocess.Popen(
-                    rmcmd,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    shell=True
-            )
+                units.append(ContainerUnit(
+                        name=pod,
+                        entries_dir=entries_dir,
+                        image=image,
+                        volumes=[
+                            (self.compose_root, self.compose_root),
+                            (dnf_config, dnf_config),
+                            (entries_dir, entries_dir),
+                            (Shared.dnf_cache_dir(work_root, cache_arches[pod]), '/var/cache/dnf'),
+                        ],
+                        group=repo
+                ))
 
             repoclosure_entry_name_list.clear()
-            self.log.info('Syncing %s completed' % repo)
+
+        self.log.info('Performing repoclosure ...')
+        supervisor = PodmanSupervisor(
+                cmd,
+                self.log,
+                max_parallel=self.max_parallel or PodmanSupervisor.widest_group(units)
+        )
+        on_complete, bad_exit_list = PodmanSupervisor.group_tracker(
+                units,
+                self.log,
+                verb='Repoclosure for'
+        )
+        timing = TimingDB(work_root, self.log)
+        supervisor.run(units, timing.recorder('upstream-repoclosure', on_complete=on_complete))
 
         if len(bad_exit_list) > 0:
             self.log.error(
@@ -1619,6 +1926,7 @@ class SigRepoSync:
             reposync_clean_old: bool = False,
             logger=None,
             log_level='INFO',
+            max_parallel=None,
         ):
         self.nofail = nofail
         self.dryrun = dryrun
@@ -1632,6 +1940,8 @@ class SigRepoSync:
         self.refresh_extra_files = refresh_extra_files
         # Enables podman syncing, which should effectively speed up operations
         self.parallel = parallel
+        # Caps how many containers run at once across every repo
+        self.max_parallel = max_parallel
         # Relevant config items
         self.major_version = major
         self.date_stamp = config['date_stamp']
@@ -1877,7 +2187,16 @@ class SigRepoSync:
         wait till all is finished
         """
         cmd = Shared.podman_cmd(self.log)
-        bad_exit_list = []
+        image, prebaked = Shared.sync_image(
+                cmd,
+                self.container,
+                self.gpgkey,
+                self.tmplenv,
+                self.log
+        )
+        units = []
+        targets = {}
+        cache_arches = {}
         extra_dnf_args = ' '.join(self.extra_dnf_args.copy())
         reposync_delete = '--delete' if self.reposync_clean_old else ''
         self.log.info('Generating container entries')
@@ -1941,23 +2260,33 @@ class SigRepoSync:
                         r + '-debug'
                 )
 
+                targets[entry_name] = os_sync_path
+                cache_arches[entry_name] = a
+                if not self.ignore_debug and not a == 'source':
+                    targets[debug_entry_name] = debug_sync_path
+                    cache_arches[debug_entry_name] = a
+
                 gpg_key_list = self.gpgkey
                 import_gpg_cmd = f"/usr/bin/rpm --import"
                 arch_force_cp = f"/usr/bin/sed 's|$basearch|{a}|g' {self.dnf_config} > {self.dnf_config}.{a}"
                 sync_log = f"{log_root}/{repo_name}-{a}.log"
                 debug_sync_log = f"{log_root}/{repo_name}-{a}-debug.log"
 
-                metadata_cmd = f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
-                        f"--repoid={r} --forcearch {a} --assumeyes 2>&1"
+                metadata_cmd = f"/usr/bin/flock -x /var/cache/dnf/.{r}.lock "\
+                        f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
+                        f"--repoid={r} --forcearch {a} --setopt=metadata_expire=0 --assumeyes 2>&1"
 
-                sync_cmd = f"/usr/bin/dnf reposync -c {self.dnf_config}.{a} --download-metadata "\
+                sync_cmd = f"/usr/bin/flock -s /var/cache/dnf/.{r}.lock "\
+                        f"/usr/bin/dnf reposync --setopt=metadata_expire=-1 -c {self.dnf_config}.{a} --download-metadata "\
                         f"--repoid={r} -p {os_sync_path} --forcearch {a} --norepopath "\
                         f"--remote-time --gpgcheck --assumeyes {reposync_delete} 2>&1"
 
-                debug_metadata_cmd = f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
-                        f"--repoid={r}-debug --forcearch {a} --assumeyes 2>&1"
+                debug_metadata_cmd = f"/usr/bin/flock -x /var/cache/dnf/.{r}-debug.lock "\
+                        f"/usr/bin/dnf makecache -c {self.dnf_config}.{a} "\
+                        f"--repoid={r}-debug --forcearch {a} --setopt=metadata_expire=0 --assumeyes 2>&1"
 
-                debug_sync_cmd = f"/usr/bin/dnf reposync -c {self.dnf_config}.{a} "\
+                debug_sync_cmd = f"/usr/bin/flock -s /var/cache/dnf/.{r}-debug.lock "\
+                        f"/usr/bin/dnf reposync --setopt=metadata_expire=-1 -c {self.dnf_config}.{a} "\
                         f"--download-metadata --repoid={r}-debug -p {debug_sync_path} "\
                         f"--forcearch {a} --gpgcheck --norepopath --remote-time "\
                         f"--assumeyes {reposync_delete} 2>&1"
@@ -1970,6 +2299,7 @@ class SigRepoSync:
                         import_gpg_cmd=import_gpg_cmd,
                         arch_force_cp=arch_force_cp,
                         dnf_plugin_cmd=dnf_plugin_cmd,
+                        prebaked=prebaked,
                         sync_cmd=sync_cmd,
                         metadata_cmd=metadata_cmd,
                         sync_log=sync_log,
@@ -1983,6 +2313,7 @@ class SigRepoSync:
                         import_gpg_cmd=import_gpg_cmd,
                         arch_force_cp=arch_force_cp,
                         dnf_plugin_cmd=dnf_plugin_cmd,
+                        prebaked=prebaked,
                         sync_cmd=debug_sync_cmd,
                         metadata_cmd=debug_metadata_cmd,
                         sync_log=debug_sync_log,
@@ -2021,17 +2352,23 @@ class SigRepoSync:
                         r
                 )
 
+                targets[source_entry_name] = source_sync_path
+                cache_arches[source_entry_name] = 'source'
                 source_sync_log = f"{log_root}/{repo_name}-source.log"
 
-                source_metadata_cmd = ("/usr/bin/dnf makecache -c {} --repoid={}-source "
-                        "--assumeyes 2>&1").format(
+                source_metadata_cmd = ("/usr/bin/flock -x /var/cache/dnf/.{}-source.lock "
+                        "/usr/bin/dnf makecache -c {} --repoid={}-source "
+                        "--setopt=metadata_expire=0 --assumeyes 2>&1").format(
+                        r,
                         self.dnf_config,
                         r
                 )
 
-                source_sync_cmd = ("/usr/bin/dnf reposync -c {} "
+                source_sync_cmd = ("/usr/bin/flock -s /var/cache/dnf/.{}-source.lock "
+                        "/usr/bin/dnf reposync --setopt=metadata_expire=-1 -c {} "
                         "--download-metadata --repoid={}-source -p {} "
                         "--gpgcheck --norepopath --remote-time --assumeyes {} 2>&1").format(
+                        r,
                         self.dnf_config,
                         r,
                         source_sync_path,
@@ -2043,6 +2380,7 @@ class SigRepoSync:
                         gpg_key_list=gpg_key_list,
                         import_gpg_cmd=import_gpg_cmd,
                         dnf_plugin_cmd=dnf_plugin_cmd,
+                        prebaked=prebaked,
                         sync_cmd=source_sync_cmd,
                         metadata_cmd=source_metadata_cmd,
                         sync_log=source_sync_log,
@@ -2055,72 +2393,48 @@ class SigRepoSync:
                 source_entry_point_open.close()
                 os.chmod(source_entry_point_sh, 0o755)
 
-            # Spawn up all podman processes for repo
-            self.log.info(Color.INFO + 'Starting podman processes for %s ...' % r)
-
-            #print(entry_name_list)
-            for pod in entry_name_list:
-                podman_cmd_entry = '{} run -d -it --security-opt label=disable -v "{}:{}" -v "{}:{}" -v "{}:{}" --name {} --entrypoint {}/{} {}'.format(
-                        cmd,
-                        self.compose_base,
-                        self.compose_base,
-                        self.dnf_config,
-                        self.dnf_config,
-                        entries_dir,
-                        entries_dir,
-                        pod,
-                        entries_dir,
-                        pod,
-                        self.container
-                )
-                #print(podman_cmd_entry)
-                process = subprocess.call(
-                        shlex.split(podman_cmd_entry),
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
-                )
-
-            join_all_pods = ' '.join(entry_name_list)
-            time.sleep(3)
-            self.log.info(Color.INFO + 'Syncing ' + r + ' ...')
+            # Queue up all podman processes for repo
+            self.log.info(Color.INFO + 'Queuing podman processes for %s ...' % r)
             self.log.info(Color.INFO + 'Arches: ' + ' '.join(arch_sync))
-            pod_watcher = f'{cmd} wait {join_all_pods}'
 
-            #print(pod_watcher)
-            watch_man = subprocess.call(
-                    shlex.split(pod_watcher),
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-            )
-
-            # After the above is done, we'll check each pod process for an exit
-            # code.
-            pattern = "Exited (0)"
             for pod in entry_name_list:
-                checkcmd = f'{cmd} ps -f status=exited -f name={pod}'
-                podcheck = subprocess.Popen(
-                        checkcmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        shell=True
-                )
+                units.append(ContainerUnit(
+                        name=pod,
+                        entries_dir=entries_dir,
+                        image=image,
+                        volumes=[
+                            (self.compose_base, self.compose_base),
+                            (self.dnf_config, self.dnf_config),
+                            (entries_dir, entries_dir),
+                            (Shared.dnf_cache_dir(work_root, cache_arches[pod]), '/var/cache/dnf'),
+                        ],
+                        group=r
+                ))
 
-                output, errors = podcheck.communicate()
-                if 'Exited (0)' not in output.decode():
-                    self.log.error(Color.FAIL + pod)
-                    bad_exit_list.append(pod)
-
-            rmcmd = f'{cmd} rm {join_all_pods}'
+            entry_name_list.clear()
 
-            rmpod = subprocess.Popen(
-                    rmcmd,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    shell=True
-            )
+        # Units from every repo share the same pool of slots and the biggest
+        # units (going by the last run) are started first. Without a cap, the
+        # concurrency is the same as the largest repo used to get on its own.
+        PodmanSupervisor.apply_durations(
+                units,
+                TimingDB.durations(
+                    os.path.join(self.compose_latest_dir, 'work', TimingDB.FILENAME),
+                    'sync'
+                )
+        )
+        max_parallel = self.max_parallel or PodmanSupervisor.widest_group(units)
 
-            entry_name_list.clear()
-            self.log.info(Color.INFO + 'Syncing ' + r + ' completed')
+        self.log.info(Color.INFO + 'Syncing ' + ', '.join(repos_to_sync) + ' ...')
+        self.log.info(Color.INFO + 'Running up to %s containers at once' % max_parallel)
+        supervisor = PodmanSupervisor(
+                cmd,
+                self.log,
+                max_parallel=max_parallel
+        )
+        on_complete, bad_exit_list = PodmanSupervisor.group_tracker(units, self.log)
+        timing = TimingDB(work_root, self.log)
+        supervisor.run(units, timing.recorder('sync', targets, on_complete))
 
         if len(bad_exit_list) > 0:
             self.log.error(
@@ -0,0 +1,276 @@
+"""
+Downloads large artifacts over HTTP with resumable, parallel ranges.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+from empanadas.common import Color
+
+RETRYABLE = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.ChunkedEncodingError,
+        requests.exceptions.Timeout,
+)
+
+class RemoteChanged(Exception):
+    """
+    The object on the server changed while it was being fetched
+    """
+
+class Progress:
+    """
+    Counts the bytes of one transfer and logs how far along it is every
+    interval seconds, and the throughput once it is done.
+    """
+    def __init__(self, name, total, logger, already=0, interval=30):
+        self.name = name
+        self.total = total
+        self.log = logger
+        self.already = already
+        self.interval = interval
+        self.transferred = 0
+        self.started = time.monotonic()
+        self.last = self.started
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.transferred += count
+            now = time.monotonic()
+            if now - self.last < self.interval:
+                return
+            self.last = now
+            done = self.already + self.transferred
+        if self.total:
+            self.log.info(
+                    '%s: %.1f/%.1f MiB (%d%%, %.1f MiB/s)',
+                    self.name,
+                    done / 1048576,
+                    self.total / 1048576,
+                    done * 100 // self.total,
+                    self.rate()
+            )
+        else:
+            self.log.info('%s: %.1f MiB (%.1f MiB/s)', self.name, done / 1048576, self.rate())
+
+    def rate(self) -> float:
+        elapsed = max(time.monotonic() - self.started, 0.001)
+        return self.transferred / 1048576 / elapsed
+
+    def finish(self):
+        self.log.info(
+                Color.INFO + '%s: %.1f MiB in %.1fs (%.1f MiB/s)',
+                self.name,
+                self.transferred / 1048576,
+                time.monotonic() - self.started,
+                self.rate()
+        )
+
+class DownloadManager:
+    """
+    Streams artifacts to disk in chunks over one pooled session. Data goes
+    to dest.part and is renamed into place once complete. A dropped
+    connection resumes where it stopped with an HTTP Range request, and so
+    does a later run, guarded by If-Range so an object that changed in the
+    meantime is fetched again from the start. Objects larger than part_size
+    are fetched as parallel byte ranges into one preallocated file, and
+    fetch_many fetches many objects at once.
+    """
+    def __init__(self, logger, workers=8, part_size=67108864, chunk_size=262144,
+                 retries=5, timeout=300, interval=30):
+        self.log = logger
+        self.workers = workers
+        self.part_size = part_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.interval = interval
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+                pool_connections=workers,
+                pool_maxsize=workers * 2
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Files and their ranges get separate pools, a file waiting on its
+        # ranges must never hold the slot one of them needs.
+        self.files = ThreadPoolExecutor(max_workers=workers)
+        self.ranges = ThreadPoolExecutor(max_workers=workers)
+
+    def close(self):
+        self.files.shutdown(wait=True)
+        self.ranges.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _probe(self, url):
+        """
+        Returns the size, a validator usable with If-Range and whether the
+        server takes byte ranges
+        """
+        resp = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        resp.raise_for_status()
+        size = resp.headers.get('Content-Length')
+        validator = resp.headers.get('ETag')
+        # Weak etags are not allowed in If-Range
+        if not validator or validator.startswith('W/'):
+            validator = resp.headers.get('Last-Modified')
+        ranges = resp.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        return int(size) if size is not None else None, validator, ranges
+
+    @staticmethod
+    def _load_state(path) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_state(path, state):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def _stream(self, url, fd, start, end, validator, progress) -> int:
+        """
+        Writes bytes start..end (inclusive, end None for the rest) of url at
+        the same offsets in fd, picking up where it stopped when the
+        connection drops
+        """
+        offset = start
+        attempt = 0
+        while True:
+            headers = {}
+            if offset > 0 or end is not None:
+                headers['Range'] = f'bytes={offset}-' + ('' if end is None else str(end))
+                if validator:
+                    headers['If-Range'] = validator
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as resp:
+                    resp.raise_for_status()
+                    if 'Range' in headers and resp.status_code != 206:
+                        raise RemoteChanged(url)
+                    for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+                        progress.add(len(chunk))
+                if end is None or offset > end:
+                    return offset - start
+                raise requests.exceptions.ConnectionError(f'connection closed at byte {offset}')
+            except RETRYABLE as exc:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                self.log.warning(Color.WARN + 'Resuming %s at byte %s: %s', url, offset, exc)
+                time.sleep(min(2 ** attempt, 30))
+
+    def _fetch(self, url, dest, part, state_path) -> int:
+        size, validator, ranges = self._probe(url)
+        ranged = bool(size and ranges and size > self.part_size)
+        state = self._load_state(state_path)
+        fresh = {'url': url, 'size': size, 'validator': validator, 'part_size': self.part_size}
+        if (not validator or not os.path.exists(part) or
+                {k: state.get(k) for k in fresh} != fresh):
+            state = dict(fresh, done=[])
+            open(part, 'wb').close()
+        self._save_state(state_path, state)
+
+        fd = os.open(part, os.O_WRONLY)
+        try:
+            name = os.path.basename(dest)
+            if ranged:
+                os.ftruncate(fd, size)
+                done = set(state['done'])
+                already = sum(min(self.part_size, size - s) for s in done)
+                progress = Progress(name, size, self.log, already, self.interval)
+                lock = threading.Lock()
+
+                def work(start):
+                    end = min(start + self.part_size, size) - 1
+                    self._stream(url, fd, start, end, validator, progress)
+                    with lock:
+                        state['done'].append(start)
+                        self._save_state(state_path, state)
+
+                futures = [
+                        self.ranges.submit(work, start)
+                        for start in range(0, size, self.part_size)
+                        if start not in done
+                ]
+                # Every range has to stop writing before fd is closed
+                wait(futures)
+                for future in futures:
+                    future.result()
+            else:
+                offset = os.fstat(fd).st_size
+                progress = Progress(name, size, self.log, offset, self.interval)
+                if size is None or offset < size:
+                    self._stream(url, fd, offset, None, validator, progress)
+        finally:
+            os.close(fd)
+
+        if size is not None and os.path.getsize(part) != size:
+            raise OSError(f'{dest}: expected {size} bytes, got {os.path.getsize(part)}')
+        progress.finish()
+        return progress.transferred
+
+    def fetch(self, url, dest, force=False) -> int:
+        """
+        Downloads url to dest. Returns the bytes transferred in this call.
+        """
+        if os.path.exists(dest) and not force:
+            self.log.warning(Color.WARN + 'Artifact at ' + dest + ' already exists')
+            return 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        part = dest + '.part'
+        state_path = part + '.json'
+        try:
+            transferred = self._fetch(url, dest, part, state_path)
+        except RemoteChanged:
+            self.log.warning(Color.WARN + url + ' changed on the server, starting over')
+            os.remove(state_path)
+            transferred = self._fetch(url, dest, part, state_path)
+
+        os.replace(part, dest)
+        os.remove(state_path)
+        return transferred
+
+    def fetch_many(self, transfers, force=False) -> dict:
+        """
+        Downloads every (url, dest) at the same time. Returns {dest: bytes
+        transferred}, or the exception for a transfer that failed.
+        """
+        started = time.monotonic()
+        futures = {dest: self.files.submit(self.fetch, url, dest, force) for url, dest in transfers}
+        wait(futures.values())
+
+        results = {}
+        for dest, future in futures.items():
+            try:
+                results[dest] = future.result()
+            except (requests.exceptions.RequestException, OSError, RemoteChanged) as exc:
+                results[dest] = exc
+
+        total = sum(r for r in results.values() if isinstance(r, int))
+        elapsed = max(time.monotonic() - started, 0.001)
+        self.log.info(
+                Color.INFO + 'Downloaded %.1f MiB across %s artifacts (%.1f MiB/s)',
+                total / 1048576,
+                len(results),
+                total / 1048576 / elapsed
+        )
+        return results
@@ -0,0 +1,133 @@
+"""
+Remembers the directory scans behind a graft list between builds.
+"""
+
+import json
+import os
+
+from empanadas.common import Color
+
+class GraftManifest:
+    """
+    The scanned trees of one extra ISO variant and arch, kept next to its
+    graft list as JSON. Every directory is recorded with its mtime, and
+    every file in it with (size, mtime). On a rebuild a directory whose
+    mtime has not moved still holds exactly the same names, so its entries
+    are taken from the manifest without listing it again. Only directories
+    that changed are read. Scans are also shared in memory through shared,
+    so the Packages/ and repodata/ trees of a repo are only looked at once
+    per run, whichever variant or arch asks first.
+    """
+    def __init__(self, path, logger, shared=None):
+        self.path = path
+        self.log = logger
+        self.shared = shared if shared is not None else {}
+        self.roots = {}
+        self.previous = {}
+        self.stats = {'reused': 0, 'scanned': 0}
+        try:
+            with open(path) as f:
+                self.previous = json.load(f).get('roots', {})
+        except (OSError, ValueError, AttributeError):
+            self.previous = {}
+
+    def _scan_dir(self, root, record):
+        """
+        The record of one directory, reusing the old one when the directory
+        has not changed since it was written
+        """
+        st = os.stat(root)
+        if record and record['mtime'] == st.st_mtime_ns:
+            self.stats['reused'] += 1
+            return record
+
+        self.stats['scanned'] += 1
+        files = {}
+        dirs = []
+        with os.scandir(root) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Like os.walk, symlinks to directories are left alone
+                    if not entry.is_symlink():
+                        dirs.append(entry.name)
+                    continue
+                try:
+                    est = entry.stat(follow_symlinks=False)
+                    files[entry.name] = [est.st_size, est.st_mtime_ns]
+                except OSError:
+                    files[entry.name] = [0, 0]
+        return {'mtime': st.st_mtime_ns, 'files': files, 'dirs': sorted(dirs)}
+
+    def scan(self, p) -> dict:
+        """
+        A drop-in for Idents.scanning that only reads changed directories
+        """
+        path = os.path.abspath(p)
+        if path in self.shared:
+            tree, records = self.shared[path]
+            self.roots[path] = records
+            return dict(tree)
+
+        old = self.previous.get(path, {})
+        base = len(path.rstrip("/")) + 1
+        records = {}
+        tree = {}
+        stack = ['']
+        while stack:
+            rel = stack.pop()
+            root = os.path.join(path, rel) if rel else path
+            try:
+                record = self._scan_dir(root, old.get(rel))
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            records[rel] = record
+
+            # Include empty directories too
+            if rel:
+                tree[root[base:] + "/"] = root + "/"
+            for name in record['files']:
+                full = os.path.join(root, name)
+                tree[full[base:]] = full
+            for name in record['dirs']:
+                stack.append(os.path.join(rel, name) if rel else name)
+
+        self.roots[path] = records
+        self.shared[path] = (tree, records)
+        return dict(tree)
+
+    def changes(self) -> dict:
+        """
+        Counts files added, removed and changed (size or mtime) against the
+        manifest of the last build, across every root scanned so far. Files
+        in directories that were not read again count as unchanged.
+        """
+        counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+        for path, records in self.roots.items():
+            old = {}
+            for rel, record in self.previous.get(path, {}).items():
+                for name, meta in record['files'].items():
+                    old[os.path.join(rel, name)] = meta
+            for rel, record in records.items():
+                for name, meta in record['files'].items():
+                    key = os.path.join(rel, name)
+                    if key not in old:
+                        counts['added'] += 1
+                    elif old.pop(key) != meta:
+                        counts['changed'] += 1
+                    else:
+                        counts['unchanged'] += 1
+            counts['removed'] += len(old)
+        return counts
+
+    def save(self):
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'roots': self.roots}, f)
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            self.log.warning(Color.WARN + 'Could not save graft manifest ' + self.path + ': ' + str(exc))
@@ -0,0 +1,204 @@
+"""
+Reads what we need out of an ISO9660 image without parsing all of it.
+"""
+
+import mmap
+import os
+import struct
+
+SECTOR = 2048
+# Volume descriptors start at sector 16, the first 64 KiB holds them all
+DESCRIPTOR_WINDOW = 65536
+
+class IsoReader:
+    """
+    A small ISO9660 reader. volume_id maps the first 64 KiB and reads the
+    Primary Volume Descriptor straight from sector 16, which is all it
+    takes no matter how large the image is. walk streams the directory
+    records one extent at a time, using Rock Ridge names when present, to
+    build the same manifest xorriso -find gives.
+    """
+    @staticmethod
+    def _descriptors(path):
+        """
+        Yields every volume descriptor in the set, up to the terminator
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            length = min(size, DESCRIPTOR_WINDOW)
+            if length < 17 * SECTOR:
+                return
+            with mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ) as view:
+                for offset in range(16 * SECTOR, length - SECTOR + 1, SECTOR):
+                    descriptor = view[offset:offset + SECTOR]
+                    if descriptor[1:6] != b'CD001':
+                        return
+                    yield descriptor
+                    if descriptor[0] == 255:
+                        return
+
+    @staticmethod
+    def primary_descriptor(path):
+        """
+        The raw Primary Volume Descriptor, or None if path is not ISO9660
+        """
+        try:
+            for descriptor in IsoReader._descriptors(path):
+                if descriptor[0] == 1:
+                    return descriptor
+        except (OSError, ValueError):
+            pass
+        return None
+
+    @staticmethod
+    def volume_id(path):
+        """
+        The volume identifier of an ISO, or None if it is not ISO9660
+        """
+        pvd = IsoReader.primary_descriptor(path)
+        if pvd is None:
+            return None
+        return pvd[40:72].decode('utf-8', errors='replace').strip()
+
+    @staticmethod
+    def _record(data, offset):
+        """
+        Unpacks the directory record at offset: (extent, size, flags,
+        name, system use area)
+        """
+        length = data[offset]
+        extent = struct.unpack_from('<I', data, offset + 2)[0]
+        size = struct.unpack_from('<I', data, offset + 10)[0]
+        flags = data[offset + 25]
+        name_len = data[offset + 32]
+        name = data[offset + 33:offset + 33 + name_len]
+        su_start = offset + 33 + name_len + (1 - name_len % 2)
+        return extent, size, flags, name, data[su_start:offset + length]
+
+    @staticmethod
+    def _susp(f, area, skip=0):
+        """
+        Yields (signature, data) for every SUSP entry in a system use area,
+        following continuation areas
+        """
+        pending = [area[skip:]]
+        while pending:
+            area = pending.pop()
+            pos = 0
+            while pos + 4 <= len(area):
+                sig = area[pos:pos + 2]
+                length = area[pos + 2]
+                if length < 4:
+                    break
+                entry = area[pos + 4:pos + length]
+                if sig == b'CE' and len(entry) >= 24:
+                    block = struct.unpack_from('<I', entry, 0)[0]
+                    off = struct.unpack_from('<I', entry, 8)[0]
+                    ce_len = struct.unpack_from('<I', entry, 16)[0]
+                    pending.append(os.pread(f.fileno(), ce_len, block * SECTOR + off))
+                elif sig == b'ST':
+                    break
+                else:
+                    yield sig, entry
+                pos += length
+
+    @staticmethod
+    def walk(path):
+        """
+        Yields (path, is_dir, size) for everything on the ISO, directories
+        before what is in them. Paths are relative, without a leading slash.
+        """
+        pvd = IsoReader.primary_descriptor(path)
+        if pvd is None:
+            raise ValueError(path + ' is not an ISO9660 image')
+
+        root_extent, root_size, _, _, _ = IsoReader._record(pvd, 156)
+        with open(path, 'rb') as f:
+            # The SP entry of the root says how many bytes to skip in every
+            # system use area, and that Rock Ridge may be in use
+            root = os.pread(f.fileno(), SECTOR, root_extent * SECTOR)
+            _, _, _, _, su = IsoReader._record(root, 0)
+            skip = 0
+            if su[:2] == b'SP' and len(su) >= 7:
+                skip = su[6]
+
+            stack = [('', root_extent, root_size)]
+            while stack:
+                parent, extent, size = stack.pop()
+                data = os.pread(f.fileno(), size, extent * SECTOR)
+                files = {}
+                children = []
+                offset = 0
+                while offset < len(data):
+                    length = data[offset]
+                    if length == 0:
+                        # Records never cross a sector, the rest is padding
+                        offset = (offset // SECTOR + 1) * SECTOR
+                        continue
+                    rec_extent, rec_size, flags, name, su = IsoReader._record(data, offset)
+                    offset += length
+                    if name in (b'\x00', b'\x01'):
+                        continue
+
+                    rr_name = b''
+                    relocated = False
+                    for sig, entry in IsoReader._susp(f, su, skip):
+                        if sig == b'NM' and entry:
+                            # Only CONTINUE (0x1) appends, CURRENT/PARENT
+                            # never name a real entry
+                            if entry[0] & 0x6:
+                                continue
+                            rr_name += entry[1:]
+                        elif sig == b'CL' and len(entry) >= 4:
+                            # A deep directory that was moved, follow it
+                            rec_extent = struct.unpack_from('<I', entry, 0)[0]
+                            flags |= 0x2
+                            rec_size = None
+                        elif sig == b'RE':
+                            relocated = True
+                    if relocated:
+                        continue
+
+                    if rr_name:
+                        entry_name = rr_name.decode('utf-8', errors='replace')
+                    else:
+                        entry_name = name.decode('ascii', errors='replace').split(';')[0]
+                        if entry_name.endswith('.') and not flags & 0x2:
+                            entry_name = entry_name[:-1]
+
+                    full = parent + '/' + entry_name if parent else entry_name
+                    is_dir = bool(flags & 0x2)
+                    if is_dir:
+                        if rec_size is None:
+                            # The size of a relocated directory is in its
+                            # own "." record
+                            head = os.pread(f.fileno(), SECTOR, rec_extent * SECTOR)
+                            rec_size = IsoReader._record(head, 0)[1]
+                        yield full, True, rec_size
+                        children.append((full, rec_extent, rec_size))
+                    else:
+                        # Multi-extent files have a record per extent
+                        files[full] = files.get(full, 0) + rec_size
+
+                for full, file_size in files.items():
+                    yield full, False, file_size
+                stack.extend(reversed(children))
+
+    @staticmethod
+    def manifest(path) -> list:
+        """
+        Every file and directory path on the ISO, sorted bytewise, the way
+        the .manifest files list them
+        """
+        return sorted(
+                (p for p, _, _ in IsoReader.walk(path)),
+                key=lambda p: p.encode('utf-8', errors='surrogateescape')
+        )
+
+    @staticmethod
+    def write_manifest(path, dest):
+        tmp = f'{dest}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            for entry in IsoReader.manifest(path):
+                f.write(entry + '\n')
+        os.replace(tmp, dest)
@@ -11,8 +11,9 @@ import os.path
 import subprocess
 import shlex
 import time
-import tarfile
 import shutil
+import tarfile
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # lazy person's s3 parser
 #import requests
@@ -22,7 +23,6 @@ import shutil
 #import boto3
 # relative_path, compute_file_checksums
 import kobo.shortcuts
-from fnmatch import fnmatch
 
 # This is for treeinfo
 from configparser import ConfigParser
@@ -35,7 +35,10 @@ import productmd.treeinfo
 from jinja2 import Environment, FileSystemLoader
 
 from empanadas.common import Color, _rootdir
-from empanadas.util import Shared, ArchCheck, Idents
+from empanadas.util import Shared, ArchCheck, Idents, ContainerUnit, ContainerResult, PodmanSupervisor, TimingDB, ChecksumCache, BucketIndex, Unpacker, TreeCloner, ArtifactPublisher, GraftManifest, MockUnit, MockScheduler, IsoReader
+
+# Lorax artifacts may come as either
+LORAX_SUFFIXES = ('tar.zst', 'tar.gz')
 
 class IsoBuild:
     """
@@ -58,11 +61,14 @@ class IsoBuild:
             isolation: str = 'auto',
             extra_iso=None,
             extra_iso_mode: str = 'local',
+            extra_iso_parallel: int = None,
             compose_dir_is_here: bool = False,
             hashed: bool = False,
             updated_image: bool = False,
             image_increment: str = '0',
             image=None,
+            lorax_compression: str = 'gz',
+            pull_workers: int = 4,
             s3_region=None,
             s3_bucket=None,
             s3_bucket_url=None,
@@ -91,8 +97,11 @@ class IsoBuild:
         self.s3 = s3
         self.force_unpack = force_unpack
         self.force_download = force_download
+        self.lorax_compression = lorax_compression
+        self.pull_workers = pull_workers
         self.extra_iso = extra_iso
         self.extra_iso_mode = extra_iso_mode
+        self.extra_iso_parallel = extra_iso_parallel
         self.checksum = rlvars['checksum']
         self.profile = rlvars['profile']
         self.hashed = hashed
@@ -182,6 +191,13 @@ class IsoBuild:
                 "work/lorax"
         )
 
+        # Images that have not changed since the last run are not rehashed
+        self.checksum_cache = ChecksumCache(os.path.join(self.compose_latest_dir, 'work'))
+        # One dnf cache for every mock root of this release and arch
+        self.package_cache = f'/var/cache/mock/{self.shortname.lower()}-{self.release}-{self.current_arch}-packages'
+        # Directory scans shared by every graft list of this run
+        self.graft_scans = {}
+
         # This is temporary for now.
         if logger is None:
             self.log = logging.getLogger("iso")
@@ -241,6 +257,14 @@ class IsoBuild:
         self.generate_iso_scripts()
         self.run_lorax()
 
+    def _local_compose(self, repos):
+        """
+        The compose sync directory when any mock repo is read from it
+        """
+        if any(repo.get('local') for repo in repos):
+            return self.compose_latest_sync
+        return None
+
     def generate_iso_scripts(self):
         """
         Generates the scripts needed to be ran to run lorax in mock as well as
@@ -254,12 +278,15 @@ class IsoBuild:
         mock_iso_path = '/var/tmp/lorax-' + self.release + '.cfg'
         mock_sh_path = '/var/tmp/isobuild.sh'
         iso_template_path = '/var/tmp/buildImage.sh'
-        required_pkgs = self.iso_map['lorax']['required_pkgs']
+        required_pkgs = list(self.iso_map['lorax']['required_pkgs'])
+        if self.lorax_compression == 'zst' and 'zstd' not in required_pkgs:
+            required_pkgs.append('zstd')
 
         rclevel = ''
         if self.release_candidate:
             rclevel = '-' + self.rclvl
 
+        mock_repos = Shared.mock_repo_list(self.repolist, self.compose_latest_sync, self.current_arch)
         mock_iso_template_output = mock_iso_template.render(
                 arch=self.current_arch,
                 major=self.major_version,
@@ -268,10 +295,12 @@ class IsoBuild:
                 shortname=self.shortname,
                 required_pkgs=required_pkgs,
                 dist=self.disttag,
-                repos=self.repolist,
+                repos=mock_repos,
                 user_agent='{{ user_agent }}',
                 compose_dir_is_here=self.compose_dir_is_here,
                 compose_dir=self.compose_root,
+                local_compose=self._local_compose(mock_repos),
+                package_cache=self.package_cache,
         )
 
         mock_sh_template_output = mock_sh_template.render(
@@ -282,6 +311,7 @@ class IsoBuild:
                 builddir=self.mock_work_root,
                 shortname=self.shortname,
                 revision=self.release,
+                compression=self.lorax_compression,
         )
 
         iso_template_output = iso_template.render(
@@ -299,6 +329,7 @@ class IsoBuild:
                 lorax_work_root=self.lorax_result_root,
                 bugurl=self.bugurl,
                 squashfs_only=self.iso_map['lorax'].get('squashfs_only', None),
+                compression=self.lorax_compression,
         )
 
         with open(mock_iso_path, "w+") as mock_iso_entry:
@@ -343,99 +374,106 @@ class IsoBuild:
             arches_to_unpack = [self.arch]
 
         self.log.info(Color.INFO + 'Determining the latest pulls...')
+        index = self._bucket_index('buildiso', self.arches)
         if self.s3:
             latest_artifacts = Shared.s3_determine_latest(
                     self.s3_bucket,
                     self.release,
                     self.arches,
-                    'tar.gz',
+                    LORAX_SUFFIXES,
                     'lorax',
                     'buildiso',
                     self.translators,
-                    self.log
+                    self.log,
+                    index=index
             )
         else:
             latest_artifacts = Shared.reqs_determine_latest(
                     self.s3_bucket_url,
                     self.release,
                     self.arches,
-                    'tar.gz',
+                    LORAX_SUFFIXES,
                     'lorax',
-                    self.log
+                    self.log,
+                    translators=self.translators,
+                    index=index
             )
 
-        self.log.info(Color.INFO + 'Downloading requested artifact(s)')
-        for arch in arches_to_unpack:
-            lorax_arch_dir = os.path.join(
-                self.lorax_work_dir,
-                arch
-            )
-
-            if arch not in latest_artifacts:
-                self.log.error(Color.FAIL + 'No lorax artifacts for ' + arch)
-                continue
-
-            source_path = latest_artifacts[arch]
-
-            full_drop = f'{lorax_arch_dir}/lorax-{self.release}-{arch}.tar.gz'
-
-            if not os.path.exists(lorax_arch_dir):
-                os.makedirs(lorax_arch_dir, exist_ok=True)
+        # Each arch goes from download to treeinfo on its own, so a slow
+        # download of one arch never holds up the unpack of another.
+        self.log.info(Color.INFO + 'Pulling lorax for: ' + ', '.join(arches_to_unpack))
+        timing = TimingDB(os.path.join(self.compose_latest_dir, 'work'), self.log)
+        workers = max(1, min(self.pull_workers, len(arches_to_unpack)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                    arch: executor.submit(
+                        self._lorax_pipeline,
+                        arch,
+                        latest_artifacts.get(arch),
+                        timing
+                    )
+                    for arch in arches_to_unpack
+            }
+            wait(futures.values())
 
-            self.log.info(
-                    'Downloading artifact for ' + Color.BOLD + arch + Color.END
-            )
-            if self.s3:
-                Shared.s3_download_artifacts(
-                        self.force_download,
-                        self.s3_bucket,
-                        source_path,
-                        full_drop,
-                        self.log
-                )
-            else:
-                Shared.reqs_download_artifacts(
-                        self.force_download,
-                        self.s3_bucket_url,
-                        source_path,
-                        full_drop,
-                        self.log
-                )
-        self.log.info(Color.INFO + 'Download phase completed')
-        self.log.info(Color.INFO + 'Beginning unpack phase...')
+        failed = []
+        fatal = None
+        for arch, future in futures.items():
+            try:
+                if not future.result():
+                    failed.append(arch)
+            except SystemExit as exc:
+                failed.append(arch)
+                fatal = exc
+            except Exception as exc:
+                self.log.error(Color.FAIL + 'Lorax pull for ' + arch + ' failed: ' + str(exc))
+                failed.append(arch)
+
+        if fatal is not None:
+            raise fatal
+        if failed:
+            self.log.error(Color.FAIL + 'Lorax pull incomplete for: ' + ', '.join(failed))
+        else:
+            self.log.info(Color.INFO + 'Lorax pull completed')
 
-        for arch in arches_to_unpack:
-            tarname = f'lorax-{self.release}-{arch}.tar.gz'
+    def _lorax_pipeline(self, arch, source_path, timing) -> bool:
+        """
+        Download, magic check, unpack, variant copy, boot copy and treeinfo for a
+        single arch. Every stage is timed under the lorax-pull phase. Returns
+        False if the arch stopped short.
+        """
+        if not source_path:
+            self.log.error(Color.FAIL + 'No lorax artifacts for ' + arch)
+            return False
 
-            tarball = os.path.join(
-                    self.lorax_work_dir,
-                    arch,
-                    tarname
-            )
+        lorax_arch_dir = os.path.join(self.lorax_work_dir, arch)
+        suffix = '.tar.zst' if source_path.endswith('.tar.zst') else '.tar.gz'
+        full_drop = f'{lorax_arch_dir}/lorax-{self.release}-{arch}{suffix}'
+        os.makedirs(lorax_arch_dir, exist_ok=True)
 
-            if not os.path.exists(tarball):
-                self.log.error(Color.FAIL + 'Artifact does not exist: ' + tarball)
-                continue
+        results = self._lorax_stage(timing, arch, 'download', self._download_artifacts, [(source_path, full_drop)])
+        if isinstance(results.get(full_drop), Exception):
+            return False
 
-            self._unpack_artifacts(self.force_unpack, arch, tarball)
+        tarball = self._lorax_tarball(arch)
+        if not tarball or not self._lorax_stage(timing, arch, 'magic', Unpacker.check_magic, tarball):
+            self.log.error(Color.FAIL + 'Artifact for ' + arch + ' is missing, empty or not the archive type its name says')
+            return False
 
-        self.log.info(Color.INFO + 'Unpack phase completed')
-        self.log.info(Color.INFO + 'Beginning image variant phase')
+        try:
+            self._lorax_stage(timing, arch, 'unpack', self._unpack_artifacts, self.force_unpack, arch, tarball)
+        except (tarfile.TarError, OSError) as exc:
+            self.log.error(Color.FAIL + 'Could not unpack ' + tarball + ': ' + str(exc))
+            return False
 
-        for arch in arches_to_unpack:
+        def copy_variants():
             self.log.info(
                     'Copying base lorax for ' + Color.BOLD + arch + Color.END
             )
             for variant in self.iso_map['images']:
                 self._copy_lorax_to_variant(self.force_unpack, arch, variant)
 
-            self._copy_boot_to_work(self.force_unpack, arch)
-
-        self.log.info(Color.INFO + 'Image variant phase completed')
-
-        self.log.info(Color.INFO + 'Beginning treeinfo phase')
-
-        for arch in arches_to_unpack:
+        def treeinfo():
             for variant in self.iso_map['images']:
                 self.log.info(
                         'Configuring treeinfo and discinfo for %s%s %s%s' % (Color.BOLD, arch, variant, Color.END)
@@ -449,21 +487,110 @@ class IsoBuild:
                     )
                     self._copy_nondisc_to_repo(self.force_unpack, arch, variant)
 
+        self._lorax_stage(timing, arch, 'variants', copy_variants)
+        self._lorax_stage(timing, arch, 'boot', self._copy_boot_to_work, self.force_unpack, arch)
+        self._lorax_stage(timing, arch, 'treeinfo', treeinfo)
+        self.log.info(Color.INFO + 'Lorax pull for ' + arch + ' completed')
+        return True
+
+    @staticmethod
+    def _lorax_stage(timing, arch, stage, func, *args):
+        """
+        Runs one pipeline stage and records how long it took
+        """
+        start = time.time()
+        exit_code = 1
+        try:
+            result = func(*args)
+            exit_code = 0
+            return result
+        finally:
+            timing.record('lorax-pull', ContainerResult(
+                    name=f'{arch}-{stage}',
+                    group=arch,
+                    exit_code=exit_code,
+                    start=start,
+                    end=time.time()
+            ))
+
+    def _bucket_index(self, root_prefix, arches):
+        """
+        Lists the bucket once for every arch of root_prefix. The listing is
+        kept in the compose work directory for a few minutes, unless a
+        download is being forced.
+        """
+        prefixes = [
+                BucketIndex.prefix_for(root_prefix, self.release, arch, self.translators)
+                for arch in arches
+        ]
+        cache_dir = None
+        # Never create latest-* as a directory when it is not there yet
+        if os.path.exists(self.compose_latest_dir):
+            cache_dir = os.path.join(self.compose_latest_dir, 'work', 'bucket-index')
+
+        return Shared.bucket_index(
+                self.s3,
+                self.s3_bucket if self.s3 else self.s3_bucket_url,
+                prefixes,
+                self.log,
+                region=self.s3_region,
+                cache_dir=cache_dir,
+                ttl=0 if self.force_download else 600
+        )
+
+    def _download_artifacts(self, transfers):
+        """
+        Downloads every (source, dest) from the artifact bucket, all of them
+        concurrently. Returns {dest: bytes or exception}.
+        """
+        if self.s3:
+            return Shared.s3_download_many(
+                    self.force_download,
+                    self.s3_bucket,
+                    transfers,
+                    self.log,
+                    region=self.s3_region
+            )
+
+        return Shared.reqs_download_many(
+                self.force_download,
+                self.s3_bucket_url,
+                transfers,
+                self.log
+        )
+
+    def _lorax_tarball(self, arch):
+        """
+        The pulled lorax tarball of an arch, the newest if both a .tar.gz
+        and a .tar.zst are around. None if there is neither.
+        """
+        candidates = [
+                os.path.join(self.lorax_work_dir, arch, f'lorax-{self.release}-{arch}{suffix}')
+                for suffix in ('.tar.zst', '.tar.gz')
+        ]
+        candidates = [c for c in candidates if os.path.exists(c)]
+        if not candidates:
+            return None
+        return max(candidates, key=os.path.getmtime)
+
+    def _lorax_unpacked(self, force_unpack, arch) -> bool:
+        if force_unpack:
+            return False
+        file_check = os.path.join(self.lorax_work_dir, arch, 'lorax/.treeinfo')
+        if os.path.exists(file_check):
+            self.log.warning(Color.WARN + 'Artifact (' + arch + ') already unpacked')
+            return True
+        return False
+
     def _unpack_artifacts(self, force_unpack, arch, tarball):
         """
         Unpack the requested artifacts(s)
         """
-        unpack_dir = os.path.join(self.lorax_work_dir, arch)
-        if not force_unpack:
-            file_check = os.path.join(unpack_dir, 'lorax/.treeinfo')
-            if os.path.exists(file_check):
-                self.log.warning(Color.WARN + 'Artifact (' + arch + ') already unpacked')
-                return
+        if self._lorax_unpacked(force_unpack, arch):
+            return
 
         self.log.info('Unpacking %s' % tarball)
-        with tarfile.open(tarball) as t:
-            Shared.tar_safe_extractall(t, unpack_dir)
-            t.close()
+        Unpacker(self.log).extract(tarball, os.path.join(self.lorax_work_dir, arch))
 
     def _copy_lorax_to_variant(self, force_unpack, arch, image):
         """
@@ -496,22 +623,23 @@ class IsoBuild:
                 self.log.warning(Color.WARN + 'Lorax image for ' + image + ' already exists')
                 return
 
+        # Disc images do not carry boot.iso, so it is never copied there
+        skip = ()
+        if self.iso_map['images'][image]['disc']:
+            skip = ('images/boot.iso', 'images/boot.iso.manifest')
+
         self.log.info('Copying base lorax to %s directory...' % image)
         try:
-            shutil.copytree(src_to_image, path_to_image, copy_function=shutil.copy2, dirs_exist_ok=True)
-        except:
-            self.log.error('%s already exists??' % image)
+            TreeCloner(self.log).clone(src_to_image, path_to_image, skip=skip)
+        except OSError as e:
+            self.log.error(Color.FAIL + 'Could not copy lorax to %s: %s' % (image, e))
+            return
 
-        if self.iso_map['images'][image]['disc']:
-            self.log.info('Removing boot.iso from %s' % image)
-            try:
-                os.remove(path_to_image + '/images/boot.iso')
-                os.remove(path_to_image + '/images/boot.iso.manifest')
-            except:
-                self.log.error(
-                            '[' + Color.BOLD + Color.YELLOW + 'FAIL' + Color.END + '] ' +
-                            'Cannot remove boot.iso'
-                )
+        # Left over from an earlier copy
+        for leftover in skip:
+            if os.path.exists(os.path.join(path_to_image, leftover)):
+                self.log.info('Removing %s from %s' % (leftover, image))
+                os.remove(os.path.join(path_to_image, leftover))
 
     def _copy_boot_to_work(self, force_unpack, arch):
         src_to_image = os.path.join(self.lorax_work_dir, arch, 'lorax')
@@ -547,15 +675,9 @@ class IsoBuild:
         try:
             shutil.copy2(path_to_src_image, isobootpath)
 
-            # For Rocky-ARCH-boot.iso
-            if os.path.exists(linkbootpath):
-                os.remove(linkbootpath)
-            os.symlink(discname, linkbootpath)
-
-            # For Rocky-X-latest-ARCH-boot.iso
-            if os.path.exists(latestlinkbootpath):
-                os.remove(latestlinkbootpath)
-            os.symlink(discname, latestlinkbootpath)
+            # For Rocky-ARCH-boot.iso and Rocky-X-latest-ARCH-boot.iso
+            ArtifactPublisher.link(discname, linkbootpath)
+            ArtifactPublisher.link(discname, latestlinkbootpath)
         except Exception as e:
             self.log.error(Color.FAIL + 'We could not copy the image or create a symlink.')
             raise SystemExit(e)
@@ -564,34 +686,15 @@ class IsoBuild:
         if os.path.exists(path_to_src_image + '.manifest'):
             shutil.copy2(path_to_src_image + '.manifest', manifest)
             #os.symlink(manifest.split('/')[-1], manifestlink)
-            os.symlink(manifest.split('/')[-1], latestmanifestlink)
+            ArtifactPublisher.link(manifest.split('/')[-1], latestmanifestlink)
 
         self.log.info('Creating checksum for %s boot iso...' % arch)
-        checksum = Shared.get_checksum(isobootpath, self.checksum, self.log)
-        if not checksum:
-            self.log.error(Color.FAIL + isobootpath + ' not found! Are you sure we copied it?')
-            return
-        with open(isobootpath + '.CHECKSUM', "w+") as c:
-            c.write(checksum)
-            c.close()
-
-        # For Rocky-ARCH-boot.iso
-        linksum = Shared.get_checksum(linkbootpath, self.checksum, self.log)
-        if not linksum:
-            self.log.error(Color.FAIL + linkbootpath + ' not found! Did we actually make the symlink?')
-            return
-        with open(linkbootpath + '.CHECKSUM', "w+") as l:
-            l.write(linksum)
-            l.close()
-
-        # For Rocky-X-latest-ARCH-boot.iso
-        latestlinksum = Shared.get_checksum(latestlinkbootpath, self.checksum, self.log)
-        if not latestlinksum:
-            self.log.error(Color.FAIL + latestlinkbootpath + ' not found! Did we actually make the symlink?')
-            return
-        with open(latestlinkbootpath + '.CHECKSUM', "w+") as l:
-            l.write(latestlinksum)
-            l.close()
+        # One read of the boot iso covers the CHECKSUM of both links
+        ArtifactPublisher(self.checksum, self.log, cache=self.checksum_cache).publish(
+                isobootpath,
+                [linkbootpath, latestlinkbootpath],
+                link=False
+        )
 
     def _copy_nondisc_to_repo(self, force_unpack, arch, repo):
         """
@@ -643,11 +746,12 @@ class IsoBuild:
 
         self.log.info(Color.INFO + 'Copying images and data for ' + repo + ' ' + arch)
 
+        cloner = TreeCloner(self.log)
         try:
-            shutil.copytree(src_to_image, pathway, copy_function=shutil.copy2, dirs_exist_ok=True)
-            shutil.copytree(src_to_image, kspathway, copy_function=shutil.copy2, dirs_exist_ok=True)
-        except:
-            self.log.error('%s already exists??' % repo)
+            cloner.clone(src_to_image, pathway)
+            cloner.clone(src_to_image, kspathway)
+        except OSError as e:
+            self.log.error(Color.FAIL + 'Could not copy images and data for %s: %s' % (repo, e))
 
 
     def run_boot_sync(self):
@@ -700,7 +804,7 @@ class IsoBuild:
         }
 
         try:
-            Shared.treeinfo_modify_write(data, imagemap, self.log)
+            Shared.treeinfo_modify_write(data, imagemap, self.log, cache=self.checksum_cache)
         except Exception as e:
             self.log.error(Color.FAIL + 'There was an error writing treeinfo.')
             self.log.error(e)
@@ -745,6 +849,7 @@ class IsoBuild:
             images_to_build = [self.extra_iso]
 
         images_to_skip = []
+        local_builds = []
 
         for y in images_to_build:
             if 'isoskip' in self.iso_map['images'][y] and self.iso_map['images'][y]['isoskip']:
@@ -792,13 +897,16 @@ class IsoBuild:
                     continue
 
                 if self.extra_iso_mode == 'local':
-                    self._extra_iso_local_run(a, y, work_root)
+                    local_builds.append((a, y))
                 elif self.extra_iso_mode == 'podman':
                     continue
                 else:
                     self.log.error(Color.FAIL + 'Mode specified is not valid.')
                     raise SystemExit()
 
+        if self.extra_iso_mode == 'local' and local_builds:
+            self._extra_iso_local_run(local_builds, work_root)
+
         if self.extra_iso_mode == 'podman':
             # I can't think of a better way to do this
             images_to_build_podman = images_to_build.copy()
@@ -824,7 +932,10 @@ class IsoBuild:
         xorriso_template = self.tmplenv.get_template('xorriso.tmpl.txt')
         iso_readme_template = self.tmplenv.get_template('ISOREADME.tmpl')
 
-        mock_iso_path = f'/var/tmp/lorax-{self.major_version}.cfg'
+        # Every build gets a mock root and config of its own, so several can
+        # run at the same time
+        mock_root = f'{self.shortname.lower()}-{self.release}-{arch}-{image}'
+        mock_iso_path = f'/var/tmp/lorax-{self.release}-{arch}-{image}.cfg'
         mock_sh_path = f'{entries_dir}/extraisobuild-{arch}-{image}.sh'
         iso_template_path = f'{entries_dir}/buildExtraImage-{arch}-{image}.sh'
         xorriso_template_path = f'{entries_dir}/xorriso-{arch}-{image}.txt'
@@ -871,10 +982,12 @@ class IsoBuild:
                 shortname=self.shortname,
                 required_pkgs=required_pkgs,
                 dist=self.disttag,
-                repos=self.repolist,
+                repos=Shared.mock_repo_list(self.repolist, self.compose_latest_sync, self.current_arch),
                 user_agent='{{ user_agent }}',
                 compose_dir_is_here=True,
                 compose_dir=self.compose_root,
+                mock_root=mock_root,
+                package_cache=self.package_cache,
         )
 
         mock_sh_template_output = mock_sh_template.render(
@@ -887,6 +1000,8 @@ class IsoBuild:
                 isoname=isoname,
                 entries_dir=entries_dir,
                 image=image,
+                mock_cfg=mock_iso_path,
+                mock_root=mock_root,
         )
 
         opts = {
@@ -958,17 +1073,40 @@ class IsoBuild:
         os.chmod(mock_sh_path, 0o755)
         os.chmod(iso_template_path, 0o755)
 
-    def _extra_iso_local_run(self, arch, image, work_root):
+    def _extra_iso_local_run(self, builds, work_root):
         """
         Runs the actual local process using mock. This is for running in
         peridot or running on a machine that does not have podman, but does
-        have mock available.
+        have mock available. Every (arch, image) has its own mock root, and
+        as many run at once as memory and disk space allow.
         """
         entries_dir = os.path.join(work_root, "entries")
-        extra_iso_cmd = f'/bin/bash {entries_dir}/extraisobuild-{arch}-{image}.sh'
-        self.log.info('Starting mock build...')
-        p = subprocess.call(shlex.split(extra_iso_cmd))
-        if p != 0:
+        log_root = os.path.join(work_root, "logs", self.date_stamp)
+        units = [
+                MockUnit(
+                    name=f'{arch}-{image}',
+                    command=['/bin/bash', f'{entries_dir}/extraisobuild-{arch}-{image}.sh'],
+                    log_path=os.path.join(log_root, f'mock-{arch}-{image}.log'),
+                    group=image
+                )
+                for arch, image in builds
+        ]
+
+        timing_path = os.path.join(work_root, TimingDB.FILENAME)
+        PodmanSupervisor.apply_durations(units, TimingDB.durations(timing_path, 'extra-iso-local'))
+        max_parallel = MockScheduler.capacity(
+                '/var/lib/mock' if os.path.exists('/var/lib/mock') else work_root,
+                ceiling=self.extra_iso_parallel or len(units)
+        )
+
+        self.log.info('Starting mock builds, up to %s at once...' % max_parallel)
+        on_complete, bad_exit_list = PodmanSupervisor.group_tracker(units, self.log, verb='Building')
+        scheduler = MockScheduler(self.log, max_parallel=max_parallel)
+        timing = TimingDB(work_root, self.log)
+        results = scheduler.run(units, timing.recorder('extra-iso-local', on_complete=on_complete))
+        scheduler.report(units, results)
+
+        if bad_exit_list:
             self.log.error('An error occured during execution.')
             self.log.error('See the logs for more information.')
             raise SystemExit()
@@ -988,21 +1126,18 @@ class IsoBuild:
         cmd = Shared.podman_cmd(self.log)
         entries_dir = os.path.join(work_root, "entries")
         isos_dir = os.path.join(work_root, "isos")
-        bad_exit_list = []
-        checksum_list = []
+        units = []
+        checksum_map = {}
 
         datestamp = ''
         if self.updated_image:
             datestamp = '-' + self.updated_image_date
 
         for i in images:
-            entry_name_list = []
-            image_name = i
             arch_sync = arches.copy()
 
             for a in arch_sync:
                 entry_name = f'buildExtraImage-{a}-{i}.sh'
-                entry_name_list.append(entry_name)
 
                 rclevel = ''
                 if self.release_candidate:
@@ -1033,90 +1168,71 @@ class IsoBuild:
                         i
                 )
 
-                checksum_list.append(isoname)
-                checksum_list.append(genericname)
-                checksum_list.append(latestname)
-
-            for pod in entry_name_list:
-                podman_cmd_entry = '{} run -d -it --security-opt label=disable -v "{}:{}" -v "{}:{}" --name {} --entrypoint {}/{} {}'.format(
-                        cmd,
-                        self.compose_root,
-                        self.compose_root,
-                        entries_dir,
-                        entries_dir,
-                        pod,
-                        entries_dir,
-                        pod,
-                        self.container
-                )
-
-                process = subprocess.call(
-                        shlex.split(podman_cmd_entry),
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
-                )
+                checksum_map[entry_name] = [isoname, genericname, latestname]
+                units.append(ContainerUnit(
+                        name=entry_name,
+                        entries_dir=entries_dir,
+                        image=self.container,
+                        volumes=[
+                            (self.compose_root, self.compose_root),
+                            (entries_dir, entries_dir),
+                        ],
+                        group=i
+                ))
 
-            join_all_pods = ' '.join(entry_name_list)
-            time.sleep(3)
             self.log.info(Color.INFO + 'Building ' + i + ' ...')
-            pod_watcher = f'{cmd} wait {join_all_pods}'
 
-            watch_man = subprocess.call(
-                    shlex.split(pod_watcher),
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL
-            )
+        on_group, bad_exit_list = PodmanSupervisor.group_tracker(
+                units,
+                self.log,
+                verb='Building'
+        )
 
-            # After the above is done, we'll check each pod process for an exit
-            # code.
-            pattern = "Exited (0)"
-            for pod in entry_name_list:
-                checkcmd = f'{cmd} ps -f status=exited -f name={pod}'
-                podcheck = subprocess.Popen(
-                        checkcmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        shell=True
-                )
+        # Checksums are done on a worker thread as soon as each ISO is built.
+        # on_complete runs on the supervisor's event loop, so hashing there
+        # would hold up every other container.
+        publisher = ArtifactPublisher(self.checksum, self.log, cache=self.checksum_cache)
+        pool = ThreadPoolExecutor(max_workers=2)
+        checksums = []
+
+        def publish(name, path, aliases):
+            self.log.info(Color.INFO + 'Performing checksum for ' + name)
+            publisher.publish(path, aliases, link=False)
+
+        def on_complete(result):
+            on_group(result)
+            # The generic and latest names are links the build made to the ISO
+            path, *aliases = [os.path.join(isos_dir, p) for p in checksum_map[result.name]]
+            if not os.path.exists(path):
+                return
+            checksums.append(pool.submit(publish, result.name, path, aliases))
 
-                output, errors = podcheck.communicate()
-                if 'Exited (0)' not in output.decode():
-                    self.log.error(Color.FAIL + pod)
-                    bad_exit_list.append(pod)
+        supervisor = PodmanSupervisor(
+                cmd,
+                self.log,
+                max_parallel=PodmanSupervisor.widest_group(units)
+        )
+        timing = TimingDB(work_root, self.log)
+        try:
+            supervisor.run(units, timing.recorder('extra-iso', on_complete=on_complete))
+            wait(checksums)
+        finally:
+            pool.shutdown(wait=True)
 
-            rmcmd = f'{cmd} rm {join_all_pods}'
+        for checksum in checksums:
+            if checksum.exception():
+                self.log.error(Color.FAIL + 'Checksum failed: ' + str(checksum.exception()))
+                bad_exit_list.append('checksum')
 
-            rmpod = subprocess.Popen(
-                    rmcmd,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                    shell=True
+        if len(bad_exit_list) == 0:
+            self.log.info(Color.INFO + 'Images built successfully.')
+        else:
+            self.log.error(
+                    Color.FAIL +
+                    'There were issues with the work done. As a result, ' +
+                    'some/all ISOs may not exist.'
             )
 
-            entry_name_list.clear()
-            for p in checksum_list:
-                path = os.path.join(isos_dir, p)
-                if os.path.exists(path):
-                    self.log.info(Color.INFO + 'Performing checksum for ' + p)
-                    checksum = Shared.get_checksum(path, self.checksum, self.log)
-                    if not checksum:
-                        self.log.error(Color.FAIL + path + ' not found! Are you sure it was built?')
-                    with open(path + '.CHECKSUM', "w+") as c:
-                        c.write(checksum)
-                        c.close()
-
-            self.log.info(Color.INFO + 'Building ' + i + ' completed')
-
-            if len(bad_exit_list) == 0:
-                self.log.info(Color.INFO + 'Images built successfully.')
-            else:
-                self.log.error(
-                        Color.FAIL +
-                        'There were issues with the work done. As a result, ' +
-                        'some/all ISOs may not exist.'
-                )
-
-
     def _generate_graft_points(
             self,
             arch,
@@ -1149,8 +1265,13 @@ class IsoBuild:
             "extra-files"
         )
 
+        # Scans are kept next to the graft list, so a respin only reads the
+        # directories that changed
+        grafts = f'{lorax_base_dir}/{iso}-{arch}-grafts'
+        manifest = GraftManifest(grafts + '.json', self.log, shared=self.graft_scans)
+
         # actually get the boot data
-        files = self._get_grafts([lorax_for_var, extra_files_for_var])
+        files = self._get_grafts([lorax_for_var, extra_files_for_var], scanner=manifest.scan)
 
         # Some variants cannot go through a proper scan.
         if reposcan:
@@ -1169,18 +1290,38 @@ class IsoBuild:
                         self.structure['repodata']
                 )
 
-                for k, v in self._get_grafts([pkg_for_var]).items():
+                for k, v in self._get_grafts([pkg_for_var], scanner=manifest.scan).items():
                     files[os.path.join(repo, "Packages", k)] = v
 
-                for k, v in self._get_grafts([rd_for_var]).items():
+                for k, v in self._get_grafts([rd_for_var], scanner=manifest.scan).items():
                     files[os.path.join(repo, "repodata", k)] = v
 
-        grafts = f'{lorax_base_dir}/{iso}-{arch}-grafts'
+        changes = manifest.changes()
+        self.log.info(
+                Color.INFO + 'Grafts for %s %s: %s added, %s removed, %s changed, %s unchanged (%s directories read, %s reused)' % (
+                    iso,
+                    arch,
+                    changes['added'],
+                    changes['removed'],
+                    changes['changed'],
+                    changes['unchanged'],
+                    manifest.stats['scanned'],
+                    manifest.stats['reused']
+                )
+        )
+        manifest.save()
 
         xorrs = f'{lorax_base_dir}/xorriso-{iso}-{arch}.txt'
 
         # Generate exclusion list/dict from boot.iso manifest
         boot_manifest = f'{lorax_base_dir}/lorax/images/boot.iso.manifest'
+        boot_iso = f'{lorax_base_dir}/lorax/images/boot.iso'
+        if not os.path.exists(boot_manifest) and os.path.exists(boot_iso):
+            self.log.warning(Color.WARN + 'boot.iso.manifest is missing, reading it from boot.iso')
+            try:
+                IsoReader.write_manifest(boot_iso, boot_manifest)
+            except (OSError, ValueError) as e:
+                self.log.error(Color.FAIL + 'Could not read boot.iso: ' + str(e))
         # Boot configs and images that may change
         # It's unlikely these will be changed in empanadas, they're used as is
         # and it works fine. This is a carry over from a recent pungi commit,
@@ -1215,10 +1356,11 @@ class IsoBuild:
         grafters = xorrs
         return grafters
 
-    def _get_grafts(self, paths, exclusive_paths=None, exclude=None):
+    def _get_grafts(self, paths, exclusive_paths=None, exclude=None, scanner=None):
         """
         Actually get some grafts (get_iso_contents), called by generate grafts
         """
+        scanner = scanner or Idents.scanning
         result = {}
         exclude = exclude or []
         exclusive_paths = exclusive_paths or []
@@ -1227,11 +1369,11 @@ class IsoBuild:
             if isinstance(p, dict):
                 tree = p
             else:
-                tree = Idents.scanning(p)
+                tree = scanner(p)
             result = Idents.merging(result, tree)
 
         for p in exclusive_paths:
-            tree = Idents.scanning(p)
+            tree = scanner(p)
             result = Idents.merging(result, tree, exclusive=True)
 
         # Resolves possible symlinks
@@ -1249,52 +1391,24 @@ class IsoBuild:
         """
         Write out the graft points
         """
-        seen = set()
-        # There are files that are on the exclude list typically.
-        exclude = exclude or []
-        # There is a chance files may get updated before being placed in a
-        # variant ISO - it's rare though. most that will be different is
-        # .discinfo
-        update = update or []
-        result = {}
-        for zl in sorted(u, reverse=True):
-            dirn = os.path.dirname(zl)
-
-            if not zl.endswith("/"):
-                result[zl] = u[zl]
-                seen.add(dirn)
-                continue
+        # There are files that are on the exclude list typically. There is a
+        # chance files may get updated before being placed in a variant ISO -
+        # it's rare though. most that will be different is .discinfo
+        lines = Idents.graft_points(u, exclude=exclude, update=update)
+        data = "".join("%s %s %s\n" % line for line in lines)
+
+        # Leave an unchanged list alone, so its mtime still says when the
+        # content last changed
+        try:
+            with open(xorrspath) as fx:
+                if fx.read() == data:
+                    self.log.info(Color.INFO + 'Graft list ' + xorrspath + ' is unchanged')
+                    return
+        except OSError:
+            pass
 
-            found = False
-            for j in seen:
-                if j.startswith(dirn):
-                    found = True
-                    break
-            if not found:
-                result[zl] = u[zl]
-            seen.add(dirn)
-
-        # We check first if a file needs to be updated first before relying on
-        # the boot.iso manifest to exclude a file
         with open(xorrspath, "w") as fx:
-            for zm in sorted(result, key=Idents.sorting):
-                found = False
-                replace = False
-                for upda in update:
-                    if fnmatch(zm, upda):
-                        #print(f'updating: {zm} {upda}')
-                        replace = True
-                        break
-                for excl in exclude:
-                    if fnmatch(zm, excl):
-                        #print(f'ignoring: {zm} {excl}')
-                        found = True
-                        break
-                if found:
-                    continue
-                mcmd = "-update" if replace else "-map"
-                fx.write("%s %s %s\n" % (mcmd, u[zm], zm))
-            fx.close()
+            fx.write(data)
 
     def run_pull_iso_images(self):
         """
@@ -1322,6 +1436,8 @@ class IsoBuild:
             unpack_single_arch = True
             arches_to_unpack = [self.arch]
 
+        # One listing answers every image and variant below
+        index = self._bucket_index('buildimage', arches_to_unpack)
         for name, extra in self.cloudimages['images'].items():
             self.log.info(Color.INFO + 'Determining the latest images for ' + name + ' ...')
             formattype = extra['format']
@@ -1347,7 +1463,8 @@ class IsoBuild:
                             variantname,
                             'buildimage',
                             self.translators,
-                            self.log
+                            self.log,
+                            index=index
                     )
 
                 else:
@@ -1357,7 +1474,9 @@ class IsoBuild:
                             arches_to_unpack,
                             formattype,
                             variantname,
-                            self.log
+                            self.log,
+                            translators=self.translators,
+                            index=index
                     )
 
                 # latest_artifacts should have at least 1 result if has_variants, else == 1
@@ -1370,6 +1489,8 @@ class IsoBuild:
             del variants
 
         #print(latest_artifacts)
+        pulls = []
+        transfers = []
         for keyname in latest_artifacts.keys():
             primary = latest_artifacts[keyname]['primary']
             filetype = latest_artifacts[keyname]['formattype']
@@ -1384,9 +1505,7 @@ class IsoBuild:
                 if type(keysect) == str:
                     continue
 
-                self.log.info(Color.INFO + 'Attempting to download requested ' +
-                              'artifacts (' + keyname + ')')
-
+                downloaded = []
                 for arch in arches_to_unpack:
                     image_arch_dir = os.path.join(
                             self.image_work_dir,
@@ -1406,110 +1525,64 @@ class IsoBuild:
                         fsuffix = drop_name.replace('layer', '')
                         drop_name = source_path.split('/')[-3] + fsuffix
 
-                    checksum_name = drop_name + '.CHECKSUM'
                     full_drop = f'{image_arch_dir}/{drop_name}'
 
-                    checksum_drop = f'{image_arch_dir}/{drop_name}.CHECKSUM'
-
                     if not os.path.exists(image_arch_dir):
                         os.makedirs(image_arch_dir, exist_ok=True)
 
-                    self.log.info('Downloading artifact for ' + Color.BOLD + arch + Color.END)
-                    if self.s3:
-                        Shared.s3_download_artifacts(
-                                self.force_download,
-                                self.s3_bucket,
-                                source_path,
-                                full_drop,
-                                self.log
-                        )
-                    else:
-                        Shared.reqs_download_artifacts(
-                                self.force_download,
-                                self.s3_bucket_url,
-                                source_path,
-                                full_drop,
-                                self.log
-                        )
-
-                    self.log.info('Creating checksum ...')
-                    checksum = Shared.get_checksum(full_drop, self.checksum, self.log)
-                    if not checksum:
-                        self.log.error(Color.FAIL + full_drop + ' not found! Are you sure we copied it?')
-                        continue
-                    with open(checksum_drop, 'w+') as c:
-                        c.write(checksum)
-                        c.close()
+                    transfers.append((source_path, full_drop))
+                    downloaded.append((arch, image_arch_dir, drop_name, full_drop))
 
-                    self.log.info('Creating a symlink to latest image...')
-                    latest_name = '{}/{}-{}-{}.latest.{}.{}'.format(
-                            image_arch_dir,
-                            self.shortname,
-                            self.major_version,
-                            imgname,
-                            arch,
-                            filetype
-                    )
-                    latest_path = latest_name.split('/')[-1]
-                    latest_checksum = '{}/{}-{}-{}.latest.{}.{}.CHECKSUM'.format(
+                pulls.append((keyname, imgname, primary, filetype, downloaded))
+
+        # Every arch of every image is downloaded at the same time
+        self.log.info(Color.INFO + 'Attempting to download %s requested artifacts' % len(transfers))
+        results = self._download_artifacts(transfers)
+        failed = [dest for dest, result in results.items() if isinstance(result, BaseException)]
+
+        publisher = ArtifactPublisher(self.checksum, self.log, cache=self.checksum_cache)
+        for keyname, imgname, primary, filetype, downloaded in pulls:
+            artifacts = []
+            for arch, image_arch_dir, drop_name, full_drop in downloaded:
+                # Whatever is at full_drop is not what was asked for, do not
+                # point the latest links at it
+                if full_drop in failed:
+                    self.log.error(Color.FAIL + 'Download failed, skipping ' + imgname + ' (' + arch + ')')
+                    continue
+
+                aliases = ['{}/{}-{}-{}.latest.{}.{}'.format(
+                        image_arch_dir,
+                        self.shortname,
+                        self.major_version,
+                        imgname,
+                        arch,
+                        filetype
+                )]
+
+                # If this is the primary image, it gets a link of its own
+                if primary and primary in drop_name:
+                    aliases.append('{}/{}-{}-{}.latest.{}.{}'.format(
                             image_arch_dir,
                             self.shortname,
                             self.major_version,
-                            imgname,
+                            keyname,
                             arch,
                             filetype
-                    )
-                    # For some reason python doesn't have a "yeah just change this
-                    # link" part of the function
-                    if os.path.exists(latest_name):
-                        os.remove(latest_name)
-
-                    os.symlink(drop_name, latest_name)
-
-                    self.log.info('Creating checksum for latest symlinked image...')
-                    shutil.copy2(checksum_drop, latest_checksum)
-                    with open(latest_checksum, 'r') as link:
-                        checkdata = link.read()
-
-                    checkdata = checkdata.replace(drop_name, latest_path)
-
-                    with open(latest_checksum, 'w+') as link:
-                        link.write(checkdata)
-                        link.close()
-
-                    # If this is the primary image, set the appropriate symlink
-                    # and checksum
-                    if primary and primary in drop_name:
-                        # If an image is the primary, we set this.
-                        latest_primary_name = '{}/{}-{}-{}.latest.{}.{}'.format(
-                                image_arch_dir,
-                                self.shortname,
-                                self.major_version,
-                                keyname,
-                                arch,
-                                filetype
-                        )
-                        latest_primary_checksum = '{}/{}-{}-{}.latest.{}.{}.CHECKSUM'.format(
-                                image_arch_dir,
-                                self.shortname,
-                                self.major_version,
-                                keyname,
-                                arch,
-                                filetype
-                        )
-                        latest_primary_path = latest_primary_name.split('/')[-1]
-
-                        self.log.info('This is the primary image, setting link and checksum')
-                        if os.path.exists(latest_primary_name):
-                            os.remove(latest_primary_name)
-                        os.symlink(drop_name, latest_primary_name)
-                        shutil.copy2(checksum_drop, latest_primary_checksum)
-                        with open(latest_primary_checksum) as link:
-                            checkpdata = link.read()
-                        checkpdata = checkpdata.replace(drop_name, latest_primary_path)
-                        with open(latest_primary_checksum, 'w+') as link:
-                            link.write(checkpdata)
-                            link.close()
+                    ))
+
+                if os.path.exists(full_drop):
+                    artifacts.append((full_drop, aliases))
+                else:
+                    self.log.error(Color.FAIL + full_drop + ' not found! Are you sure we copied it?')
+
+            # Every arch of this image is hashed at the same time, and the
+            # latest links and their CHECKSUMs come from that same digest
+            self.log.info('Creating checksums and latest links for ' + imgname + ' ...')
+            publisher.publish_many(artifacts)
+
+        if failed:
+            self.log.error(Color.FAIL + 'These images could not be downloaded: ' + ', '.join(sorted(failed)))
+            raise SystemExit()
 
         self.log.info(Color.INFO + 'Image download phase completed')
 
@@ -1536,6 +1609,9 @@ class LiveBuild:
             image_increment: str = '0',
             peridot: bool = False,
             builder: str = 'default',
+            live_parallel=None,
+            live_memory=None,
+            live_cpus=None,
             logger=None
     ):
 
@@ -1564,6 +1640,9 @@ class LiveBuild:
         self.profile = rlvars['profile']
         self.hashed = hashed
         self.peridot = peridot
+        self.live_parallel = live_parallel
+        self.live_memory = live_memory
+        self.live_cpus = live_cpus
 
         # determine builder to use. if a config doesn't have it set, assume
         # lorax, the default option.
@@ -1624,6 +1703,12 @@ class LiveBuild:
                 "work/live"
         )
 
+        self.checksum_cache = ChecksumCache(os.path.join(self.compose_latest_dir, 'work'))
+        # The dnf cache is shared with the lorax and extra ISO roots, the
+        # root cache only between live image roots
+        self.package_cache = f'/var/cache/mock/{self.shortname.lower()}-{self.release}-{self.current_arch}-packages'
+        self.live_root_cache = f'/var/cache/mock/{self.shortname.lower()}-{self.release}-{self.current_arch}-live'
+
         # This is temporary for now.
         if logger is None:
             self.log = logging.getLogger("iso")
@@ -1706,16 +1791,15 @@ class LiveBuild:
                 ', '.join(images_to_build)
         )
 
+        if self.live_iso_mode not in ('local', 'podman'):
+            self.log.error(Color.FAIL + 'Mode specified is not valid.')
+            raise SystemExit()
+
         for i in images_to_build:
             self._live_iso_local_config(i, work_root)
 
-            if self.live_iso_mode == 'local':
-                self._live_iso_local_run(self.current_arch, i, work_root)
-            elif self.live_iso_mode == 'podman':
-                continue
-            else:
-                self.log.error(Color.FAIL + 'Mode specified is not valid.')
-                raise SystemExit()
+        if self.live_iso_mode == 'local':
+            self._live_iso_local_run(self.current_arch, images_to_build, work_root)
 
         if self.live_iso_mode == 'podman':
             #self._live_iso_podman_run(self.current_arch, images_to_build, work_root)
@@ -1723,6 +1807,9 @@ class LiveBuild:
                     'built in podman.')
             raise SystemExit()
 
+    def _live_mock_root(self, arch, image):
+        return f'{self.shortname.lower()}-{self.release}-{arch}-live-{image.lower()}'
+
     def _live_iso_local_config(self, image, work_root):
         """
         Live ISO build configuration - This generates both mock and podman
@@ -1738,7 +1825,9 @@ class LiveBuild:
         if self.peridot:
             kloc = 'peridot'
 
-        mock_iso_path = f'/var/tmp/live-{self.release}.cfg'
+        # Every image has its own mock root so they can be built side by side
+        mock_root = self._live_mock_root(self.current_arch, image)
+        mock_iso_path = f'/var/tmp/live-{self.release}-{self.current_arch}-{image}.cfg'
         mock_sh_path = f'{entries_dir}/liveisobuild-{self.current_arch}-{image}.sh'
         iso_template_path = f'{entries_dir}/buildLiveImage-{self.current_arch}-{image}.sh'
 
@@ -1791,10 +1880,13 @@ class LiveBuild:
                 shortname=self.shortname,
                 required_pkgs=required_pkgs,
                 dist=self.disttag,
-                repos=self.repolist,
+                repos=Shared.mock_repo_list(self.repolist, self.compose_latest_sync, self.current_arch),
                 compose_dir_is_here=True,
                 user_agent='{{ user_agent }}',
                 compose_dir=self.compose_root,
+                mock_root=mock_root,
+                package_cache=self.package_cache,
+                root_cache=self.live_root_cache,
         )
 
         mock_sh_template_output = mock_sh_template.render(
@@ -1807,6 +1899,8 @@ class LiveBuild:
                 isoname=isoname,
                 entries_dir=entries_dir,
                 image=image,
+                mock_cfg=mock_iso_path,
+                mock_root=mock_root,
         )
 
         iso_template_output = iso_template.render(
@@ -1924,16 +2018,13 @@ class LiveBuild:
         )
 
         entry_name_list.clear()
-        for p in checksum_list:
-            path = os.path.join(isos_dir, p)
-            if os.path.exists(path):
-                self.log.info(Color.INFO + 'Performing checksum for ' + p)
-                checksum = Shared.get_checksum(path, self.checksum, self.log)
-                if not checksum:
-                    self.log.error(Color.FAIL + path + ' not found! Are you sure it was built?')
-                with open(path + '.CHECKSUM', "w+") as c:
-                    c.write(checksum)
-                    c.close()
+        paths = [os.path.join(isos_dir, p) for p in checksum_list]
+        paths = [p for p in paths if os.path.exists(p)]
+        if paths:
+            self.log.info(Color.INFO + 'Performing checksums for %s images' % len(paths))
+            ArtifactPublisher(self.checksum, self.log, cache=self.checksum_cache).publish_many(
+                    [(path, ()) for path in paths]
+            )
 
         self.log.info(Color.INFO + 'Building live images completed')
 
@@ -1946,73 +2037,116 @@ class LiveBuild:
                     'some or all ISOs may not be copied later.'
             )
 
-    def _live_iso_local_run(self, arch, image, work_root):
+    def _live_iso_local_run(self, arch, images, work_root):
         """
         Runs the actual local process using mock. This is for running in
         peridot or running on a machine that does not have podman, but does
-        have mock available.
+        have mock available. Every image has its own mock root, as many run
+        at once as memory and disk space allow, and each ISO is copied and
+        checksummed as soon as its build finishes.
         """
         entries_dir = os.path.join(work_root, "entries")
         live_dir_arch = os.path.join(self.live_work_dir, arch)
-        isoname = f'{self.shortname}-{self.release}-{image}-{arch}-{self.date}.iso'
-        isolink = f'{self.shortname}-{self.major_version}-{image}-{arch}-latest.iso'
-        live_res_dir = f'/var/lib/mock/{self.shortname.lower()}-{self.release}-{arch}/result'
-
-        if self.justcopyit:
-            if os.path.exists(os.path.join(live_dir_arch, isoname)):
-                self.log.warning(Color.WARN + 'Image already exists.')
+        log_root = os.path.join(work_root, "logs", self.date_stamp)
+
+        limits = {}
+        if self.live_memory:
+            limits['MemoryMax'] = self.live_memory
+        if self.live_cpus:
+            limits['CPUQuota'] = f'{int(float(self.live_cpus) * 100)}%'
+
+        units = []
+        for image in images:
+            isoname = f'{self.shortname}-{self.release}-{image}-{arch}-{self.date}.iso'
+            if self.justcopyit and os.path.exists(os.path.join(live_dir_arch, isoname)):
+                self.log.warning(Color.WARN + image + ': Image already exists.')
                 if self.force_build:
                     self.log.warning(Color.WARN + 'Building anyway.')
                 else:
                     self.log.warning(Color.WARN + 'Skipping.')
-                    return
+                    continue
 
-        live_iso_cmd = f'/bin/bash {entries_dir}/liveisobuild-{arch}-{image}.sh'
-        self.log.info('Starting mock build...')
-        p = subprocess.call(shlex.split(live_iso_cmd))
-        if p != 0:
-            self.log.error('An error occured during execution.')
-            self.log.error('See the logs for more information.')
-            raise SystemExit()
+            units.append(
+                    MockUnit(
+                        name=image,
+                        command=['/bin/bash', f'{entries_dir}/liveisobuild-{arch}-{image}.sh'],
+                        log_path=os.path.join(log_root, f'mock-live-{arch}-{image}.log'),
+                        group=image,
+                        limits=limits
+                    )
+            )
 
-        self.log.warning(
-                Color.WARN + 'This is meant for builds done in peridot or ' +
-                'locally for an end user.'
-        )
-        self.log.warning(
-                Color.WARN +
-                'If you are looping images, your built image may get ' +
-                'overwritten. Ensure you have justcopyit enabled to avoid this.'
+        if not units:
+            return
+
+        if not self.justcopyit:
+            self.log.warning(
+                    Color.WARN + 'This is meant for builds done in peridot or ' +
+                    'locally for an end user.'
+            )
+            self.log.warning(
+                    Color.WARN + 'Images are left in their mock result ' +
+                    'directories. Enable justcopyit to copy them to the compose.'
+            )
+
+        timing_path = os.path.join(work_root, TimingDB.FILENAME)
+        PodmanSupervisor.apply_durations(units, TimingDB.durations(timing_path, 'live-iso-local'))
+        max_parallel = MockScheduler.capacity(
+                '/var/lib/mock' if os.path.exists('/var/lib/mock') else work_root,
+                mem_per_root=MockScheduler.size(self.live_memory) or 8589934592,
+                disk_per_root=42949672960,
+                ceiling=self.live_parallel or len(units)
         )
 
-        if self.justcopyit:
-            self.log.info(Color.INFO + 'Copying image to work directory')
-            source_path = os.path.join(live_res_dir, isoname)
-            dest_path = os.path.join(live_dir_arch, isoname)
-            link_path = os.path.join(live_dir_arch, isolink)
-            os.makedirs(live_dir_arch, exist_ok=True)
-            try:
-                shutil.copy2(source_path, dest_path)
-                if os.path.exists(link_path):
-                    os.remove(link_path)
-                os.symlink(isoname, link_path)
-            except:
-                self.log.error(Color.FAIL + 'We could not copy the image or create a symlink.')
-                return
+        pool = ThreadPoolExecutor(max_workers=2)
+        copies = []
+        on_failure, bad_exit_list = PodmanSupervisor.group_tracker(units, self.log, verb='Building')
 
-            self.log.info(Color.INFO + 'Generating checksum')
-            checksum = Shared.get_checksum(dest_path, self.checksum, self.log)
-            if not checksum:
-                self.log.error(Color.FAIL + dest_path + ' not found. Did we copy it?')
-                return
-            with open(dest_path + '.CHECKSUM', "w+") as c:
-                c.write(checksum)
-                c.close()
+        def on_complete(result):
+            on_failure(result)
+            if result.ok and self.justcopyit:
+                # Copying and hashing a few GB must not hold up the queue
+                copies.append(pool.submit(self._live_iso_copy, arch, result.name, live_dir_arch))
 
-            linksum = Shared.get_checksum(link_path, self.checksum, self.log)
-            if not linksum:
-                self.log.error(Color.FAIL + link_path + ' not found. Did we copy it?')
-                return
-            with open(link_path + '.CHECKSUM', "w+") as c:
-                c.write(linksum)
-                c.close()
+        self.log.info('Starting mock builds, up to %s at once...' % max_parallel)
+        scheduler = MockScheduler(self.log, max_parallel=max_parallel)
+        timing = TimingDB(work_root, self.log)
+        try:
+            results = scheduler.run(units, timing.recorder('live-iso-local', on_complete=on_complete))
+            wait(copies)
+        finally:
+            pool.shutdown(wait=True)
+        scheduler.report(units, results)
+
+        failed_copies = [c for c in copies if c.exception() or not c.result()]
+        if bad_exit_list or failed_copies:
+            self.log.error('An error occured during execution.')
+            self.log.error('See the logs for more information.')
+            raise SystemExit()
+
+    def _live_iso_copy(self, arch, image, live_dir_arch) -> bool:
+        """
+        Copies a finished live ISO out of its mock root and publishes it with
+        its checksum and latest link
+        """
+        live_res_dir = f'/var/lib/mock/{self._live_mock_root(arch, image)}/result'
+        isoname = f'{self.shortname}-{self.release}-{image}-{arch}-{self.date}.iso'
+        isolink = f'{self.shortname}-{self.major_version}-{image}-{arch}-latest.iso'
+
+        self.log.info(Color.INFO + 'Copying ' + image + ' image to work directory')
+        source_path = os.path.join(live_res_dir, isoname)
+        dest_path = os.path.join(live_dir_arch, isoname)
+        link_path = os.path.join(live_dir_arch, isolink)
+        os.makedirs(live_dir_arch, exist_ok=True)
+        try:
+            shutil.copy2(source_path, dest_path)
+        except OSError:
+            self.log.error(Color.FAIL + 'We could not copy the ' + image + ' image.')
+            return False
+
+        self.log.info(Color.INFO + 'Generating checksum for ' + isoname)
+        ArtifactPublisher(self.checksum, self.log, cache=self.checksum_cache).publish(
+                dest_path,
+                [link_path]
+        )
+        return True
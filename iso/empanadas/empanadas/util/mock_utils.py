@@ -0,0 +1,167 @@
+"""
+Runs several mock builds side by side on the local host.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+
+from attrs import define, field
+
+from empanadas.common import Color
+from empanadas.util.podman_utils import ContainerResult, PodmanSupervisor
+
+@define(kw_only=True)
+class MockUnit:
+    """
+    A single mock build. The command must use a mock root (and config) of
+    its own, so it can run next to the others. limits holds systemd unit
+    properties (MemoryMax, CPUQuota, ...) for the build's scope.
+    """
+    name: str = field()
+    command: list = field()
+    log_path: str = field()
+    group: str = field(default='')
+    weight: float = field(default=None)
+    limits: dict = field(factory=dict)
+
+class MockScheduler(PodmanSupervisor):
+    """
+    The PodmanSupervisor queue for local mock builds. At most max_parallel
+    commands run at once, heaviest first, and each one's output goes to its
+    own log. Results are the same ContainerResult the podman runs give, so
+    group_tracker and TimingDB work unchanged.
+    """
+    def __init__(self, logger, max_parallel=None):
+        super().__init__('mock', logger, max_parallel=max_parallel)
+
+    @staticmethod
+    def mem_available() -> int:
+        """
+        MemAvailable from /proc/meminfo in bytes, 0 if it cannot be read
+        """
+        try:
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
+
+    @staticmethod
+    def capacity(path, mem_per_root=4294967296, disk_per_root=26843545600, ceiling=None) -> int:
+        """
+        How many mock roots fit at once going by available memory and the
+        free space under path, where the roots live. Never less than one.
+        """
+        limits = []
+        mem = MockScheduler.mem_available()
+        if mem:
+            limits.append(mem // mem_per_root)
+        try:
+            limits.append(shutil.disk_usage(path).free // disk_per_root)
+        except OSError:
+            pass
+        if ceiling:
+            limits.append(ceiling)
+        return max(1, min(limits)) if limits else 1
+
+    @staticmethod
+    def size(value) -> int:
+        """
+        Bytes from a size such as 8G, 512M or a plain number, None if unset
+        """
+        if value is None or value == '':
+            return None
+        text = str(value).strip().upper().rstrip('B')
+        scale = 1
+        if text and text[-1] in 'KMGT':
+            scale = 1024 ** ('KMGT'.index(text[-1]) + 1)
+            text = text[:-1]
+        return int(float(text) * scale)
+
+    @staticmethod
+    def limited(command, limits) -> list:
+        """
+        Wraps command in a transient systemd scope carrying limits. Without
+        systemd-run the command is returned as it is.
+        """
+        if not limits:
+            return list(command)
+        systemd_run = shutil.which('systemd-run')
+        if not systemd_run:
+            return list(command)
+        wrapped = [systemd_run, '--scope', '--quiet', '--collect']
+        for key, value in sorted(limits.items()):
+            wrapped.extend(['-p', f'{key}={value}'])
+        return wrapped + ['--'] + list(command)
+
+    async def _run_unit(self, unit):
+        """
+        Runs the command with its output going to the unit's log
+        """
+        start = time.time()
+        os.makedirs(os.path.dirname(unit.log_path), exist_ok=True)
+        command = MockScheduler.limited(unit.command, unit.limits)
+        if unit.limits and command == unit.command:
+            self.log.warning(Color.WARN + 'systemd-run was not found, ' + unit.name + ' runs without limits')
+        with open(unit.log_path, 'ab') as log:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                        *command,
+                        stdin=asyncio.subprocess.DEVNULL,
+                        stdout=log,
+                        stderr=asyncio.subprocess.STDOUT
+                )
+                exit_code = await proc.wait()
+            except OSError as exc:
+                self.log.error(Color.FAIL + 'Could not start ' + unit.name + ': ' + str(exc))
+                exit_code = 127
+
+        return ContainerResult(
+                name=unit.name,
+                group=unit.group,
+                exit_code=exit_code,
+                start=start,
+                end=time.time()
+        )
+
+    @staticmethod
+    def tail(path, lines=20) -> str:
+        """
+        The last lines of a log, for reporting failures
+        """
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 65536))
+                data = f.read().decode(errors='replace')
+        except OSError:
+            return ''
+        return '\n'.join(data.splitlines()[-lines:])
+
+    def report(self, units, results):
+        """
+        Logs one line per unit with its exit code, duration and log, plus the
+        end of the log for every unit that failed
+        """
+        logs = {unit.name: unit.log_path for unit in units}
+        for result in sorted(results, key=lambda r: r.name):
+            if result.ok:
+                self.log.info(
+                        Color.INFO + '%s: ok in %.0fs (%s)' % (result.name, result.end - result.start, logs[result.name])
+                )
+                continue
+            self.log.error(
+                    Color.FAIL + '%s: exit %s after %.0fs (%s)' % (
+                        result.name,
+                        result.exit_code,
+                        result.end - result.start,
+                        logs[result.name]
+                    )
+            )
+            tail = MockScheduler.tail(logs[result.name])
+            if tail:
+                self.log.error(tail)
@@ -0,0 +1,326 @@
+"""
+Syncs yum/dnf repositories in-process without dnf or containers.
+"""
+
+import bz2
+import email.utils
+import gzip
+import hashlib
+import lzma
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+import requests
+
+from empanadas.common import Color
+from empanadas.util.repodata import RepoMD
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+XML_BASE = '{http://www.w3.org/XML/1998/namespace}base'
+
+class NativeSync:
+    """
+    Mirrors a repository: primary.xml is read from the remote repodata, the
+    packages on disk are compared by size and checksum, and only the missing
+    or changed ones are downloaded over a shared pool of keep-alive
+    connections. Every file is verified while it is streamed to disk and
+    only renamed into place once its checksum matches. The repodata is
+    swapped in last, repomd.xml at the very end.
+
+    With a ChecksumCache, the digest of every package that is verified or
+    downloaded is remembered against its inode, size and mtime, so a
+    package that has not changed since is never read again.
+    """
+    def __init__(self, logger, workers=8, timeout=300, chunk_size=1048576, cache=None):
+        self.log = logger
+        self.cache = cache
+        self.workers = workers
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+                pool_connections=workers,
+                pool_maxsize=workers,
+                max_retries=3
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _algorithm(checksum_type) -> str:
+        # yum metadata calls sha1 "sha" on older repos
+        if checksum_type == 'sha':
+            return 'sha1'
+        return checksum_type
+
+    @staticmethod
+    def _hasher(checksum_type):
+        return hashlib.new(NativeSync._algorithm(checksum_type))
+
+    def _remember(self, path, checksum_type, checksum):
+        """
+        Records a verified digest of path in the cache
+        """
+        if self.cache is None:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self.cache.store(st, {self._algorithm(checksum_type): checksum})
+
+    def file_checksum(self, path, checksum_type) -> str:
+        """
+        Checksum of a local file
+        """
+        hasher = self._hasher(checksum_type)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def download(self, url, dest, checksum_type=None, checksum=None) -> int:
+        """
+        Streams url into dest, verifying the checksum on the way. The file is
+        written to dest.part and only renamed once it is verified. The remote
+        modification time is kept. Returns the number of bytes written.
+        """
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        part = dest + '.part'
+        hasher = self._hasher(checksum_type) if checksum_type else None
+        written = 0
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as resp:
+                resp.raise_for_status()
+                with open(part, 'wb') as f:
+                    for chunk in resp.iter_content(chunk_size=self.chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                        if hasher:
+                            hasher.update(chunk)
+                modified = resp.headers.get('Last-Modified')
+
+            if hasher and hasher.hexdigest() != checksum:
+                raise ValueError(f'checksum mismatch for {url}')
+
+            os.replace(part, dest)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+
+        if modified:
+            try:
+                mtime = email.utils.parsedate_to_datetime(modified).timestamp()
+                os.utime(dest, (mtime, mtime))
+            except (TypeError, ValueError):
+                pass
+
+        return written
+
+    @staticmethod
+    def _open_compressed(path):
+        """
+        Opens a possibly compressed metadata file for streaming reads
+        """
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rb')
+        if path.endswith('.xz'):
+            return lzma.open(path, 'rb')
+        if path.endswith('.bz2'):
+            return bz2.open(path, 'rb')
+        if path.endswith('.zst'):
+            if zstandard is None:
+                raise SystemExit(Color.FAIL + 'zstandard is required to read ' + path)
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return open(path, 'rb')
+
+    @staticmethod
+    def packages(primary_path):
+        """
+        Yields (location, xml:base, checksum type, checksum, size) for every
+        package in a primary.xml, without loading the whole file.
+        """
+        with NativeSync._open_compressed(primary_path) as f:
+            for _, elem in ElementTree.iterparse(f, events=('end',)):
+                if elem.tag != COMMON_NS + 'package':
+                    continue
+                checksum = elem.find(COMMON_NS + 'checksum')
+                location = elem.find(COMMON_NS + 'location')
+                size = elem.find(COMMON_NS + 'size')
+                yield (
+                        location.get('href'),
+                        location.get(XML_BASE),
+                        checksum.get('type'),
+                        checksum.text.strip(),
+                        int(size.get('package')) if size is not None else None
+                )
+                elem.clear()
+
+    def _fetch_metadata(self, baseurl, staging):
+        """
+        Downloads repomd.xml and every file it lists into staging. Returns
+        the parsed repomd and the raw repomd.xml.
+        """
+        resp = self.session.get(baseurl + '/repodata/repomd.xml', timeout=self.timeout)
+        resp.raise_for_status()
+        raw = resp.content
+        repomd = RepoMD.parse(raw)
+
+        futures = []
+        for item in repomd['data'].values():
+            href = item['location']
+            futures.append(self.executor.submit(
+                    self.download,
+                    baseurl + '/' + href,
+                    os.path.join(staging, os.path.basename(href)),
+                    item['checksum_type'],
+                    item['checksum']
+            ))
+        for future in futures:
+            future.result()
+
+        return repomd, raw
+
+    def remote_packages(self, baseurl) -> list:
+        """
+        Fetches only repomd.xml and primary from a remote repository and
+        returns the package list, as packages() does.
+        """
+        baseurl = baseurl.rstrip('/')
+        resp = self.session.get(baseurl + '/repodata/repomd.xml', timeout=self.timeout)
+        resp.raise_for_status()
+        primary = RepoMD.parse(resp.content)['data'].get('primary')
+        if not primary:
+            return []
+
+        with tempfile.TemporaryDirectory() as staging:
+            path = os.path.join(staging, os.path.basename(primary['location']))
+            self.download(
+                    baseurl + '/' + primary['location'],
+                    path,
+                    primary['checksum_type'],
+                    primary['checksum']
+            )
+            return list(self.packages(path))
+
+    def _needs_download(self, path, checksum_type, checksum, size) -> bool:
+        if not os.path.exists(path):
+            return True
+        if size is not None and os.path.getsize(path) != size:
+            return True
+        if self.cache is not None:
+            cached = self.cache.lookup(path, [self._algorithm(checksum_type)])
+            if cached is not None:
+                return cached[self._algorithm(checksum_type)] != checksum
+        if self.file_checksum(path, checksum_type) != checksum:
+            return True
+        self._remember(path, checksum_type, checksum)
+        return False
+
+    def sync_repo(self, baseurl, dest, delete=False) -> dict:
+        """
+        Makes dest a copy of the repository at baseurl. With delete, packages
+        that are no longer in the repository are removed. Returns counts of
+        what was done.
+        """
+        baseurl = baseurl.rstrip('/')
+        staging = os.path.join(dest, '.repodata.new')
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        os.makedirs(staging)
+
+        repomd, raw = self._fetch_metadata(baseurl, staging)
+        if 'primary' not in repomd['data']:
+            raise SystemExit(Color.FAIL + 'No primary metadata found at ' + baseurl)
+        primary = os.path.join(staging, os.path.basename(repomd['data']['primary']['location']))
+
+        stats = {'packages': 0, 'downloaded': 0, 'bytes': 0, 'deleted': 0}
+        wanted = set()
+        futures = []
+        for href, base, checksum_type, checksum, size in self.packages(primary):
+            stats['packages'] += 1
+            path = os.path.normpath(os.path.join(dest, href))
+            if not path.startswith(os.path.normpath(dest) + os.sep):
+                self.log.warning(Color.WARN + 'Ignoring package outside of the repo: ' + href)
+                continue
+            wanted.add(path)
+            url = (base.rstrip('/') if base else baseurl) + '/' + href
+            futures.append(self.executor.submit(
+                    self._sync_package,
+                    url,
+                    path,
+                    checksum_type,
+                    checksum,
+                    size
+            ))
+
+        for future in futures:
+            written = future.result()
+            if written is not None:
+                stats['downloaded'] += 1
+                stats['bytes'] += written
+
+        if delete:
+            for root, dirs, files in os.walk(dest):
+                dirs[:] = [d for d in dirs if os.path.join(root, d) not in (staging, os.path.join(dest, 'repodata'))]
+                for name in files:
+                    path = os.path.join(root, name)
+                    if name.endswith('.rpm') and path not in wanted:
+                        os.remove(path)
+                        stats['deleted'] += 1
+
+        self._swap_metadata(dest, staging, raw)
+        return stats
+
+    def _sync_package(self, url, path, checksum_type, checksum, size):
+        """
+        Downloads a package if it is missing or different. Returns the bytes
+        written or None if the local copy was already good.
+        """
+        if not self._needs_download(path, checksum_type, checksum, size):
+            return None
+        written = self.download(url, path, checksum_type, checksum)
+        self._remember(path, checksum_type, checksum)
+        return written
+
+    @staticmethod
+    def _swap_metadata(dest, staging, raw):
+        """
+        Moves the new repodata into place. Old metadata files go away and
+        repomd.xml is written last so clients never see a half updated repo.
+        """
+        repodata = os.path.join(dest, 'repodata')
+        os.makedirs(repodata, exist_ok=True)
+        new_files = set(os.listdir(staging))
+        for name in new_files:
+            os.replace(os.path.join(staging, name), os.path.join(repodata, name))
+
+        tmp = os.path.join(repodata, '.repomd.xml.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp, os.path.join(repodata, 'repomd.xml'))
+
+        for name in os.listdir(repodata):
+            if name not in new_files and name != 'repomd.xml':
+                os.remove(os.path.join(repodata, name))
+        os.rmdir(staging)
@@ -0,0 +1,244 @@
+"""
+Runs and supervises podman containers for syncs, repoclosures and image
+builds.
+"""
+
+import asyncio
+import time
+
+from attrs import define, field
+
+from empanadas.common import Color
+
+@define(kw_only=True)
+class ContainerUnit:
+    """
+    A single container to run. The name doubles as the container name and the
+    entry point script name in the entries directory.
+    """
+    name: str = field()
+    entries_dir: str = field()
+    image: str = field()
+    volumes: list = field(factory=list)
+    privileged: bool = field(default=False)
+    # Used to group units together for reporting (usually a repo or image)
+    group: str = field(default='')
+    # Expected run time in seconds. Heavier units are started first. None
+    # means unknown, and unknown units are started before everything else.
+    weight: float = field(default=None)
+
+@define(kw_only=True)
+class ContainerResult:
+    """
+    The outcome of a single container run
+    """
+    name: str = field()
+    group: str = field()
+    exit_code: int = field()
+    start: float = field()
+    end: float = field()
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0
+
+class PodmanSupervisor:
+    """
+    Starts podman containers concurrently, reads each exit code straight from
+    podman wait and hands back results as each container finishes. At most
+    max_parallel containers run at once. As soon as one finishes, the next
+    queued unit is started, regardless of which group it belongs to.
+
+    Units are taken from a priority queue, heaviest first (longest processing
+    time first), so the total wall clock time trends toward the cost of the
+    largest single unit rather than the sum of the slowest unit per group.
+    """
+    def __init__(self, cmd, logger, max_parallel=None):
+        self.cmd = cmd
+        self.log = logger
+        self.max_parallel = max_parallel
+
+    def run_args(self, unit):
+        """
+        Generates the podman run arguments for a unit
+        """
+        args = [self.cmd, 'run', '-d', '-it']
+        if unit.privileged:
+            args.append('--privileged')
+        else:
+            args.extend(['--security-opt', 'label=disable'])
+
+        for src, dest in unit.volumes:
+            args.extend(['-v', f'{src}:{dest}'])
+
+        args.extend([
+            '--name', unit.name,
+            '--entrypoint', f'{unit.entries_dir}/{unit.name}',
+            unit.image
+        ])
+        return args
+
+    async def _exec(self, *args):
+        """
+        Runs a podman command and returns the return code and stdout
+        """
+        proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+        )
+        output, _ = await proc.communicate()
+        return proc.returncode, output.decode().strip()
+
+    async def _run_unit(self, unit):
+        """
+        Start a container, wait for it and remove it. podman wait prints the
+        exit code of the container, so there is no need to parse podman ps.
+        """
+        start = time.time()
+        try:
+            ret, _ = await self._exec(*self.run_args(unit))
+        except OSError as exc:
+            self.log.error(Color.FAIL + 'Could not run ' + self.cmd + ' for ' + unit.name + ': ' + str(exc))
+            ret = 127
+        if ret != 0:
+            self.log.error(Color.FAIL + 'Container could not be started: ' + unit.name)
+            return ContainerResult(
+                    name=unit.name,
+                    group=unit.group,
+                    exit_code=ret,
+                    start=start,
+                    end=time.time()
+            )
+
+        try:
+            ret, output = await self._exec(self.cmd, 'wait', unit.name)
+        except OSError as exc:
+            self.log.error(Color.FAIL + 'Could not wait for ' + unit.name + ': ' + str(exc))
+            ret, output = 127, ''
+        end = time.time()
+        try:
+            exit_code = int(output.splitlines()[-1])
+        except (ValueError, IndexError):
+            exit_code = ret if ret != 0 else 1
+
+        try:
+            await self._exec(self.cmd, 'rm', '-f', unit.name)
+        except OSError:
+            pass
+        return ContainerResult(
+                name=unit.name,
+                group=unit.group,
+                exit_code=exit_code,
+                start=start,
+                end=end
+        )
+
+    async def stream(self, units):
+        """
+        Async generator that yields a ContainerResult as each container
+        completes.
+        """
+        queue = asyncio.PriorityQueue()
+        results = asyncio.Queue()
+        for order, unit in enumerate(units):
+            queue.put_nowait((self.priority(unit), order, unit))
+
+        workers = self.max_parallel or len(units)
+        workers = max(1, min(workers, len(units)))
+
+        async def worker():
+            while True:
+                try:
+                    _, _, unit = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    result = await self._run_unit(unit)
+                except BaseException as exc:
+                    # Hand it to the reader, which would otherwise wait
+                    # forever for a result that never comes
+                    await results.put(exc)
+                    raise
+                await results.put(result)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            for _ in range(len(units)):
+                result = await results.get()
+                if isinstance(result, BaseException):
+                    raise result
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, units, on_complete=None):
+        """
+        Runs every unit and returns the list of results in completion order.
+        on_complete is called with each result as it arrives.
+        """
+        units = list(units)
+        if not units:
+            return []
+
+        async def collect():
+            collected = []
+            async for result in self.stream(units):
+                if on_complete:
+                    on_complete(result)
+                collected.append(result)
+            return collected
+
+        return asyncio.run(collect())
+
+    @staticmethod
+    def priority(unit) -> float:
+        """
+        Sort key for the queue. Lower runs sooner.
+        """
+        if unit.weight is None:
+            return float('-inf')
+        return -unit.weight
+
+    @staticmethod
+    def widest_group(units) -> int:
+        """
+        Returns the number of units in the largest group
+        """
+        sizes = {}
+        for unit in units:
+            sizes[unit.group] = sizes.get(unit.group, 0) + 1
+        return max(sizes.values()) if sizes else 1
+
+    @staticmethod
+    def group_tracker(units, logger, verb='Syncing'):
+        """
+        Returns an on_complete callback that logs failed units and logs when
+        every unit of a group has finished. Failed unit names are appended to
+        the returned list.
+        """
+        remaining = {}
+        for unit in units:
+            remaining[unit.group] = remaining.get(unit.group, 0) + 1
+        bad_exit_list = []
+
+        def on_complete(result):
+            if not result.ok:
+                logger.error(Color.FAIL + result.name)
+                bad_exit_list.append(result.name)
+            remaining[result.group] -= 1
+            if remaining[result.group] == 0:
+                logger.info(Color.INFO + verb + ' ' + result.group + ' completed')
+
+        return on_complete, bad_exit_list
+
+    @staticmethod
+    def apply_durations(units, durations):
+        """
+        Sets the weight of each unit from a durations dict
+        """
+        for unit in units:
+            if unit.name in durations:
+                unit.weight = float(durations[unit.name])
@@ -0,0 +1,134 @@
+"""
+A content-addressed package pool shared between composes.
+"""
+
+import errno
+import os
+
+from empanadas.common import Color
+from empanadas.util.checksum import ChecksumEngine
+from empanadas.util.native_sync import NativeSync
+from empanadas.util.repodata import RepoMD
+
+class PackagePool:
+    """
+    Packages are kept under root/sha256/<first two>/<checksum>, hardlinked
+    to every compose that carries them. Before a sync, the packages a repo
+    lists in its remote primary.xml are linked into place from the pool, so
+    only packages the pool has never seen are downloaded. After a sync, new
+    packages are linked back into the pool once they are checked against
+    their checksum. The pool has to be on the same filesystem as the
+    composes.
+    """
+    def __init__(self, root, logger, cache=None, workers=4):
+        self.root = root
+        self.log = logger
+        self.usable = True
+        self.engine = ChecksumEngine(('sha256',), workers=workers, cache=cache)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, checksum) -> str:
+        return os.path.join(self.root, 'sha256', checksum[:2], checksum)
+
+    def _link(self, src, dest) -> bool:
+        """
+        Hardlinks src to dest through a temporary name. Turns the pool off
+        if the two are on different filesystems.
+        """
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = os.path.join(os.path.dirname(dest), '.' + os.path.basename(dest) + '.pool')
+        try:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            os.link(src, tmp)
+            os.replace(tmp, dest)
+            return True
+        except OSError as exc:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if exc.errno == errno.EXDEV:
+                self.log.warning(
+                        Color.WARN + 'The package pool is not on the same '
+                        'filesystem as the compose and will not be used.'
+                )
+                self.usable = False
+            else:
+                self.log.warning(Color.WARN + 'Could not link ' + dest + ': ' + str(exc))
+            return False
+
+    def seed(self, packages, dest) -> dict:
+        """
+        Links every package the pool already has into dest. packages is what
+        NativeSync.packages or remote_packages return.
+        """
+        stats = {'linked': 0, 'bytes': 0}
+        for href, _, checksum_type, checksum, size in packages:
+            if not self.usable:
+                break
+            if checksum_type != 'sha256':
+                continue
+            target = os.path.join(dest, href)
+            source = self.path_for(checksum)
+            if os.path.exists(target) or not os.path.exists(source):
+                continue
+            if self._link(source, target):
+                stats['linked'] += 1
+                stats['bytes'] += size or 0
+        return stats
+
+    def ingest(self, dest) -> int:
+        """
+        Links the packages of a synced repo into the pool, using the local
+        primary.xml. reposync keeps files that are already there without
+        checking them, so each new package is hashed first and left out if
+        it does not match. Returns how many were new to the pool.
+        """
+        repomd = RepoMD.read_local(dest)
+        if not repomd or 'primary' not in repomd['data']:
+            return 0
+
+        primary = os.path.join(dest, repomd['data']['primary']['location'])
+        if not os.path.exists(primary):
+            return 0
+
+        candidates = []
+        for href, _, checksum_type, checksum, _ in NativeSync.packages(primary):
+            if checksum_type != 'sha256':
+                continue
+            source = os.path.join(dest, href)
+            target = self.path_for(checksum)
+            if os.path.exists(target) or not os.path.exists(source):
+                continue
+            candidates.append((source, target, checksum))
+
+        digests = self.engine.digest_many([source for source, _, _ in candidates])
+        added = 0
+        for source, target, checksum in candidates:
+            if not self.usable:
+                break
+            digest = digests[source]
+            if digest is None or digest['sha256'] != checksum:
+                self.log.warning(Color.WARN + source + ' does not match its checksum, not adding it to the pool')
+                continue
+            if os.path.exists(target):
+                continue
+            if self._link(source, target):
+                added += 1
+        return added
+
+    def prune(self) -> int:
+        """
+        Removes pool entries that no compose links to anymore, which is any
+        entry whose only link is the pool's own
+        """
+        removed = 0
+        for root, _, files in os.walk(os.path.join(self.root, 'sha256')):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_nlink == 1:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
@@ -0,0 +1,78 @@
+"""
+Puts built artifacts in place with their alias links and CHECKSUM files.
+"""
+
+import os
+
+from empanadas.common import Color
+from empanadas.util.checksum import ChecksumEngine
+
+class ArtifactPublisher:
+    """
+    Publishes a built file under any number of alias names, such as
+    Rocky-x86_64-boot.iso or Rocky-9-latest-x86_64-boot.iso. The file is
+    hashed once, and every CHECKSUM file (the primary's and one per alias)
+    is written from that single digest. Links and CHECKSUM files are
+    swapped into place with os.replace, so a reader never sees a missing
+    link or a half-written CHECKSUM.
+    """
+    def __init__(self, hashtype, logger, cache=None, workers=4):
+        self.hashtype = hashtype
+        self.log = logger
+        self.engine = ChecksumEngine((hashtype,), workers=workers, cache=cache)
+
+    @staticmethod
+    def write_atomic(path, data):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def link(target, link_path):
+        """
+        Points link_path at target (a name relative to the link), replacing
+        whatever is there
+        """
+        tmp = f'{link_path}.{os.getpid()}.tmp'
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        os.symlink(target, tmp)
+        os.replace(tmp, link_path)
+
+    def publish_many(self, artifacts, link=True) -> dict:
+        """
+        Publishes every (path, aliases) at once. Aliases are full paths and
+        are linked to path when link is set. Otherwise the aliases must
+        already exist and missing ones are skipped. Returns {path: checksum
+        line}, or False for a path that could not be read.
+        """
+        artifacts = [(path, list(aliases)) for path, aliases in artifacts]
+        digests = self.engine.digest_many(path for path, _ in artifacts)
+
+        results = {}
+        for path, aliases in artifacts:
+            digest = digests[path]
+            if digest is None:
+                self.log.error(Color.FAIL + path + ' not found! Are you sure it was built?')
+                results[path] = False
+                continue
+
+            if link:
+                for alias in aliases:
+                    ArtifactPublisher.link(os.path.basename(path), alias)
+            else:
+                aliases = [alias for alias in aliases if os.path.exists(alias)]
+
+            for name in [path] + aliases:
+                line = ChecksumEngine.checksum_line(name, self.hashtype, digest[self.hashtype])
+                ArtifactPublisher.write_atomic(name + '.CHECKSUM', line)
+                if name == path:
+                    results[path] = line
+        return results
+
+    def publish(self, path, aliases=(), link=True):
+        """
+        Publishes a single file, see publish_many
+        """
+        return self.publish_many([(path, aliases)], link=link)[path]
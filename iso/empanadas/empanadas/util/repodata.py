@@ -0,0 +1,139 @@
+"""
+Reads yum/dnf repository metadata, both local and remote.
+"""
+
+import configparser
+import os
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+import requests
+
+from empanadas.common import Color
+
+REPO_NS = '{http://linux.duke.edu/metadata/repo}'
+
+class RepoMD:
+    """
+    Helpers for repomd.xml. A parsed repomd is a dict with the revision and a
+    map of each data type to its checksum and location.
+    """
+    @staticmethod
+    def parse(content) -> dict:
+        """
+        Parses the contents of a repomd.xml
+        """
+        root = ElementTree.fromstring(content)
+        revision = root.findtext(REPO_NS + 'revision')
+        data = {}
+        for item in root.findall(REPO_NS + 'data'):
+            checksum = item.find(REPO_NS + 'checksum')
+            location = item.find(REPO_NS + 'location')
+            data[item.get('type')] = {
+                    'checksum_type': checksum.get('type') if checksum is not None else None,
+                    'checksum': checksum.text.strip() if checksum is not None and checksum.text else None,
+                    'location': location.get('href') if location is not None else None,
+            }
+
+        return {'revision': revision.strip() if revision else None, 'data': data}
+
+    @staticmethod
+    def read_local(repo_path):
+        """
+        Parses repodata/repomd.xml under repo_path. Returns None if it is
+        missing or broken.
+        """
+        path = os.path.join(repo_path, 'repodata', 'repomd.xml')
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                return RepoMD.parse(f.read())
+        except (OSError, ElementTree.ParseError):
+            return None
+
+    @staticmethod
+    def fetch(baseurl, session=None, timeout=30):
+        """
+        Downloads and parses the repomd.xml of a remote repository. Returns
+        None if it could not be retrieved.
+        """
+        url = baseurl.rstrip('/') + '/repodata/repomd.xml'
+        getter = session or requests
+        try:
+            resp = getter.get(url, timeout=timeout)
+            resp.raise_for_status()
+            return RepoMD.parse(resp.content)
+        except (requests.exceptions.RequestException, ElementTree.ParseError):
+            return None
+
+    @staticmethod
+    def same(local, remote) -> bool:
+        """
+        True if both repomd's exist and describe the same metadata
+        """
+        if not local or not remote:
+            return False
+
+        if local['revision'] != remote['revision']:
+            return False
+
+        local_sums = {k: (v['checksum_type'], v['checksum']) for k, v in local['data'].items()}
+        remote_sums = {k: (v['checksum_type'], v['checksum']) for k, v in remote['data'].items()}
+        return local_sums == remote_sums
+
+    @staticmethod
+    def baseurls(dnf_config, arch=None) -> dict:
+        """
+        Returns the baseurl of every repo id in a dnf config, with $basearch
+        filled in when an arch is given.
+        """
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(dnf_config)
+        urls = {}
+        for section in parser.sections():
+            baseurl = parser.get(section, 'baseurl', fallback=None)
+            if not baseurl:
+                continue
+            # dnf allows multiple baseurls, the first is the one we sync from
+            baseurl = baseurl.split()[0]
+            if arch:
+                baseurl = baseurl.replace('$basearch', arch)
+            urls[section] = baseurl
+        return urls
+
+    @staticmethod
+    def unchanged(checks, logger, workers=16) -> set:
+        """
+        Compares remote and local repomd.xml for a set of units. checks maps
+        a unit name to a (baseurl, local repo path) tuple. Returns the names
+        of the units whose metadata has not changed.
+        """
+        if not checks:
+            return set()
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+                pool_connections=workers,
+                pool_maxsize=workers
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        def compare(item):
+            name, (baseurl, local_path) = item
+            local = RepoMD.read_local(local_path)
+            if not local:
+                return name, False
+            remote = RepoMD.fetch(baseurl, session=session)
+            if not remote:
+                logger.warning(Color.WARN + 'Could not retrieve repomd.xml for ' + name)
+                return name, False
+            return name, RepoMD.same(local, remote)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(compare, checks.items()))
+
+        session.close()
+        return {name for name, same in results if same}
@@ -0,0 +1,174 @@
+"""
+Moves artifacts to and from s3 with one client per process.
+"""
+
+import fnmatch
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import boto3
+import boto3.exceptions
+import botocore.config
+import botocore.exceptions
+from boto3.s3.transfer import TransferConfig
+
+from empanadas.common import Color
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+class S3Transfers:
+    """
+    Downloads and uploads whole batches of objects. Every object goes
+    through boto3's managed transfer with tuned multipart chunks, so a large
+    one is moved in concurrent parts, and a batch runs several objects at
+    once. All of it shares a single client (and its connection pool) per
+    process. Downloads land in dest.part and are renamed once complete.
+    """
+    def __init__(self, bucket, logger, region=None, chunk_size=67108864,
+                 concurrency=10, workers=4):
+        self.bucket = bucket
+        self.log = logger
+        self.workers = workers
+        self.client = S3Transfers.get_client(region, workers * concurrency)
+        self.config = TransferConfig(
+                multipart_threshold=chunk_size,
+                multipart_chunksize=chunk_size,
+                max_concurrency=concurrency,
+                use_threads=True
+        )
+
+    @staticmethod
+    def get_client(region=None, max_pool_connections=50):
+        """
+        Returns the process wide s3 client for a region and connection pool
+        size. Clients are safe to share between threads, sessions are not,
+        so each gets its own.
+        """
+        key = (os.getpid(), region, max_pool_connections)
+        with _clients_lock:
+            if key not in _clients:
+                session = boto3.session.Session()
+                _clients[key] = session.client(
+                        's3',
+                        region_name=region,
+                        config=botocore.config.Config(
+                            max_pool_connections=max_pool_connections,
+                            retries={'max_attempts': 10, 'mode': 'adaptive'}
+                        )
+                )
+            return _clients[key]
+
+    def download(self, key, dest, force=False) -> int:
+        """
+        Downloads one object. Returns its size, or 0 if dest already exists.
+        """
+        if os.path.exists(dest) and not force:
+            self.log.warning(Color.WARN + 'Artifact at ' + dest + ' already exists')
+            return 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        part = dest + '.part'
+        try:
+            self.client.download_file(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Filename=part,
+                    Config=self.config
+            )
+            os.replace(part, dest)
+        except BaseException:
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        return os.path.getsize(dest)
+
+    def upload(self, path, key) -> int:
+        """
+        Uploads one file. Returns its size.
+        """
+        self.client.upload_file(
+                Filename=path,
+                Bucket=self.bucket,
+                Key=key,
+                Config=self.config
+        )
+        return os.path.getsize(path)
+
+    def _run_many(self, verb, func, jobs) -> dict:
+        """
+        Runs func over (name, *args) jobs concurrently. Returns {name: bytes}
+        or the exception for a job that failed.
+        """
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            futures = {job[0]: executor.submit(func, *job[1:]) for job in jobs}
+            wait(futures.values())
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except (
+                    boto3.exceptions.Boto3Error,
+                    botocore.exceptions.BotoCoreError,
+                    botocore.exceptions.ClientError,
+                    OSError
+            ) as exc:
+                self.log.error(Color.FAIL + 'Could not %s %s: %s' % (verb, name, exc))
+                results[name] = exc
+
+        total = sum(r for r in results.values() if isinstance(r, int))
+        elapsed = max(time.monotonic() - started, 0.001)
+        self.log.info(
+                Color.INFO + '%s %.1f MiB across %s objects (%.1f MiB/s)' % (
+                    verb.capitalize() + 'ed',
+                    total / 1048576,
+                    len(results),
+                    total / 1048576 / elapsed
+                )
+        )
+        return results
+
+    def download_many(self, transfers, force=False) -> dict:
+        """
+        Downloads every (key, dest) at the same time. Returns {dest: bytes}.
+        """
+        jobs = [(dest, key, dest, force) for key, dest in transfers]
+        return self._run_many('download', self.download, jobs)
+
+    def upload_many(self, transfers) -> dict:
+        """
+        Uploads every (path, key) at the same time. Returns {key: bytes}.
+        """
+        jobs = [(key, path, key) for path, key in transfers]
+        return self._run_many('upload', self.upload, jobs)
+
+    def upload_dir(self, source, prefix, include=None) -> dict:
+        """
+        Uploads everything under source to prefix, keeping relative paths,
+        like aws s3 cp --recursive. include limits it to relative paths
+        matching one of the given globs.
+        """
+        transfers = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, source)
+                if include and not any(fnmatch.fnmatch(rel, pattern) for pattern in include):
+                    continue
+                # A bare bucket has an empty prefix, and keys never start with /
+                transfers.append((path, '/'.join(filter(None, [prefix.strip('/'), rel]))))
+        return self.upload_many(transfers)
+
+    @staticmethod
+    def split_url(url):
+        """
+        s3://bucket/some/prefix -> (bucket, some/prefix)
+        """
+        if not url.startswith('s3://'):
+            raise ValueError('Not an s3 url: ' + url)
+        bucket, _, prefix = url[5:].partition('/')
+        return bucket, prefix
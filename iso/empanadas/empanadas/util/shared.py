@@ -1,16 +1,19 @@
 # These are shared utilities used
 
 import os
+import re
+import bisect
+import fnmatch
 import json
 import hashlib
 import shlex
 import subprocess
 import shutil
 import tarfile
+import tempfile
+from xml.etree import ElementTree
 import yaml
 import requests
-import boto3
-import xmltodict
 import productmd.treeinfo
 import productmd.composeinfo
 import pycdlib
@@ -18,6 +21,11 @@ import magic
 import empanadas
 import kobo.shortcuts
 from empanadas.common import Color
+from empanadas.util.checksum import ChecksumEngine
+from empanadas.util.download import DownloadManager
+from empanadas.util.s3 import S3Transfers
+from empanadas.util.bucket_index import BucketIndex
+from empanadas.util.iso9660 import IsoReader
 
 class ArchCheck:
     """
@@ -64,42 +72,37 @@ class Shared:
     Quick utilities that may be commonly used
     """
     @staticmethod
-    def get_checksum(path, hashtype, logger):
+    def get_checksum(path, hashtype, logger, cache=None):
         """
         Generates a checksum from the provided path by doing things in chunks.
         This way we don't do it in memory.
         """
+        return Shared.get_checksums([path], hashtype, logger, cache=cache)[path]
+
+    @staticmethod
+    def get_checksums(paths, hashtype, logger, workers=4, cache=None):
+        """
+        Checksums a batch of files concurrently. Symlinked aliases are read
+        only once, and with a ChecksumCache unchanged files are not read at
+        all. Returns {path: checksum line}, or False for a path that could
+        not be read.
+        """
         try:
-            checksum = hashlib.new(hashtype)
+            engine = ChecksumEngine((hashtype,), workers=workers, cache=cache)
         except ValueError:
             logger.error("Invalid hash type: %s", hashtype)
-            return False
+            return {path: False for path in paths}
 
-        try:
-            with open(path, "rb") as input_file:
-                while True:
-                    chunk = input_file.read(8192)
-                    if not chunk:
-                        break
-                    checksum.update(chunk)
-
-                input_file.close()
-        except IOError as exc:
-            logger.error("Could not open file %s: %s", path, exc)
-            return False
-
-        stat = os.stat(path)
-        base = os.path.basename(path)
-        # This emulates our current syncing scripts that runs stat and
-        # sha256sum and what not with a very specific output.
-        # pylint: disable=consider-using-f-string
-        return "# %s: %s bytes\n%s (%s) = %s\n" % (
-                base,
-                stat.st_size,
-                hashtype.upper(),
-                base,
-                checksum.hexdigest()
-        )
+        results = {}
+        for path, digest in engine.digest_many(paths).items():
+            if digest is None:
+                logger.error("Could not open file %s", path)
+                results[path] = False
+                continue
+            # This emulates our current syncing scripts that runs stat and
+            # sha256sum and what not with a very specific output.
+            results[path] = ChecksumEngine.checksum_line(path, hashtype, digest[hashtype])
+        return results
 
     @staticmethod
     def treeinfo_new_write(
@@ -135,10 +138,11 @@ class Shared:
         ti.dump(file_path)
 
     @staticmethod
-    def treeinfo_modify_write(data, imagemap, logger):
+    def treeinfo_modify_write(data, imagemap, logger, cache=None):
         """
         Modifies a specific treeinfo with already available data. This is in
-        the case of modifying treeinfo for primary repos or images.
+        the case of modifying treeinfo for primary repos or images. Image
+        checksums are taken from the ChecksumCache when one is given.
         """
         arch = data['arch']
         variant = data['variant']
@@ -184,6 +188,7 @@ class Shared:
         # assigned var, assign it back to the platform dictionary. If the path
         # is empty, continue. Do checksums afterwards.
         plats = ti.images.images.copy()
+        to_sum = []
         for platform in ti.images.images:
             ti.images.images[platform] = {}
             for i, p in plats[platform].items():
@@ -192,14 +197,22 @@ class Shared:
                 if 'boot.iso' in i and is_disc:
                     continue
                 ti.images.images[platform][i] = p
-                ti.checksums.add(p, checksum, root_dir=image)
+                to_sum.append(p)
 
         # stage2 checksums
         if ti.stage2.mainimage:
-            ti.checksums.add(ti.stage2.mainimage, checksum, root_dir=image)
+            to_sum.append(ti.stage2.mainimage)
 
         if ti.stage2.instimage:
-            ti.checksums.add(ti.stage2.instimage, checksum, root_dir=image)
+            to_sum.append(ti.stage2.instimage)
+
+        engine = ChecksumEngine((checksum,), cache=cache)
+        digests = engine.digest_many(os.path.join(image, p) for p in to_sum)
+        for p in to_sum:
+            digest = digests[os.path.join(image, p)]
+            if digest is None:
+                raise OSError(f'Could not checksum {p}')
+            ti.checksums.add(p, checksum, checksum_value=digest[checksum])
 
         # If we are a disc, set the media section appropriately.
         if is_disc:
@@ -367,6 +380,93 @@ class Shared:
             )
         return cmd
 
+    @staticmethod
+    def dnf_cache_dir(work_root, arch) -> str:
+        """
+        The per compose, per arch dnf cache shared by the sync and repoclosure
+        containers. It is mounted as /var/cache/dnf, makecache holds an
+        exclusive flock per repo id and reposync and repoclosure a shared
+        one, so nothing reads metadata that is still being written.
+        """
+        cache_dir = os.path.join(work_root, 'dnf-cache', arch)
+        os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+
+    @staticmethod
+    def dnf_cache_lock(repoids, cmd, mode='-s') -> str:
+        """
+        Prefixes cmd with the flock of every repo id it loads from the shared
+        dnf cache. The locks are always taken in sorted order, so units that
+        load overlapping repos cannot deadlock each other.
+        """
+        locks = ''.join(
+                f'/usr/bin/flock {mode} /var/cache/dnf/.{repoid}.lock '
+                for repoid in sorted(set(repoids))
+        )
+        return locks + cmd
+
+    @staticmethod
+    def sync_image(cmd, container, gpg_key_list, templates, logger,
+            dnf_plugins=('dnf-plugins-core',)):
+        """
+        Builds (once) a local image on top of container with the dnf plugins
+        installed and the gpg keys imported, so the sync and repoclosure
+        containers do not have to do it every time. The tag is a hash of the
+        base image and the Containerfile, so it is rebuilt whenever either
+        changes.
+
+        :return: A tuple of the image to use and whether it is prebaked. If
+        the image cannot be built, the plain container is returned.
+        """
+        containerfile = templates.get_template('syncimage.tmpl').render(
+                container=container,
+                gpg_key_list=gpg_key_list,
+                dnf_plugins=dnf_plugins
+        )
+
+        def base_id():
+            inspect = subprocess.run(
+                    [cmd, 'image', 'inspect', '--format', '{{.Id}}', container],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    check=False
+            )
+            return inspect.stdout.decode().strip() if inspect.returncode == 0 else ''
+
+        base = base_id()
+        if not base:
+            subprocess.run([cmd, 'pull', container], check=False)
+            base = base_id()
+
+        digest = hashlib.sha256((base + containerfile).encode()).hexdigest()[:16]
+        tag = f'localhost/empanadas-sync:{digest}'
+        exists = subprocess.run(
+                [cmd, 'image', 'exists', tag],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=False
+        )
+        if exists.returncode == 0:
+            return tag, True
+
+        logger.info(Color.INFO + 'Building sync image ' + tag)
+        with tempfile.TemporaryDirectory() as context:
+            with open(os.path.join(context, 'Containerfile'), 'w') as f:
+                f.write(containerfile)
+            build = subprocess.run(
+                    [cmd, 'build', '-t', tag, '-f', os.path.join(context, 'Containerfile'), context],
+                    check=False
+            )
+
+        if build.returncode != 0:
+            logger.warning(
+                    Color.WARN + 'Could not build the sync image. Plugins and '
+                    'keys will be installed in each container.'
+            )
+            return container, False
+
+        return tag, True
+
     @staticmethod
     def reposync_cmd(logger) -> str:
         """
@@ -567,165 +667,107 @@ class Shared:
 
         return message, retval
 
-    # pylint: disable=too-many-locals,too-many-arguments
     @staticmethod
-    def s3_determine_latest(s3_bucket, release, arches, filetype, name,
-                            root_prefix, translators, logger):
+    def bucket_index(s3, bucket, prefixes, logger, region=None, cache_dir=None, ttl=600):
         """
-        Using native s3, determine the latest artifacts and return a dict
+        Lists each prefix of the artifact bucket once and returns a
+        BucketIndex of it. bucket is the bucket name with s3, otherwise the
+        bucket url.
         """
-        temp = []
-        data = {}
-        s3 = boto3.client('s3')
+        if s3:
+            source = 's3://' + bucket
+            lister = BucketIndex.s3_lister(S3Transfers.get_client(region), bucket)
+        else:
+            source = bucket
+            lister = BucketIndex.http_lister(bucket, logger)
 
         try:
-            res = s3.list_objects_v2(Bucket=s3_bucket)
-        except:
-            logger.error(
-                        '[' + Color.BOLD + Color.RED + 'FAIL' + Color.END + '] ' +
-                        'Cannot access s3 bucket.'
-            )
-            raise SystemExit()
-
-        objs = res['Contents']
-
-        while True:
-            for y in objs:
-                key = y['Key']
-                if key.endswith(filetype) and release in key and name in key:
-                    temp.append(y['Key'])
-            next_token = res.get("NextContinuationToken", None)
-            if next_token:
-                res = s3.list_objects_v2(Bucket=s3_bucket, ContinuationToken=next_token)
-                objs = res['Contents']
-            else:
-                break
-
-        for arch in arches:
-            temps = []
-            new_arch = arch
-            new_release = release
-            # This is lazy, but...
-            if root_prefix == 'buildiso':
-                new_arch = translators[arch]
-                new_release = release.split('.')[0]
-            start_of_path = f"{root_prefix}-{new_release}-{new_arch}"
-            for y in temp:
-                if arch in y and y.startswith(start_of_path):
-                    temps.append(y)
-            temps.sort(reverse=True)
-            if len(temps) > 0:
-                data[arch] = temps[0]
-
-        return data
+            return BucketIndex.load(source, prefixes, lister, logger, cache_dir=cache_dir, ttl=ttl)
+        except Exception as exc: # pylint: disable=broad-except
+            logger.error(Color.FAIL + 'Cannot access the artifact bucket: ' + str(exc))
+            raise SystemExit(exc) from exc
 
+    # pylint: disable=too-many-locals,too-many-arguments
     @staticmethod
-    def s3_download_artifacts(force_download, s3_bucket, source, dest, logger):
+    def s3_determine_latest(s3_bucket, release, arches, filetype, name,
+                            root_prefix, translators, logger, index=None):
         """
-        Download the requested artifact(s) via s3
+        Using native s3, determine the latest artifacts and return a dict.
+        Only the prefixes of the requested arches are listed, unless an
+        already built index is given.
         """
-        s3 = boto3.client('s3')
-        if os.path.exists(dest):
-            if not force_download:
-                logger.warning(
-                        '[' + Color.BOLD + Color.YELLOW + 'WARN' + Color.END + '] ' +
-                        'Artifact at ' + dest + ' already exists'
-                )
-                return
-
-        logger.info('Downloading ({}) to: {}'.format(source, dest))
-        try:
-            s3.download_file(
-                    Bucket=s3_bucket,
-                    Key=source,
-                    Filename=dest
-            )
-        except:
-            logger.error('There was an issue downloading from %s' % s3_bucket)
+        if index is None:
+            prefixes = [BucketIndex.prefix_for(root_prefix, release, a, translators) for a in arches]
+            index = Shared.bucket_index(True, s3_bucket, prefixes, logger)
 
+        return index.latest_by_arch(root_prefix, release, arches, filetype, name, translators)
 
     @staticmethod
-    def reqs_determine_latest(s3_bucket_url, release, arches, filetype, name, logger, page_size=1000):
+    def s3_download_many(force_download, s3_bucket, transfers, logger, region=None, workers=4):
         """
-        Using requests, determine the latest artifacts and return a list
+        Downloads every (source, dest) in transfers at the same time via s3,
+        each as a parallel multipart transfer. Returns {dest: bytes or
+        exception}.
         """
-        temp = []
-        data = {}
-        marker = None
+        for source, dest in transfers:
+            logger.info('Downloading ({}) to: {}'.format(source, dest))
 
+        return S3Transfers(s3_bucket, logger, region=region, workers=workers).download_many(
+                transfers,
+                force=force_download
+        )
+
+    @staticmethod
+    def reqs_determine_latest(s3_bucket_url, release, arches, filetype, name, logger,
+                              page_size=1000, translators=None, index=None):
+        """
+        Using requests, determine the latest artifacts and return a dict
+        """
         # Hardcoding this for now until we can come up with a better solution
         if 'lorax' in name:
             prefix = "buildiso"
         else:
             prefix = "buildimage"
 
-        while True:
-            params = {}
-            if marker:
-                params['marker'] = marker
-            params['prefix'] = f"{prefix}-{release.split('.')[0]}-"
-            params['max-keys'] = str(page_size)
-
-            try:
-                bucket_data = requests.get(s3_bucket_url, params=params, timeout=100)
-            except requests.exceptions.RequestException as exception:
-                logger.error('The s3 bucket http endpoint is inaccessible')
-                raise SystemExit(exception) from exception
-
-            resp = xmltodict.parse(bucket_data.content)
-
-            if 'Contents' in resp['ListBucketResult'].keys():
-                for y in resp['ListBucketResult']['Contents']:
-                    if y['Key'].endswith(filetype) and release in y['Key'] and name in y['Key']:
-                        temp.append(y['Key'])
-
-            for arch in arches:
-                temps = []
-                for y in temp:
-                    if arch in y:
-                        temps.append(y)
-                temps.sort(reverse=True)
-                if len(temps) > 0:
-                    data[arch] = temps[0]
+        if index is not None:
+            return index.latest_by_arch(prefix, release, arches, filetype, name, translators)
 
-            truncated = resp['ListBucketResult'].get('IsTruncated')
-
-            # break from loop if there are no more results
-            if truncated == 'false':
-                break
-
-            # If truncated was true, we must set the marker for the next request to the last key of the current response
-            # ListObjects does not return NextMarker unless using Delimiter.. which is annoying
-            next_key = resp['ListBucketResult']['Contents'][-1].get('Key')
-            logger.info(Color.INFO + 'requesting another page starting with key: %s', next_key)
-            marker = next_key
-
-        return data
+        try:
+            return BucketIndex.http_latest(
+                    s3_bucket_url,
+                    prefix,
+                    release,
+                    arches,
+                    filetype,
+                    name,
+                    logger,
+                    translators=translators,
+                    page_size=page_size
+            )
+        except (requests.exceptions.RequestException, ElementTree.ParseError) as exception:
+            logger.error('The s3 bucket http endpoint is inaccessible')
+            raise SystemExit(exception) from exception
 
     @staticmethod
-    def reqs_download_artifacts(force_download, s3_bucket_url, source, dest, logger):
+    def reqs_download_many(force_download, s3_bucket_url, transfers, logger, workers=8):
         """
-        Download the requested artifact(s) via requests only
+        Downloads every (source, dest) in transfers at the same time via
+        requests. Large artifacts are fetched in parallel ranges and resumed
+        if the connection drops. Returns {dest: bytes or exception}.
         """
-        if os.path.exists(dest):
-            if not force_download:
-                logger.warning(
-                        '[' + Color.BOLD + Color.YELLOW + 'WARN' + Color.END + '] ' +
-                        'Artifact at ' + dest + ' already exists'
-                )
-                return
-        unurl = s3_bucket_url + '/' + source
+        for source, dest in transfers:
+            logger.info('Downloading ({}) to: {}'.format(source, dest))
 
-        logger.info('Downloading ({}) to: {}'.format(source, dest))
-        try:
-            with requests.get(unurl, allow_redirects=True) as r:
-                with open(dest, 'wb') as f:
-                    f.write(r.content)
-                    f.close()
-                r.close()
-        except requests.exceptions.RequestException as e:
-            logger.error('There was a problem downloading the artifact')
-            raise SystemExit(e)
+        with DownloadManager(logger, workers=workers) as manager:
+            results = manager.fetch_many(
+                    [(s3_bucket_url + '/' + source, dest) for source, dest in transfers],
+                    force=force_download
+            )
+
+        for dest, result in results.items():
+            if isinstance(result, Exception):
+                logger.error(Color.FAIL + 'There was a problem downloading ' + dest + ': ' + str(result))
+        return results
 
     # ISO related
     @staticmethod
@@ -972,6 +1014,25 @@ class Shared:
 
         return repolist
 
+    @staticmethod
+    def mock_repo_list(repolist, compose_latest_sync, current_arch) -> list:
+        """
+        The repo list for a mock config. Repos the compose already has under
+        compose/<repo>/<arch>/os are read from there, with the remote url
+        kept as a fallback for anything missing locally.
+        """
+        result = []
+        for repo in repolist:
+            repo = dict(repo)
+            local = os.path.join(compose_latest_sync, repo['name'], current_arch, 'os')
+            local_url = 'file://' + local
+            if repo['url'] != local_url and os.path.exists(os.path.join(local, 'repodata', 'repomd.xml')):
+                repo['fallback'] = repo['url']
+                repo['url'] = local_url
+                repo['local'] = local
+            result.append(repo)
+        return result
+
     @staticmethod
     def parse_extra_repos(extra_repos: list) -> list:
         # must be in format URL[,PRIORITY]
@@ -1285,51 +1346,132 @@ class Idents:
     @staticmethod
     def scanning(p):
         """
-        Scan tree
+        Scan tree. Returns {relative path: absolute path} for every file, and
+        for every directory below p with a trailing slash. Like os.walk,
+        symlinks to directories are not followed or listed.
         """
         path = os.path.abspath(p)
+        base = len(path.rstrip("/")) + 1
         result = {}
-        for root, dirs, files in os.walk(path):
-            for file in files:
-                abspath = os.path.join(root, file)
-                relpath = kobo.shortcuts.relative_path(abspath, path.rstrip("/") + "/")
-                result[relpath] = abspath
-
+        stack = [path]
+        while stack:
+            root = stack.pop()
             # Include empty directories too
             if root != path:
-                abspath = os.path.join(root, "")
-                relpath = kobo.shortcuts.relative_path(abspath, path.rstrip("/") + "/")
-                result[relpath] = abspath
+                result[root[base:] + "/"] = root + "/"
+            try:
+                with os.scandir(root) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+                        if is_dir:
+                            if not entry.is_symlink():
+                                stack.append(entry.path)
+                            continue
+                        result[entry.path[base:]] = entry.path
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
 
         return result
 
     @staticmethod
     def merging(tree_a, tree_b, exclusive=False):
         """
-        Merge tree
+        Merge tree. Entries of tree_b win. With exclusive, nothing from
+        tree_a is kept that sits in or below a directory tree_b has
+        entries in.
         """
+        if not exclusive:
+            result = dict(tree_a)
+            result.update(tree_b)
+            return result
+
         result = tree_b.copy()
         all_dirs = set(
             [os.path.dirname(dirn).rstrip("/") for dirn in result if os.path.dirname(dirn) != ""]
         )
 
         for dirn in tree_a:
-            dn = os.path.dirname(dirn)
-            if exclusive:
-                match = False
-                for x in all_dirs:
-                    if dn == x or dn.startswith("%s/" % x):
-                        match = True
-                        break
-                if match:
-                    continue
-
             if dirn in result:
                 continue
-
-            result[dirn] = tree_a[dirn]
+            # Walk up the parents instead of comparing against every
+            # directory, which is a handful of set lookups per entry
+            dn = os.path.dirname(dirn)
+            match = False
+            while dn:
+                if dn in all_dirs:
+                    match = True
+                    break
+                dn = dn.rpartition("/")[0]
+            if not match:
+                result[dirn] = tree_a[dirn]
         return result
 
+    @staticmethod
+    def pattern_matcher(patterns):
+        """
+        Returns a function telling if a path matches any of the fnmatch
+        patterns. Plain paths are looked up in a set, the globs are all
+        compiled into one regex.
+        """
+        exact = set()
+        globs = []
+        for pattern in patterns:
+            if any(c in pattern for c in "*?["):
+                globs.append(fnmatch.translate(pattern))
+            else:
+                exact.add(pattern)
+
+        regex = re.compile("|".join(globs)) if globs else None
+
+        def matches(path):
+            if path in exact:
+                return True
+            return regex is not None and regex.match(path) is not None
+
+        return matches
+
+    @staticmethod
+    def graft_points(tree, exclude=None, update=None):
+        """
+        Turns a merged tree into xorriso graft lines, as (command, source,
+        destination). Directories are only grafted when nothing below them
+        is, files listed in exclude are left out and files in update use
+        -update instead of -map.
+        """
+        is_excluded = Idents.pattern_matcher(exclude or [])
+        is_updated = Idents.pattern_matcher(update or [])
+
+        # Directories that have something below them. Entries are visited
+        # in reverse order, so everything below a directory comes first.
+        # This has always matched on a plain string prefix of the names.
+        seen = set()
+        seen_sorted = []
+        result = []
+        for zl in sorted(tree, reverse=True):
+            dirn = os.path.dirname(zl)
+            if zl.endswith("/"):
+                i = bisect.bisect_left(seen_sorted, dirn)
+                if i == len(seen_sorted) or not seen_sorted[i].startswith(dirn):
+                    result.append(zl)
+            else:
+                result.append(zl)
+            if dirn not in seen:
+                seen.add(dirn)
+                bisect.insort(seen_sorted, dirn)
+
+        # We check first if a file needs to be updated first before relying
+        # on the boot.iso manifest to exclude a file
+        lines = []
+        for zm in sorted(result, key=Idents.sorting):
+            replace = is_updated(zm)
+            if is_excluded(zm):
+                continue
+            lines.append(("-update" if replace else "-map", tree[zm], zm))
+        return lines
+
     @staticmethod
     def sorting(k):
         """
@@ -1385,8 +1527,14 @@ class Idents:
     @staticmethod
     def get_vol_id(i):
         """
-        Gets a volume ID of a given ISO
+        Gets a volume ID of a given ISO. Only the primary volume descriptor
+        is read, the rest of the ISO is not touched.
         """
+        volume_id = IsoReader.volume_id(i)
+        if volume_id is not None:
+            return volume_id
+
+        # Not plain ISO9660, see what pycdlib makes of it
         iso = pycdlib.PyCdlib()
         try:
             iso.open(i)
@@ -0,0 +1,411 @@
+"""
+Records how long each container unit takes and reports on it afterwards.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from empanadas.common import Color
+
+class TimingDB:
+    """
+    A JSON-lines file under work/ with one record per finished unit. Each
+    invocation of a phase gets its own unique run id so partial re-runs can
+    be told apart from the original run.
+
+    Transfer sizes are only measured when measure is set. Walking a repo
+    tree of a few hundred thousand files is not free, so it is done on
+    worker threads, never in the supervisor's callback. Call close() after
+    the run so every pending size is written.
+    """
+    FILENAME = 'timing.jsonl'
+
+    def __init__(self, work_root, logger=None, measure=False, workers=4):
+        self.path = os.path.join(work_root, self.FILENAME)
+        self.log = logger
+        self.measure = measure
+        self.run = '%s.%s' % (time.strftime('%Y%m%d.%H%M%S', time.localtime()), uuid.uuid4().hex[:8])
+        self.lock = threading.Lock()
+        self.workers = workers
+        self.sizer = None
+        self.pending = []
+        os.makedirs(work_root, exist_ok=True)
+
+    def _append(self, entry):
+        try:
+            with self.lock, open(self.path, 'a') as f:
+                f.write(json.dumps(entry, sort_keys=True) + '\n')
+        except OSError as exc:
+            if self.log:
+                self.log.warning(Color.WARN + 'Could not record timing for ' + entry['unit'] + ': ' + str(exc))
+
+    def record(self, phase, result, size_before=None, size_after=None):
+        """
+        Appends a single ContainerResult to the database
+        """
+        transferred = None
+        if size_before is not None and size_after is not None:
+            transferred = max(0, size_after - size_before)
+
+        self._append({
+                'phase': phase,
+                'run': self.run,
+                'unit': result.name,
+                'group': result.group,
+                'start': round(result.start, 3),
+                'end': round(result.end, 3),
+                'duration': round(result.end - result.start, 3),
+                'exit': result.exit_code,
+                'bytes': transferred,
+                'size': size_after,
+                'skipped': False,
+        })
+
+    def record_skipped(self, phase, units):
+        """
+        Records units that were not run at all because nothing changed
+        """
+        now = round(time.time(), 3)
+        for unit in units:
+            self._append({
+                    'phase': phase,
+                    'run': self.run,
+                    'unit': unit.name,
+                    'group': unit.group,
+                    'start': now,
+                    'end': now,
+                    'duration': 0.0,
+                    'exit': 0,
+                    'bytes': 0,
+                    'size': None,
+                    'skipped': True,
+            })
+
+    def recorder(self, phase, targets=None, on_complete=None):
+        """
+        Returns an on_complete callback that records every result for the
+        phase. targets maps unit names to the directory they write into.
+        When measuring, the size of each is taken now and again when the
+        unit is done, which is what gets recorded as bytes transferred.
+        Results are passed along to on_complete afterwards.
+        """
+        targets = targets if self.measure else {}
+        targets = targets or {}
+        before = {}
+        if targets:
+            if self.sizer is None:
+                self.sizer = ThreadPoolExecutor(max_workers=self.workers)
+            names = list(targets)
+            sizes = self.sizer.map(self.dir_size, [targets[n] for n in names])
+            before = dict(zip(names, sizes))
+
+        def measured(result):
+            self.record(phase, result, before.get(result.name), self.dir_size(targets[result.name]))
+
+        def callback(result):
+            if result.name in targets:
+                self.pending.append(self.sizer.submit(measured, result))
+            else:
+                self.record(phase, result)
+            if on_complete:
+                on_complete(result)
+
+        return callback
+
+    def close(self):
+        """
+        Waits for every pending size and writes its record
+        """
+        if self.sizer is None:
+            return
+        wait(self.pending)
+        for future in self.pending:
+            if future.exception() and self.log:
+                self.log.warning(Color.WARN + 'Could not measure a transfer: ' + str(future.exception()))
+        self.pending = []
+        self.sizer.shutdown(wait=True)
+        self.sizer = None
+
+    @staticmethod
+    def dir_size(path) -> int:
+        """
+        Total size of every regular file under path. Symlinks are not
+        followed.
+        """
+        total = 0
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+        return total
+
+    @staticmethod
+    def read(path) -> list:
+        """
+        Reads every record from a timing database. Unreadable lines are
+        skipped.
+        """
+        records = []
+        if not os.path.exists(path):
+            return records
+
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    @staticmethod
+    def runs(records) -> list:
+        """
+        One (run, phase, units, start, end) entry per run, oldest first
+        """
+        runs = {}
+        for rec in records:
+            key = (rec.get('run', ''), rec.get('phase'))
+            entry = runs.setdefault(key, [0, rec.get('start', 0), rec.get('end', 0)])
+            entry[0] += 1
+            entry[1] = min(entry[1], rec.get('start', 0))
+            entry[2] = max(entry[2], rec.get('end', 0))
+        return sorted(
+                ((run, phase, n, start, end) for (run, phase), (n, start, end) in runs.items()),
+                key=lambda r: r[3]
+        )
+
+    @staticmethod
+    def select(records, runs=None) -> list:
+        """
+        The records a report looks at. With runs, only the records of those
+        run ids. Otherwise every run is merged, keeping the most recent
+        record of each unit of each phase, so a partial re-run of one phase
+        is laid over the full run before it rather than hiding it.
+        """
+        if runs:
+            return [rec for rec in records if rec.get('run') in runs]
+
+        latest = {}
+        for rec in records:
+            key = (rec.get('phase'), rec.get('unit'))
+            if key not in latest or rec.get('end', 0) >= latest[key].get('end', 0):
+                latest[key] = rec
+        return list(latest.values())
+
+    @staticmethod
+    def durations(path, phase) -> dict:
+        """
+        Duration of every successful unit of a phase, latest record wins
+        """
+        durations = {}
+        for rec in TimingDB.read(path):
+            if rec.get('phase') == phase and rec.get('exit') == 0 and not rec.get('skipped'):
+                durations[rec['unit']] = rec['duration']
+        return durations
+
+    @staticmethod
+    def last_exit(path, phase) -> dict:
+        """
+        Exit code of the most recent record of every unit of a phase. A
+        skipped unit counts as successful.
+        """
+        exits = {}
+        for rec in TimingDB.read(path):
+            if rec.get('phase') == phase:
+                exits[rec['unit']] = rec.get('exit')
+        return exits
+
+class TimingReport:
+    """
+    Summarizes a timing database: the critical path through the phases,
+    throughput per repo and what changed since a previous compose.
+    """
+    def __init__(self, records, previous=None, threshold=10.0, limit=20, runs=None):
+        latest = TimingDB.select(records, runs)
+        self.records = [r for r in latest if not r.get('skipped')]
+        self.skipped = [r for r in latest if r.get('skipped')]
+        self.previous = [r for r in TimingDB.select(previous or []) if not r.get('skipped')]
+        # Percent slower a unit has to be before it shows up as a regression
+        self.threshold = threshold
+        self.limit = limit
+
+    @staticmethod
+    def _phases(records) -> dict:
+        """
+        Records grouped by phase, phases in the order they started
+        """
+        phases = {}
+        for rec in sorted(records, key=lambda r: r['start']):
+            phases.setdefault(rec['phase'], []).append(rec)
+        return phases
+
+    @staticmethod
+    def _wall(recs) -> float:
+        """
+        Wall clock time of a set of records. Runs are counted separately,
+        so the gap between a run and a later partial re-run is left out.
+        """
+        runs = {}
+        for rec in recs:
+            runs.setdefault(rec.get('run'), []).append(rec)
+        return sum(
+                max(r['end'] for r in run) - min(r['start'] for r in run)
+                for run in runs.values()
+        )
+
+    @staticmethod
+    def _fmt(seconds) -> str:
+        seconds = int(round(seconds))
+        return '{}:{:02d}:{:02d}'.format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+    def critical_path(self) -> list:
+        """
+        Phases run one after another and units within a phase run side by
+        side, so the critical path is the unit that finished last in each
+        phase.
+        """
+        lines = ['Critical path:']
+        total = 0.0
+        for phase, recs in self._phases(self.records).items():
+            wall = self._wall(recs)
+            total += wall
+            last = max(recs, key=lambda r: r['end'])
+            busy = sum(r['duration'] for r in recs)
+            lines.append(
+                    '  {:<16} wall {}  units {:>4}  avg parallel {:>5.1f}  '
+                    'last {} ({})'.format(
+                        phase,
+                        self._fmt(wall),
+                        len(recs),
+                        busy / wall if wall else 0.0,
+                        last['unit'],
+                        self._fmt(last['duration'])
+                    )
+            )
+        lines.append('  {:<16} wall {}'.format('total', self._fmt(total)))
+        return lines
+
+    def throughput(self) -> list:
+        """
+        MB/s per repo, from the bytes each unit added to its target
+        """
+        lines = ['Throughput:']
+        groups = {}
+        for rec in self.records:
+            if rec.get('bytes') is None:
+                continue
+            groups.setdefault((rec['phase'], rec['group']), []).append(rec)
+
+        if not groups:
+            lines.append('  no transfer sizes were recorded (sync with --measure-transfers)')
+            return lines
+
+        for (phase, group), recs in sorted(groups.items()):
+            transferred = sum(r['bytes'] for r in recs)
+            wall = self._wall(recs)
+            rate = transferred / wall / 1048576 if wall else 0.0
+            lines.append(
+                    '  {:<16} {:<24} {:>10.1f} MB in {}  {:>8.2f} MB/s'.format(
+                        phase,
+                        group,
+                        transferred / 1048576,
+                        self._fmt(wall),
+                        rate
+                    )
+            )
+        return lines
+
+    def regressions(self) -> list:
+        """
+        Phase and unit timings compared against the previous compose
+        """
+        lines = ['Compared to previous compose:']
+        if not self.previous:
+            lines.append('  no previous timing data')
+            return lines
+
+        current_phases = self._phases(self.records)
+        previous_phases = self._phases(self.previous)
+        for phase, recs in current_phases.items():
+            if phase not in previous_phases:
+                continue
+            now = self._wall(recs)
+            before = self._wall(previous_phases[phase])
+            lines.append(
+                    '  {:<16} {} -> {}  ({:+.1f}%)'.format(
+                        phase,
+                        self._fmt(before),
+                        self._fmt(now),
+                        (now - before) / before * 100 if before else 0.0
+                    )
+            )
+
+        old = {(r['phase'], r['unit']): r['duration'] for r in self.previous if r.get('exit') == 0}
+        slower = []
+        for rec in self.records:
+            key = (rec['phase'], rec['unit'])
+            if rec.get('exit') != 0 or key not in old or not old[key]:
+                continue
+            change = (rec['duration'] - old[key]) / old[key] * 100
+            if change >= self.threshold:
+                slower.append((rec['duration'] - old[key], change, rec, old[key]))
+
+        if not slower:
+            lines.append('  no units got more than {:.0f}% slower'.format(self.threshold))
+            return lines
+
+        lines.append('  slower units:')
+        for delta, change, rec, before in sorted(slower, key=lambda s: s[0], reverse=True)[:self.limit]:
+            lines.append(
+                    '    {:<16} {:<32} {} -> {}  ({:+.1f}%)'.format(
+                        rec['phase'],
+                        rec['unit'],
+                        self._fmt(before),
+                        self._fmt(rec['duration']),
+                        change
+                    )
+            )
+        return lines
+
+    def unchanged(self) -> list:
+        """
+        Units that were skipped because their metadata had not changed
+        """
+        lines = ['Skipped (unchanged):']
+        if not self.skipped:
+            lines.append('  none')
+            return lines
+
+        phases = {}
+        for rec in self.skipped:
+            phases.setdefault(rec['phase'], []).append(rec['unit'])
+        for phase, units in phases.items():
+            lines.append('  {:<16} {:>4} units: {}'.format(phase, len(units), ', '.join(sorted(units))))
+        return lines
+
+    def render(self) -> str:
+        """
+        The whole report as text
+        """
+        if not self.records and not self.skipped:
+            return 'No timing data was recorded for this compose.'
+
+        sections = [self.unchanged()]
+        if self.records:
+            sections = [self.critical_path(), self.throughput(), self.regressions(), self.unchanged()]
+        return '\n\n'.join('\n'.join(s) for s in sections)
@@ -0,0 +1,197 @@
+"""
+Unpacks compressed tarballs in one streaming pass.
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import time
+
+from empanadas.common import Color
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Tried in order, the first one installed wins
+DECOMPRESSORS = {
+        '.gz': (['pigz', '-dc'], ['gzip', '-dc']),
+        '.tgz': (['pigz', '-dc'], ['gzip', '-dc']),
+        '.zst': (['zstd', '-dc', '-T0', '-q'],),
+        '.xz': (['xz', '-dc', '-T0'],),
+        '.bz2': (['lbzip2', '-dc'], ['pbzip2', '-dc'], ['bzip2', '-dc']),
+}
+
+# Leading bytes of each compressed format
+MAGIC = {
+        '.gz': b'\x1f\x8b',
+        '.tgz': b'\x1f\x8b',
+        '.zst': b'\x28\xb5\x2f\xfd',
+        '.xz': b'\xfd7zXZ\x00',
+        '.bz2': b'BZh',
+}
+
+class Unpacker:
+    """
+    Extracts tarballs as a stream: decompression happens in a parallel
+    external tool (pigz, zstd -T0, xz -T0) when one is installed, in a
+    separate process from the tar parsing, and falls back to Python's own
+    readers otherwise. Members are checked by the tar extraction filter as
+    they come past, so the archive is read exactly once.
+    """
+    # Extraction filters came with 3.12 and were backported to 3.9.17,
+    # 3.10.12 and 3.11.4
+    FILTERS = hasattr(tarfile, 'tar_filter')
+
+    def __init__(self, logger, external=True):
+        self.log = logger
+        self.external = external
+
+    @staticmethod
+    def suffix(path) -> str:
+        for suffix in DECOMPRESSORS:
+            if path.endswith(suffix):
+                return suffix
+        return ''
+
+    @staticmethod
+    def check_magic(path) -> bool:
+        """
+        Whether a pulled tarball is not empty and starts like its suffix says
+        it should. This only catches empty or mislabeled artifacts, a
+        truncated one is found by the decompressor while unpacking.
+        """
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(8)
+        except OSError:
+            return False
+        if not head:
+            return False
+        magic = MAGIC.get(Unpacker.suffix(path))
+        return magic is None or head.startswith(magic)
+
+    def _command(self, path):
+        """
+        The external decompressor for path, or None
+        """
+        if not self.external:
+            return None
+        for command in DECOMPRESSORS.get(self.suffix(path), ()):
+            if shutil.which(command[0]):
+                return command
+        return None
+
+    @staticmethod
+    def _python_reader(path):
+        suffix = Unpacker.suffix(path)
+        if suffix in ('.gz', '.tgz'):
+            return gzip.open(path, 'rb')
+        if suffix == '.xz':
+            return lzma.open(path, 'rb')
+        if suffix == '.bz2':
+            return bz2.open(path, 'rb')
+        if suffix == '.zst':
+            if zstandard is None:
+                raise SystemExit(Color.FAIL + 'zstd or python zstandard is required to unpack ' + path)
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return open(path, 'rb')
+
+    @staticmethod
+    def _tar_filter(member, dest):
+        """
+        tarfile.tar_filter where Python has it. Otherwise the same checks by
+        hand: leading slashes are stripped, nothing may land or link outside
+        dest, and setuid, setgid, sticky and group/other write bits go.
+        """
+        if Unpacker.FILTERS:
+            return tarfile.tar_filter(member, dest)
+
+        dest = os.path.realpath(dest)
+
+        def inside(path):
+            return os.path.commonpath([dest, os.path.realpath(path)]) == dest
+
+        member.name = member.name.lstrip('/')
+        if not inside(os.path.join(dest, member.name)):
+            raise tarfile.TarError(member.name + ' would be extracted outside ' + dest)
+        if member.issym():
+            link = os.path.join(dest, os.path.dirname(member.name), member.linkname)
+            if os.path.isabs(member.linkname) or not inside(link):
+                raise tarfile.TarError(member.name + ' links outside ' + dest)
+        if member.islnk():
+            member.linkname = member.linkname.lstrip('/')
+            if not inside(os.path.join(dest, member.linkname)):
+                raise tarfile.TarError(member.name + ' links outside ' + dest)
+        if member.mode is not None:
+            member.mode &= 0o755
+        return member
+
+    @staticmethod
+    def _replacing_filter(member, dest):
+        """
+        The tar extraction filter, plus removing whatever file is already at
+        the member's path. tarfile opens existing files for writing, which
+        would write through a link into another tree.
+        """
+        member = Unpacker._tar_filter(member, dest)
+        if member.isreg():
+            target = os.path.join(dest, member.name)
+            if os.path.lexists(target) and not os.path.isdir(target):
+                os.remove(target)
+        return member
+
+    def extract(self, tarball, dest, numeric_owner=False):
+        """
+        Extracts tarball into dest
+        """
+        started = time.monotonic()
+        command = self._command(tarball)
+        proc = None
+        if command:
+            # pylint: disable=consider-using-with
+            errors = tempfile.TemporaryFile()
+            proc = subprocess.Popen(
+                    command + [tarball],
+                    stdout=subprocess.PIPE,
+                    stderr=errors
+            )
+            stream = proc.stdout
+        else:
+            stream = self._python_reader(tarball)
+
+        try:
+            with tarfile.open(fileobj=stream, mode='r|') as tar:
+                if self.FILTERS:
+                    tar.extractall(path=dest, numeric_owner=numeric_owner, filter=self._replacing_filter)
+                else:
+                    for member in tar:
+                        tar.extract(self._replacing_filter(member, dest), path=dest, numeric_owner=numeric_owner)
+        except BaseException:
+            if proc:
+                proc.kill()
+            raise
+        finally:
+            stream.close()
+            if proc:
+                proc.wait()
+
+        if proc:
+            errors.seek(0)
+            message = errors.read().decode(errors='replace').strip()
+            errors.close()
+            if proc.returncode != 0:
+                raise tarfile.ReadError(f'{command[0]} failed on {tarball}: {message}')
+
+        self.log.info(
+                Color.INFO + 'Unpacked %s in %.1fs%s',
+                tarball,
+                time.monotonic() - started,
+                ' (' + command[0] + ')' if command else ''
+        )
@@ -0,0 +1,148 @@
+import bisect
+import http.server
+import io
+import logging
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from empanadas.util import Shared
+from empanadas.util.bucket_index import BucketIndex
+
+NS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+
+class ListingHandler(http.server.BaseHTTPRequestHandler):
+    """
+    A ListObjects (v1) endpoint over server.keys, paged by marker
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        prefix = query.get('prefix', [''])[0]
+        marker = query.get('marker', [''])[0]
+        max_keys = int(query.get('max-keys', ['1000'])[0])
+
+        keys = self.server.keys
+        start = bisect.bisect_right(keys, marker) if marker else bisect.bisect_left(keys, prefix)
+        page = []
+        for key in keys[start:]:
+            if not key.startswith(prefix):
+                break
+            page.append(key)
+            if len(page) > max_keys:
+                break
+        truncated = len(page) > max_keys
+        page = page[:max_keys]
+        self.server.pages += 1
+
+        body = ''.join(
+                '<Contents><Key>%s</Key><LastModified>2024-11-20T00:00:00.000Z</LastModified>'
+                '<Size>1</Size><StorageClass>STANDARD</StorageClass></Contents>' % key
+                for key in page
+        )
+        data = (
+                '<?xml version="1.0" encoding="UTF-8"?><ListBucketResult xmlns="%s">'
+                '<Name>resf-empanadas</Name><Prefix>%s</Prefix><Marker>%s</Marker>'
+                '<MaxKeys>%s</MaxKeys><IsTruncated>%s</IsTruncated>%s</ListBucketResult>'
+        ) % (NS, prefix, marker, max_keys, 'true' if truncated else 'false', body)
+        data = data.encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _synthetic_keys(count):
+    """
+    count image keys spread over two arches and a few image names, one
+    build timestamp each
+    """
+    keys = []
+    names = ['GenericCloud-Base', 'GenericCloud-LVM', 'EC2-Base', 'Container-Minimal']
+    for i in range(count):
+        arch = 'x86_64' if i % 2 == 0 else 'aarch64'
+        name = names[(i // 2) % len(names)]
+        stamp = 1700000000 + i
+        build = f'Rocky-9-{name}-9.5-{stamp}.0.{arch}'
+        keys.append(f'buildimage-9.5-{arch}/{build}/{stamp}/{build}.qcow2')
+    return sorted(keys)
+
+
+@pytest.fixture
+def listing():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ListingHandler)
+    httpd.keys = []
+    httpd.pages = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_parse_listing_streams_keys():
+    data = (
+            '<ListBucketResult xmlns="%s"><IsTruncated>true</IsTruncated>'
+            '<Contents><Key>a</Key></Contents><Contents><Key>b</Key></Contents>'
+            '</ListBucketResult>' % NS
+    ).encode()
+    seen = []
+    truncated, last = BucketIndex.parse_listing(io.BytesIO(data), seen.append)
+    assert seen == ['a', 'b']
+    assert truncated is True
+    assert last == 'b'
+
+
+def test_reqs_determine_latest_100k_keys(listing):
+    httpd, url = listing
+    httpd.keys = _synthetic_keys(100000)
+
+    started = time.monotonic()
+    data = Shared.reqs_determine_latest(
+            url,
+            '9.5',
+            ['x86_64', 'aarch64', 's390x'],
+            'qcow2',
+            'GenericCloud-LVM',
+            logging.getLogger()
+    )
+    elapsed = time.monotonic() - started
+
+    expected = {}
+    for key in httpd.keys:
+        arch = key.split('/')[0].rsplit('-', 1)[1]
+        if 'GenericCloud-LVM' in key:
+            expected[arch] = max(expected.get(arch, ''), key)
+
+    assert data == expected
+    # 50k keys per arch at 1000 a page, s390x has none
+    assert httpd.pages == 101
+    print('\n100k key listing: %.2fs, %s pages' % (elapsed, httpd.pages))
+    # Generous, only here to catch a return to quadratic behaviour
+    assert elapsed < 60
+
+
+def test_index_answers_every_name_from_one_listing(listing, tmp_path):
+    httpd, url = listing
+    httpd.keys = _synthetic_keys(20000)
+    prefixes = [BucketIndex.prefix_for('buildimage', '9.5', arch) for arch in ('x86_64', 'aarch64')]
+
+    index = Shared.bucket_index(False, url, prefixes, logging.getLogger(), cache_dir=str(tmp_path))
+    pages = httpd.pages
+    for name in ('GenericCloud-Base', 'EC2-Base', 'Container-Minimal'):
+        latest = index.latest_by_arch('buildimage', '9.5', ['x86_64', 'aarch64'], 'qcow2', name)
+        assert set(latest) == {'x86_64', 'aarch64'}
+        assert all(name in key for key in latest.values())
+    assert httpd.pages == pages
+
+    # A second pull inside the ttl is served from the cache
+    again = Shared.bucket_index(False, url, prefixes, logging.getLogger(), cache_dir=str(tmp_path))
+    assert httpd.pages == pages
+    assert again.keys == index.keys
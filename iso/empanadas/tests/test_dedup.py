@@ -0,0 +1,63 @@
+import logging
+import os
+
+from empanadas.util.dedup import Dedup
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def test_identical_rpms_are_linked(tmp_path):
+    root = str(tmp_path)
+    pkg = os.urandom(20000)
+    a = _write(os.path.join(root, 'BaseOS/x86_64/os/Packages/b/bash.rpm'), pkg)
+    b = _write(os.path.join(root, 'BaseOS/x86_64/kickstart/Packages/b/bash.rpm'), pkg)
+    c = _write(os.path.join(root, 'AppStream/x86_64/os/Packages/b/bash.rpm'), pkg)
+    # Same size, different content
+    other = _write(os.path.join(root, 'AppStream/x86_64/os/Packages/z/zsh.rpm'), os.urandom(20000))
+    # Not an rpm
+    log = _write(os.path.join(root, 'logs/bash.rpm.log'), pkg)
+
+    stats = Dedup(logging.getLogger()).run([root])
+
+    assert stats['linked'] == 2
+    assert stats['saved'] == 40000
+    inode = os.stat(a).st_ino
+    assert os.stat(b).st_ino == inode and os.stat(c).st_ino == inode
+    assert os.stat(other).st_ino != inode
+    assert os.stat(log).st_ino != inode
+    assert not [n for n in os.listdir(os.path.dirname(b)) if n.endswith('.dedup')]
+
+
+def test_linked_files_are_not_hashed_again(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    pkg = os.urandom(5000)
+    a = _write(os.path.join(root, 'os/Packages/a.rpm'), pkg)
+    os.makedirs(os.path.join(root, 'kickstart'))
+    os.link(a, os.path.join(root, 'kickstart/a.rpm'))
+
+    hashed = []
+    original = Dedup._sha256
+    monkeypatch.setattr(Dedup, '_sha256', staticmethod(lambda p: hashed.append(p) or original(p)))
+
+    stats = Dedup(logging.getLogger()).run([root])
+    assert stats['linked'] == 0
+    assert hashed == []
+
+
+def test_reflink_falls_back_to_hardlink(tmp_path):
+    root = str(tmp_path)
+    pkg = os.urandom(5000)
+    a = _write(os.path.join(root, 'one/a.rpm'), pkg)
+    b = _write(os.path.join(root, 'two/a.rpm'), pkg)
+
+    # Cloned where the filesystem can, hardlinked where it cannot
+    assert Dedup(logging.getLogger(), mode='reflink').run([root])['linked'] == 1
+    with open(b, 'rb') as f:
+        assert f.read() == pkg
+    with open(a, 'rb') as f:
+        assert f.read() == pkg
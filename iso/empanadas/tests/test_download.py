@@ -0,0 +1,174 @@
+import http.server
+import logging
+import os
+import threading
+
+import pytest
+
+from empanadas.util.download import DownloadManager
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves server.files with Range/If-Range support. server.drop_after
+    makes the next response stop after that many bytes.
+    """
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body_only):
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+
+        etag = '"%s"' % self.server.etags[self.path]
+        start, end = 0, len(data) - 1
+        header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        partial = header is not None and (if_range is None or if_range == etag)
+        if partial:
+            first, last = header.split('=', 1)[1].split('-')
+            start = int(first)
+            end = int(last) if last else len(data) - 1
+            self.server.ranges.append((start, end))
+
+        self.send_response(206 if partial else 200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        if partial:
+            self.send_header('Content-Range', 'bytes %s-%s/%s' % (start, end, len(data)))
+        self.end_headers()
+        if body_only:
+            return
+
+        body = data[start:end + 1]
+        if self.server.drop_after is not None:
+            body = body[:self.server.drop_after]
+            self.server.drop_after = None
+            self.wfile.write(body)
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._send(True)
+
+    def do_GET(self):
+        self._send(False)
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    httpd.files = {}
+    httpd.etags = {}
+    httpd.ranges = []
+    httpd.drop_after = None
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _publish(httpd, path, data, etag='1'):
+    httpd.files[path] = data
+    httpd.etags[path] = etag
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_fetch_streams_small_file(server, tmp_path):
+    httpd, url = server
+    data = os.urandom(100000)
+    _publish(httpd, '/small.tar.gz', data)
+    dest = str(tmp_path / 'small.tar.gz')
+
+    with DownloadManager(logging.getLogger(), workers=4) as manager:
+        assert manager.fetch(url + '/small.tar.gz', dest) == len(data)
+
+    assert _read(dest) == data
+    assert httpd.ranges == []
+    assert not os.path.exists(dest + '.part')
+    assert not os.path.exists(dest + '.part.json')
+
+
+def test_fetch_splits_large_file_into_ranges(server, tmp_path):
+    httpd, url = server
+    data = os.urandom(1000000)
+    _publish(httpd, '/big.qcow2', data)
+    dest = str(tmp_path / 'big.qcow2')
+
+    with DownloadManager(logging.getLogger(), workers=4, part_size=65536) as manager:
+        manager.fetch(url + '/big.qcow2', dest)
+
+    assert _read(dest) == data
+    assert len(httpd.ranges) == 16
+    assert sorted(s for s, _ in httpd.ranges) == list(range(0, 1000000, 65536))
+
+
+def test_fetch_resumes_dropped_connection(server, tmp_path):
+    httpd, url = server
+    data = os.urandom(200000)
+    _publish(httpd, '/drop.tar.gz', data)
+    httpd.drop_after = 50000
+    dest = str(tmp_path / 'drop.tar.gz')
+
+    with DownloadManager(logging.getLogger(), workers=2, retries=2, chunk_size=8192) as manager:
+        manager.fetch(url + '/drop.tar.gz', dest)
+
+    assert _read(dest) == data
+    # Whatever arrived before the drop is kept, give or take a chunk
+    assert httpd.ranges and 40000 < httpd.ranges[0][0] <= 50000
+
+
+def test_fetch_resumes_earlier_partial_unless_changed(server, tmp_path):
+    httpd, url = server
+    data = os.urandom(200000)
+    _publish(httpd, '/img.raw', data)
+    dest = str(tmp_path / 'img.raw')
+
+    with DownloadManager(logging.getLogger(), workers=2, retries=0, chunk_size=8192) as manager:
+        httpd.drop_after = 80000
+        with pytest.raises(Exception):
+            manager.fetch(url + '/img.raw', dest)
+        kept = os.path.getsize(dest + '.part')
+        assert 70000 < kept <= 80000
+
+        assert manager.fetch(url + '/img.raw', dest) == 200000 - kept
+        assert _read(dest) == data
+
+        # A new object behind the same name is fetched in full
+        new = os.urandom(200000)
+        _publish(httpd, '/img.raw', new, etag='2')
+        httpd.drop_after = 80000
+        with pytest.raises(Exception):
+            manager.fetch(url + '/img.raw', dest, force=True)
+        _publish(httpd, '/img.raw', os.urandom(200000), etag='3')
+        newest = httpd.files['/img.raw']
+        manager.fetch(url + '/img.raw', dest, force=True)
+
+    assert _read(dest) == newest
+
+
+def test_fetch_many_skips_existing(server, tmp_path):
+    httpd, url = server
+    for name in ('a', 'b', 'c'):
+        _publish(httpd, '/' + name, name.encode() * 1000)
+    existing = tmp_path / 'a'
+    existing.write_bytes(b'old')
+
+    with DownloadManager(logging.getLogger(), workers=4) as manager:
+        results = manager.fetch_many(
+                [(url + '/' + name, str(tmp_path / name)) for name in ('a', 'b', 'c', 'missing')]
+        )
+
+    assert results[str(tmp_path / 'a')] == 0
+    assert existing.read_bytes() == b'old'
+    assert _read(str(tmp_path / 'c')) == b'c' * 1000
+    assert isinstance(results[str(tmp_path / 'missing')], Exception)
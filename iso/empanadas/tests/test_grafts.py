@@ -0,0 +1,185 @@
+import logging
+import os
+import time
+from fnmatch import fnmatch
+
+import kobo.shortcuts
+
+from empanadas.util import ArchCheck, GraftManifest, Idents
+
+
+def _legacy_scanning(p):
+    path = os.path.abspath(p)
+    result = {}
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            abspath = os.path.join(root, file)
+            relpath = kobo.shortcuts.relative_path(abspath, path.rstrip("/") + "/")
+            result[relpath] = abspath
+        if root != path:
+            abspath = os.path.join(root, "")
+            relpath = kobo.shortcuts.relative_path(abspath, path.rstrip("/") + "/")
+            result[relpath] = abspath
+    return result
+
+
+def _legacy_merging(tree_a, tree_b, exclusive=False):
+    result = tree_b.copy()
+    all_dirs = set(
+        [os.path.dirname(dirn).rstrip("/") for dirn in result if os.path.dirname(dirn) != ""]
+    )
+    for dirn in tree_a:
+        dn = os.path.dirname(dirn)
+        if exclusive:
+            match = False
+            for x in all_dirs:
+                if dn == x or dn.startswith("%s/" % x):
+                    match = True
+                    break
+            if match:
+                continue
+        if dirn in result:
+            continue
+        result[dirn] = tree_a[dirn]
+    return result
+
+
+def _legacy_graft_points(u, exclude, update):
+    seen = set()
+    result = {}
+    for zl in sorted(u, reverse=True):
+        dirn = os.path.dirname(zl)
+        if not zl.endswith("/"):
+            result[zl] = u[zl]
+            seen.add(dirn)
+            continue
+        found = False
+        for j in seen:
+            if j.startswith(dirn):
+                found = True
+                break
+        if not found:
+            result[zl] = u[zl]
+        seen.add(dirn)
+
+    lines = []
+    for zm in sorted(result, key=Idents.sorting):
+        replace = any(fnmatch(zm, upda) for upda in update)
+        if any(fnmatch(zm, excl) for excl in exclude):
+            continue
+        lines.append(("-update" if replace else "-map", u[zm], zm))
+    return lines
+
+
+def _touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w'):
+        pass
+
+
+def _synthetic_compose(root, packages):
+    """
+    A lorax tree plus BaseOS and AppStream Packages/ trees with packages
+    rpms spread over the usual first-letter directories
+    """
+    lorax = os.path.join(root, 'lorax')
+    boot = [
+            '.treeinfo', '.discinfo', 'images/boot.iso', 'images/efiboot.img',
+            'images/install.img', 'images/pxeboot/vmlinuz', 'images/pxeboot/initrd.img',
+            'isolinux/isolinux.cfg', 'isolinux/isolinux.bin', 'EFI/BOOT/grub.cfg',
+            'EFI/BOOT/BOOTX64.EFI', 'EFI/BOOT/fonts/unicode.pf2',
+    ]
+    for name in boot:
+        _touch(os.path.join(lorax, name))
+    os.makedirs(os.path.join(lorax, 'images/empty'))
+    os.makedirs(os.path.join(lorax, 'image'))
+
+    letters = 'abcdefghijklmnopqrstuvwxyz0123456789'
+    for i in range(packages):
+        repo = 'BaseOS' if i % 3 == 0 else 'AppStream'
+        name = letters[i % len(letters)] + 'pkg%05d-1.0-1.el9.x86_64.rpm' % i
+        _touch(os.path.join(root, repo, 'Packages', name[0], name))
+    for repo in ('BaseOS', 'AppStream'):
+        _touch(os.path.join(root, repo, 'repodata', 'repomd.xml'))
+
+    manifest = [name for name in boot if name not in ('.treeinfo', '.discinfo')]
+    update = set(ArchCheck.boot_configs + ArchCheck.boot_images + ['.discinfo', 'EFI/BOOT/*.EFI'])
+    exclude = set(m for m in manifest if not any(fnmatch(m, u) for u in update)) | {'images/pxeboot/*'}
+    return lorax, exclude, update
+
+
+def _grafts(root, lorax, scanning, merging):
+    files = {}
+    for p in (lorax,):
+        files = merging(files, scanning(p))
+    for repo in ('BaseOS', 'AppStream'):
+        for k, v in scanning(os.path.join(root, repo, 'Packages')).items():
+            files[os.path.join(repo, 'Packages', k)] = v
+        for k, v in scanning(os.path.join(root, repo, 'repodata')).items():
+            files[os.path.join(repo, 'repodata', k)] = v
+    return files
+
+
+def test_matches_legacy_grafts(tmp_path):
+    lorax, exclude, update = _synthetic_compose(str(tmp_path), 2000)
+
+    assert Idents.scanning(lorax) == _legacy_scanning(lorax)
+    files = _grafts(str(tmp_path), lorax, Idents.scanning, Idents.merging)
+    assert files == _grafts(str(tmp_path), lorax, _legacy_scanning, _legacy_merging)
+
+    lines = Idents.graft_points(files, exclude=exclude, update=update)
+    assert lines == _legacy_graft_points(files, exclude, update)
+    assert ('-update', os.path.join(lorax, 'EFI/BOOT/BOOTX64.EFI'), 'EFI/BOOT/BOOTX64.EFI') in lines
+    assert not any(dest.startswith('images/pxeboot/') for _, _, dest in lines)
+
+
+def test_exclusive_merge_matches_legacy(tmp_path):
+    lorax, _, _ = _synthetic_compose(str(tmp_path), 500)
+    tree_a = Idents.scanning(str(tmp_path))
+    tree_b = {k: v for k, v in tree_a.items() if k.startswith('BaseOS/Packages/b') or k.startswith('lorax/EFI')}
+    assert Idents.merging(tree_a, tree_b, exclusive=True) == _legacy_merging(tree_a, tree_b, exclusive=True)
+
+
+def test_grafts_50k_files(tmp_path):
+    lorax, exclude, update = _synthetic_compose(str(tmp_path), 50000)
+    # A boot.iso manifest lists a few hundred files
+    exclude = exclude | {'images/extra/file%03d' % i for i in range(300)}
+
+    started = time.monotonic()
+    files = _grafts(str(tmp_path), lorax, Idents.scanning, Idents.merging)
+    scanned = time.monotonic()
+    lines = Idents.graft_points(files, exclude=exclude, update=update)
+    elapsed = time.monotonic() - started
+
+    assert sum(1 for _, _, dest in lines if dest.endswith('.rpm')) == 50000
+    print('\n50k file grafts: scan %.2fs, grafts %.2fs' % (scanned - started, elapsed - (scanned - started)))
+    # Generous, only here to catch a return to files x patterns behaviour
+    assert elapsed < 30
+
+
+def test_manifest_only_reads_changed_directories(tmp_path):
+    lorax, _, _ = _synthetic_compose(str(tmp_path / 'compose'), 1000)
+    packages = str(tmp_path / 'compose' / 'AppStream' / 'Packages')
+    path = str(tmp_path / 'dvd-x86_64-grafts.json')
+
+    first = GraftManifest(path, logging.getLogger())
+    assert first.scan(packages) == Idents.scanning(packages)
+    assert first.scan(lorax) == Idents.scanning(lorax)
+    first.save()
+
+    # A respin with one new package
+    _touch(os.path.join(packages, 'z', 'zpkg99999-1.0-1.el9.x86_64.rpm'))
+
+    second = GraftManifest(path, logging.getLogger())
+    assert second.scan(packages) == Idents.scanning(packages)
+    # Only Packages/z/ is read again
+    assert second.stats['scanned'] == 1
+    assert second.changes()['added'] == 1
+    assert second.changes()['removed'] == 0
+
+    # Another variant in the same run shares the scan outright
+    shared = {}
+    GraftManifest(path, logging.getLogger(), shared=shared).scan(packages)
+    third = GraftManifest(str(tmp_path / 'minimal-x86_64-grafts.json'), logging.getLogger(), shared=shared)
+    assert third.scan(packages) == Idents.scanning(packages)
+    assert third.stats == {'reused': 0, 'scanned': 0}
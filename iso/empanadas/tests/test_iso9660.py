@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+pycdlib = pytest.importorskip('pycdlib')
+
+from empanadas.util import Idents
+from empanadas.util.iso9660 import IsoReader
+
+
+@pytest.fixture
+def iso(tmp_path):
+    """
+    A small Rock Ridge ISO with long names, a file without an extension and
+    a deep directory chain
+    """
+    image = pycdlib.PyCdlib()
+    image.new(interchange_level=3, rock_ridge='1.09', vol_ident='Rocky-9-5-x86_64-dvd')
+    image.add_directory('/EFI', rr_name='EFI')
+    image.add_directory('/EFI/BOOT', rr_name='BOOT')
+    image.add_fp(io.BytesIO(b'grub'), 4, '/EFI/BOOT/GRUB.CFG;1', rr_name='grub.cfg')
+    image.add_fp(io.BytesIO(b'x' * 5000), 5000, '/README.;1', rr_name='README')
+    image.add_directory('/BASEOS', rr_name='BaseOS')
+    image.add_directory('/BASEOS/PACKAGES', rr_name='Packages')
+    for i in range(200):
+        # One name long enough to need a continuation area
+        name = 'package-name-%05d-1.0-1.el9.x86_64.rpm' % i + ('x' * 200 if i == 7 else '')
+        image.add_fp(io.BytesIO(b'r'), 1, '/BASEOS/PACKAGES/P%05d.RPM;1' % i, rr_name=name)
+    deep = ''
+    for i in range(10):
+        deep += '/D%d' % i
+        image.add_directory(deep, rr_name='deep%d' % i)
+    image.add_fp(io.BytesIO(b'leaf'), 4, deep + '/F.;1', rr_name='leaf')
+
+    path = str(tmp_path / 'dvd.iso')
+    image.write(path)
+    image.close()
+    return path
+
+
+def test_volume_id(iso, tmp_path):
+    assert IsoReader.volume_id(iso) == 'Rocky-9-5-x86_64-dvd'
+    assert Idents.get_vol_id(iso) == 'Rocky-9-5-x86_64-dvd'
+
+    other = tmp_path / 'not.iso'
+    other.write_bytes(b'\0' * 40000)
+    assert IsoReader.volume_id(str(other)) is None
+
+
+def test_manifest_matches_pycdlib(iso, tmp_path):
+    image = pycdlib.PyCdlib()
+    image.open(iso)
+    expected = set()
+    for root, dirs, files in image.walk(rr_path='/'):
+        for name in dirs + files:
+            expected.add((root.rstrip('/') + '/' + name).lstrip('/'))
+    image.close()
+
+    manifest = IsoReader.manifest(iso)
+    assert set(manifest) == expected
+    assert manifest == sorted(manifest)
+    assert 'deep0/deep1/deep2/deep3/deep4/deep5/deep6/deep7/deep8/deep9/leaf' in manifest
+    assert ('README', False, 5000) in list(IsoReader.walk(iso))
+
+    dest = tmp_path / 'dvd.iso.manifest'
+    IsoReader.write_manifest(iso, str(dest))
+    assert dest.read_text().splitlines() == manifest
@@ -0,0 +1,58 @@
+import os
+
+from jinja2 import Environment, FileSystemLoader
+
+from empanadas.common import _rootdir
+from empanadas.util import Shared
+
+
+def _repos(compose):
+    return Shared.build_repo_list(
+            'https://dl.rockylinux.org/pub',
+            ['BaseOS', 'AppStream'],
+            'abc',
+            'x86_64',
+            compose,
+            extra_repos=['https://example.com/extra,50']
+    )
+
+
+def test_local_compose_repos_preferred(tmp_path):
+    compose = str(tmp_path / 'compose')
+    repodata = os.path.join(compose, 'BaseOS', 'x86_64', 'os', 'repodata')
+    os.makedirs(repodata)
+    open(os.path.join(repodata, 'repomd.xml'), 'w').close()
+
+    repos = _repos(compose)
+    mock_repos = {repo['name']: repo for repo in Shared.mock_repo_list(repos, compose, 'x86_64')}
+
+    # Only BaseOS has been synced
+    assert mock_repos['BaseOS']['url'] == 'file://' + os.path.join(compose, 'BaseOS', 'x86_64', 'os')
+    assert mock_repos['BaseOS']['fallback'] == repos[0]['url']
+    assert mock_repos['AppStream'] == repos[1]
+    assert mock_repos['extra_repo_0'] == repos[2]
+    # The list given is left alone
+    assert repos[0]['url'].startswith('https://')
+
+    output = Environment(loader=FileSystemLoader(f'{_rootdir}/templates')).get_template('isomock.tmpl.cfg').render(
+            arch='x86_64',
+            shortname='Rocky',
+            releasever='9.5',
+            required_pkgs=[],
+            repos=list(mock_repos.values()),
+            local_compose=compose,
+            package_cache='/var/cache/mock/rocky-9.5-x86_64-packages',
+    )
+    assert 'baseurl=file://%s/BaseOS/x86_64/os %s' % (compose, repos[0]['url']) in output
+    assert "('%s', '%s')" % (compose, compose) in output
+    assert "['yum_cache_opts']['dir'] = '/var/cache/mock/rocky-9.5-x86_64-packages/dnf_cache/'" in output
+    assert 'root_cache_opts' not in output
+
+
+def test_dnf_cache_locks_are_ordered():
+    cmd = Shared.dnf_cache_lock(['CRB', 'BaseOS', 'AppStream', 'BaseOS'], 'dnf repoclosure', mode='-x')
+    assert cmd == (
+            '/usr/bin/flock -x /var/cache/dnf/.AppStream.lock '
+            '/usr/bin/flock -x /var/cache/dnf/.BaseOS.lock '
+            '/usr/bin/flock -x /var/cache/dnf/.CRB.lock dnf repoclosure'
+    )
@@ -0,0 +1,206 @@
+import gzip
+import hashlib
+import http.server
+import logging
+import os
+import threading
+from functools import partial
+
+import pytest
+
+from empanadas.util.native_sync import NativeSync
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _make_repo(root, packages):
+    """
+    Writes a minimal repository with a primary.xml.gz and repomd.xml
+    """
+    entries = []
+    for href, data in packages.items():
+        path = os.path.join(root, href)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        entries.append(
+                '<package type="rpm"><name>{0}</name>'
+                '<checksum type="sha256" pkgid="YES">{1}</checksum>'
+                '<size package="{2}"/><location href="{3}"/></package>'.format(
+                    os.path.basename(href), _sha256(data), len(data), href
+                )
+        )
+
+    primary = gzip.compress((
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<metadata xmlns="http://linux.duke.edu/metadata/common" '
+            'xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="{}">{}</metadata>'
+    ).format(len(entries), ''.join(entries)).encode())
+    primary_name = _sha256(primary) + '-primary.xml.gz'
+
+    os.makedirs(os.path.join(root, 'repodata'), exist_ok=True)
+    with open(os.path.join(root, 'repodata', primary_name), 'wb') as f:
+        f.write(primary)
+    with open(os.path.join(root, 'repodata', 'repomd.xml'), 'w') as f:
+        f.write(
+                '<?xml version="1.0" encoding="UTF-8"?>'
+                '<repomd xmlns="http://linux.duke.edu/metadata/repo">'
+                '<revision>1</revision><data type="primary">'
+                '<checksum type="sha256">{}</checksum>'
+                '<location href="repodata/{}"/></data></repomd>'.format(_sha256(primary), primary_name)
+        )
+
+
+@pytest.fixture
+def served(tmp_path):
+    remote = tmp_path / 'remote'
+    remote.mkdir()
+    handler = partial(http.server.SimpleHTTPRequestHandler, directory=str(remote))
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield str(remote), 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+PACKAGES = {
+    'Packages/a/a-1.0-1.noarch.rpm': b'a' * 5000,
+    'Packages/b/b-2.0-1.x86_64.rpm': os.urandom(300000),
+}
+
+
+def test_sync_downloads_packages_and_metadata(served, tmp_path):
+    remote, url = served
+    _make_repo(remote, PACKAGES)
+    dest = str(tmp_path / 'local')
+
+    with NativeSync(logging.getLogger(), workers=4) as engine:
+        stats = engine.sync_repo(url, dest)
+
+    assert stats['packages'] == 2
+    assert stats['downloaded'] == 2
+    for href, data in PACKAGES.items():
+        with open(os.path.join(dest, href), 'rb') as f:
+            assert f.read() == data
+    assert os.path.exists(os.path.join(dest, 'repodata', 'repomd.xml'))
+    assert not os.path.exists(os.path.join(dest, '.repodata.new'))
+
+
+def test_sync_only_fetches_changes(served, tmp_path):
+    remote, url = served
+    _make_repo(remote, PACKAGES)
+    dest = str(tmp_path / 'local')
+
+    with NativeSync(logging.getLogger(), workers=4) as engine:
+        engine.sync_repo(url, dest)
+        assert engine.sync_repo(url, dest)['downloaded'] == 0
+
+        # Same size, different content
+        with open(os.path.join(dest, 'Packages/a/a-1.0-1.noarch.rpm'), 'wb') as f:
+            f.write(b'b' * 5000)
+        with open(os.path.join(dest, 'Packages/old-1.0-1.noarch.rpm'), 'wb') as f:
+            f.write(b'old')
+
+        stats = engine.sync_repo(url, dest, delete=True)
+
+    assert stats['downloaded'] == 1
+    assert stats['deleted'] == 1
+    with open(os.path.join(dest, 'Packages/a/a-1.0-1.noarch.rpm'), 'rb') as f:
+        assert f.read() == PACKAGES['Packages/a/a-1.0-1.noarch.rpm']
+
+
+def test_unchanged_packages_are_not_rehashed(served, tmp_path, monkeypatch):
+    from empanadas.util.checksum import ChecksumCache
+
+    remote, url = served
+    _make_repo(remote, PACKAGES)
+    dest = str(tmp_path / 'local')
+    work = str(tmp_path / 'work')
+
+    with NativeSync(logging.getLogger(), workers=4, cache=ChecksumCache(work, ChecksumCache.PACKAGES)) as engine:
+        engine.sync_repo(url, dest)
+        engine.cache.save()
+    # Kept apart from the ISO and image digests
+    assert os.path.exists(os.path.join(work, ChecksumCache.PACKAGES))
+    assert not os.path.exists(os.path.join(work, ChecksumCache.FILENAME))
+
+    hashed = []
+    original = NativeSync.file_checksum
+    monkeypatch.setattr(NativeSync, 'file_checksum', lambda self, p, t: hashed.append(p) or original(self, p, t))
+
+    # A later run, in a new process as far as the cache is concerned
+    with NativeSync(logging.getLogger(), workers=4, cache=ChecksumCache(work, ChecksumCache.PACKAGES)) as engine:
+        assert engine.sync_repo(url, dest)['downloaded'] == 0
+        assert hashed == []
+
+        # Rewritten with the same size, the cache no longer matches it
+        path = os.path.join(dest, 'Packages/a/a-1.0-1.noarch.rpm')
+        with open(path, 'wb') as f:
+            f.write(b'b' * 5000)
+        assert engine.sync_repo(url, dest)['downloaded'] == 1
+        assert hashed == [path]
+
+
+def test_sync_rejects_bad_checksum(served, tmp_path):
+    remote, url = served
+    _make_repo(remote, PACKAGES)
+    with open(os.path.join(remote, 'Packages/a/a-1.0-1.noarch.rpm'), 'wb') as f:
+        f.write(b'x' * 5000)
+    dest = str(tmp_path / 'local')
+
+    with NativeSync(logging.getLogger(), workers=4) as engine:
+        with pytest.raises(ValueError):
+            engine.sync_repo(url, dest)
+
+    assert not os.path.exists(os.path.join(dest, 'Packages/a/a-1.0-1.noarch.rpm'))
+    assert not os.path.exists(os.path.join(dest, 'Packages/a/a-1.0-1.noarch.rpm.part'))
+
+
+def test_pool_ingest_seed_and_prune(tmp_path):
+    from empanadas.util.pool import PackagePool
+
+    pool = PackagePool(str(tmp_path / 'pool'), logging.getLogger())
+    old = str(tmp_path / 'Rocky-9-20240101.0' / 'BaseOS' / 'x86_64' / 'os')
+    _make_repo(old, PACKAGES)
+    assert pool.ingest(old) == 2
+    assert pool.ingest(old) == 0
+
+    # A new compose gets both packages from the pool without downloading
+    new = str(tmp_path / 'Rocky-9-20240201.0' / 'BaseOS' / 'x86_64' / 'os')
+    packages = [
+            (href, None, 'sha256', _sha256(data), len(data))
+            for href, data in PACKAGES.items()
+    ]
+    assert pool.seed(packages, new) == {'linked': 2, 'bytes': sum(len(d) for d in PACKAGES.values())}
+
+    # Still linked from the new compose, nothing goes
+    removed = str(tmp_path / 'Rocky-9-20240101.0')
+    for root, _, files in os.walk(removed):
+        for name in files:
+            os.remove(os.path.join(root, name))
+    assert pool.prune() == 0
+
+    os.remove(os.path.join(new, 'Packages/a/a-1.0-1.noarch.rpm'))
+    assert pool.prune() == 1
+    assert not os.path.exists(pool.path_for(_sha256(PACKAGES['Packages/a/a-1.0-1.noarch.rpm'])))
+    assert os.path.exists(pool.path_for(_sha256(PACKAGES['Packages/b/b-2.0-1.x86_64.rpm'])))
+
+
+def test_pool_skips_packages_that_do_not_match(tmp_path):
+    from empanadas.util.pool import PackagePool
+
+    pool = PackagePool(str(tmp_path / 'pool'), logging.getLogger())
+    repo = str(tmp_path / 'Rocky-9-20240101.0' / 'BaseOS' / 'x86_64' / 'os')
+    _make_repo(repo, PACKAGES)
+    # Left truncated by an earlier run, and reposync does not look again
+    stale = os.path.join(repo, 'Packages/a/a-1.0-1.noarch.rpm')
+    with open(stale, 'r+b') as f:
+        f.truncate(100)
+
+    assert pool.ingest(repo) == 1
+    assert not os.path.exists(pool.path_for(_sha256(PACKAGES['Packages/a/a-1.0-1.noarch.rpm'])))
+    assert os.path.exists(pool.path_for(_sha256(PACKAGES['Packages/b/b-2.0-1.x86_64.rpm'])))
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+
+import pytest
+
+from empanadas.util.podman_utils import ContainerUnit, PodmanSupervisor
+
+
+class FakePodman(PodmanSupervisor):
+    """
+    Answers podman run/wait/rm without podman. exits maps a unit name to
+    its container exit code, durations to how long it runs.
+    """
+    def __init__(self, exits=None, durations=None, **kwargs):
+        super().__init__('podman', logging.getLogger(), **kwargs)
+        self.exits = exits or {}
+        self.durations = durations or {}
+        self.started = []
+        self.running = 0
+        self.most_running = 0
+
+    async def _exec(self, *args):
+        if args[1] == 'run':
+            name = args[args.index('--name') + 1]
+            self.started.append(name)
+            return 0, 'id'
+        if args[1] == 'wait':
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+            await asyncio.sleep(self.durations.get(args[2], 0.01))
+            self.running -= 1
+            return 0, str(self.exits.get(args[2], 0))
+        return 0, ''
+
+
+def _units(*names, weights=None):
+    weights = weights or {}
+    return [
+            ContainerUnit(name=name, entries_dir='/entries', image='img', group=name[0], weight=weights.get(name))
+            for name in names
+    ]
+
+
+def test_heaviest_units_start_first():
+    supervisor = FakePodman(max_parallel=1)
+    units = _units('a1', 'a2', 'b1', 'b2', weights={'a1': 5, 'a2': 50, 'b1': 20})
+    results = supervisor.run(units)
+    # Unknown weights first, then longest first
+    assert supervisor.started == ['b2', 'a2', 'b1', 'a1']
+    assert [r.name for r in results] == supervisor.started
+
+
+def test_max_parallel_is_respected():
+    supervisor = FakePodman(max_parallel=3, durations={'a%d' % i: 0.05 for i in range(10)})
+    results = supervisor.run(_units(*['a%d' % i for i in range(10)]))
+    assert len(results) == 10
+    assert supervisor.most_running == 3
+
+
+def test_failed_unit_is_reported():
+    supervisor = FakePodman(exits={'b1': 3})
+    units = _units('a1', 'b1', 'b2')
+    on_complete, bad_exit_list = PodmanSupervisor.group_tracker(units, logging.getLogger())
+    results = {r.name: r for r in supervisor.run(units, on_complete)}
+    assert results['b1'].exit_code == 3
+    assert not results['b1'].ok
+    assert results['a1'].ok and results['b2'].ok
+    assert bad_exit_list == ['b1']
+
+
+def test_missing_podman_fails_every_unit(tmp_path):
+    supervisor = PodmanSupervisor(str(tmp_path / 'no-podman'), logging.getLogger(), max_parallel=2)
+    results = supervisor.run(_units('a1', 'a2', 'a3'))
+    assert sorted(r.name for r in results) == ['a1', 'a2', 'a3']
+    assert all(r.exit_code == 127 for r in results)
+
+
+def test_unexpected_error_is_raised_not_hung():
+    class Broken(FakePodman):
+        async def _run_unit(self, unit):
+            if unit.name == 'a2':
+                raise RuntimeError('boom')
+            return await super()._run_unit(unit)
+
+    with pytest.raises(RuntimeError):
+        Broken(max_parallel=2).run(_units('a1', 'a2', 'a3'))
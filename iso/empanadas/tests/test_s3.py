@@ -0,0 +1,96 @@
+import logging
+import os
+
+import pytest
+
+moto = pytest.importorskip('moto')
+
+from empanadas.util import s3 as s3_module
+from empanadas.util.s3 import S3Transfers
+
+BUCKET = 'resf-empanadas'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-2')
+    with moto.mock_aws():
+        # Clients made outside of the mock would talk to the real thing
+        s3_module._clients.clear()
+        s3 = S3Transfers.get_client()
+        s3.create_bucket(
+                Bucket=BUCKET,
+                CreateBucketConfiguration={'LocationConstraint': 'us-east-2'}
+        )
+        yield s3
+        s3_module._clients.clear()
+
+
+def test_client_is_shared(client):
+    assert S3Transfers.get_client() is client
+    assert S3Transfers(BUCKET, logging.getLogger(), workers=5, concurrency=10).client is client
+    # A bigger connection pool gets a client of its own
+    bigger = S3Transfers(BUCKET, logging.getLogger(), workers=8, concurrency=10).client
+    assert bigger is not client
+    assert bigger.meta.config.max_pool_connections == 80
+
+
+def test_failed_upload_is_reported_per_key(client, tmp_path):
+    path = tmp_path / 'Rocky-9-GenericCloud.qcow2'
+    path.write_bytes(b'qcow')
+
+    transfers = S3Transfers('no-such-bucket', logging.getLogger())
+    results = transfers.upload_many([(str(path), 'a.qcow2')])
+    assert isinstance(results['a.qcow2'], Exception)
+
+
+def test_upload_dir_and_download_many(client, tmp_path):
+    source = tmp_path / 'builddir'
+    (source / 'sub').mkdir(parents=True)
+    # Over the multipart threshold below, so it goes up and down in parts
+    big = os.urandom(6 * 1048576)
+    (source / 'lorax-9.5-x86_64.tar.gz').write_bytes(big)
+    (source / 'sub' / 'lorax.log').write_bytes(b'log')
+    (source / 'build.log').write_bytes(b'skip me')
+
+    transfers = S3Transfers(BUCKET, logging.getLogger(), chunk_size=5 * 1048576, concurrency=4)
+    uploaded = transfers.upload_dir(str(source), 'buildiso-9-x86_64/1700000000/', include=['lorax*', '*/lorax*'])
+
+    assert sorted(uploaded) == [
+            'buildiso-9-x86_64/1700000000/lorax-9.5-x86_64.tar.gz',
+            'buildiso-9-x86_64/1700000000/sub/lorax.log',
+    ]
+
+    dest = tmp_path / 'work'
+    results = transfers.download_many([
+            ('buildiso-9-x86_64/1700000000/lorax-9.5-x86_64.tar.gz', str(dest / 'x86_64' / 'lorax.tar.gz')),
+            ('buildiso-9-x86_64/1700000000/sub/lorax.log', str(dest / 'aarch64' / 'lorax.log')),
+            ('buildiso-9-x86_64/1700000000/missing', str(dest / 'missing')),
+    ])
+
+    assert results[str(dest / 'x86_64' / 'lorax.tar.gz')] == len(big)
+    assert (dest / 'x86_64' / 'lorax.tar.gz').read_bytes() == big
+    assert (dest / 'aarch64' / 'lorax.log').read_bytes() == b'log'
+    assert isinstance(results[str(dest / 'missing')], Exception)
+    assert not os.path.exists(str(dest / 'missing.part'))
+
+
+def test_upload_dir_to_bucket_root(client, tmp_path):
+    (tmp_path / 'a.qcow2').write_bytes(b'qcow')
+    transfers = S3Transfers(BUCKET, logging.getLogger())
+    for prefix in ('', '/'):
+        assert list(transfers.upload_dir(str(tmp_path), prefix)) == ['a.qcow2']
+
+
+def test_download_keeps_existing(client, tmp_path):
+    client.put_object(Bucket=BUCKET, Key='a.qcow2', Body=b'new')
+    dest = tmp_path / 'a.qcow2'
+    dest.write_bytes(b'old')
+
+    transfers = S3Transfers(BUCKET, logging.getLogger())
+    assert transfers.download('a.qcow2', str(dest)) == 0
+    assert dest.read_bytes() == b'old'
+    assert transfers.download('a.qcow2', str(dest), force=True) == 3
+    assert dest.read_bytes() == b'new'
@@ -0,0 +1,55 @@
+import logging
+
+from empanadas.util import ContainerResult, TimingDB, TimingReport
+
+
+def _result(name, start, end, exit_code=0):
+    return ContainerResult(name=name, group='BaseOS', exit_code=exit_code, start=start, end=end)
+
+
+def test_run_ids_are_unique(tmp_path):
+    assert TimingDB(str(tmp_path)).run != TimingDB(str(tmp_path)).run
+
+
+def test_partial_rerun_is_merged(tmp_path):
+    full = TimingDB(str(tmp_path))
+    for name in ('BaseOS-x86_64', 'BaseOS-aarch64', 'AppStream-x86_64'):
+        full.record('sync', _result(name, 100, 200, exit_code=1 if name == 'BaseOS-aarch64' else 0))
+
+    partial = TimingDB(str(tmp_path))
+    partial.record('sync', _result('BaseOS-aarch64', 1000, 1050))
+
+    records = TimingDB.read(full.path)
+    merged = {r['unit']: r for r in TimingDB.select(records)}
+    assert sorted(merged) == ['AppStream-x86_64', 'BaseOS-aarch64', 'BaseOS-x86_64']
+    assert merged['BaseOS-aarch64']['exit'] == 0
+
+    assert [r['unit'] for r in TimingDB.select(records, [partial.run])] == ['BaseOS-aarch64']
+    assert [(r[0], r[2]) for r in TimingDB.runs(records)] == [(full.run, 3), (partial.run, 1)]
+
+    # The gap between the two runs is not counted
+    report = TimingReport(records)
+    assert report._wall(report.records) == 150
+
+
+def test_sizes_only_when_measuring(tmp_path):
+    target = tmp_path / 'BaseOS' / 'x86_64'
+    target.mkdir(parents=True)
+
+    plain = TimingDB(str(tmp_path / 'work'))
+    plain.recorder('sync', {'BaseOS-x86_64': str(target)})(_result('BaseOS-x86_64', 0, 1))
+    plain.close()
+    assert TimingDB.read(plain.path)[0]['bytes'] is None
+
+    measured = TimingDB(str(tmp_path / 'work'), logging.getLogger(), measure=True)
+    seen = []
+    callback = measured.recorder('sync', {'BaseOS-x86_64': str(target)}, on_complete=seen.append)
+    (target / 'pkg.rpm').write_bytes(b'x' * 4096)
+    callback(_result('BaseOS-x86_64', 2, 3))
+    assert len(seen) == 1
+    measured.close()
+
+    rec = TimingDB.read(measured.path)[-1]
+    assert rec['bytes'] == 4096
+    assert rec['size'] == 4096
+    assert rec['run'] == measured.run
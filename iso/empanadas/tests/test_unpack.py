@@ -0,0 +1,65 @@
+import io
+import logging
+import os
+import tarfile
+
+import pytest
+
+from empanadas.util.clone import TreeCloner
+from empanadas.util.unpack import Unpacker
+
+
+def _tarball(path, data):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+        info = tarfile.TarInfo('images/install.img')
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    with open(path, 'wb') as f:
+        f.write(buf.getvalue())
+    return path
+
+
+def test_force_unpack_leaves_variant_trees_alone(tmp_path):
+    lorax = str(tmp_path / 'lorax')
+    variant = str(tmp_path / 'BaseOS' / 'x86_64' / 'os')
+    unpacker = Unpacker(logging.getLogger())
+
+    unpacker.extract(_tarball(str(tmp_path / 'old.tar.gz'), b'old' * 500000), lorax)
+    TreeCloner(logging.getLogger()).clone(lorax, variant)
+    # A variant tree from before files stopped being hardlinked
+    os.remove(os.path.join(variant, 'images/install.img'))
+    os.link(os.path.join(lorax, 'images/install.img'), os.path.join(variant, 'images/install.img'))
+
+    unpacker.extract(_tarball(str(tmp_path / 'new.tar.gz'), b'new'), lorax)
+
+    with open(os.path.join(lorax, 'images/install.img'), 'rb') as f:
+        assert f.read() == b'new'
+    with open(os.path.join(variant, 'images/install.img'), 'rb') as f:
+        assert f.read() == b'old' * 500000
+
+
+@pytest.mark.parametrize('filters', [True, False])
+def test_members_outside_dest_are_refused(tmp_path, monkeypatch, filters):
+    monkeypatch.setattr(Unpacker, 'FILTERS', filters and hasattr(tarfile, 'tar_filter'))
+    path = str(tmp_path / 'evil.tar.gz')
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+        info = tarfile.TarInfo('../escaped')
+        info.size = 1
+        tar.addfile(info, io.BytesIO(b'x'))
+    with open(path, 'wb') as f:
+        f.write(buf.getvalue())
+
+    with pytest.raises(tarfile.TarError):
+        Unpacker(logging.getLogger()).extract(path, str(tmp_path / 'lorax'))
+    assert not os.path.exists(str(tmp_path / 'escaped'))
+
+
+def test_extracts_without_filter_support(tmp_path, monkeypatch):
+    monkeypatch.setattr(Unpacker, 'FILTERS', False)
+    lorax = str(tmp_path / 'lorax')
+    Unpacker(logging.getLogger()).extract(_tarball(str(tmp_path / 'a.tar.gz'), b'one'), lorax)
+    Unpacker(logging.getLogger()).extract(_tarball(str(tmp_path / 'b.tar.gz'), b'two'), lorax)
+    with open(os.path.join(lorax, 'images/install.img'), 'rb') as f:
+        assert f.read() == b'two'